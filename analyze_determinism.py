@@ -1,20 +1,39 @@
-#!/Users/erik/src/the_loop_test/venv/bin/python
+#!/usr/bin/env python3
 """
 Analyze determinism of FS-UAE by comparing multiple recordings of the same replayer.
 Should show 1.0 correlation if perfectly deterministic.
+
+Any number of takes can be given. All takes are streamed together in blocks
+and compared against a per-frame consensus (the majority value across
+takes), which costs O(N) per frame instead of O(N^2) pairwise comparisons.
+The consensus pass reports per-window disagreement counts and variance
+across takes, and which takes are outliers and where.
+
+Usage: ./analyze_determinism.py                        # hippoplayer takes 1-3
+       ./analyze_determinism.py --replayer lsplayer    # lsplayer_channels_raw_take*.pcm
+       ./analyze_determinism.py take*.pcm [--window 0.5] [--maps maps.npz]
+       ./analyze_determinism.py ... --pairwise         # also compare every pair
 """
 
+import argparse
+import re
 import sys
 import numpy as np
 from pathlib import Path
 
-def load_pcm(filename, sample_rate=96000, channels=4):
-    """Load raw PCM file and return numpy array of samples."""
-    with open(filename, 'rb') as f:
-        data = f.read()
-    samples = np.frombuffer(data, dtype=np.int16)
-    samples = samples.reshape(-1, channels)
-    return samples, sample_rate
+from paula_pcm import open_capture, iter_blocks
+from results_db import DB_FILE, connect, start_run, record_capture, record_determinism, identify
+
+BLOCK_FRAMES = 1 << 18
+
+def load_pcm(filename):
+    """Load a capture (any format open_capture() reads); returns (samples, sample_rate)."""
+    samples, sample_rate = open_capture(filename)
+    return np.asarray(samples), sample_rate
+
+def take_order(filename):
+    """Sort key putting takes in numeric order (take2 before take10)."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', Path(filename).stem)]
 
 def calculate_correlation(samples1, samples2):
     """Calculate correlation coefficient between two recordings."""
@@ -52,93 +71,301 @@ def samples_to_time(sample_idx, sample_rate=96000):
     secs = seconds % 60
     return f"{minutes}m {secs:.3f}s"
 
-def main():
+def consensus_block(stack):
+    """
+    Per-frame majority value across takes.
+
+    stack: (takes, frames, channels) int16. Sorting along the take axis puts
+    equal values in runs; the longest run is the majority (ties resolve to
+    the smallest value). Returns (consensus, agree) with agree = number of
+    takes holding the consensus value.
+    """
+    num_takes = stack.shape[0]
+    s = np.sort(stack, axis=0)
+    idx = np.arange(num_takes).reshape(-1, 1, 1)
+
+    run_start = np.zeros(s.shape, dtype=np.int32)
+    run_start[1:] = np.where(s[1:] != s[:-1], idx[1:], 0)
+    run_start = np.maximum.accumulate(run_start, axis=0)
+    run_len = idx - run_start + 1
+
+    best = np.argmax(run_len, axis=0)
+    consensus = np.take_along_axis(s, best[np.newaxis], axis=0)[0]
+    agree = np.take_along_axis(run_len, best[np.newaxis], axis=0)[0]
+    return consensus, agree
+
+def analyze_consensus(filenames, window_frames=96000, block_frames=BLOCK_FRAMES):
+    """
+    Stream all takes together and accumulate per-window consensus statistics.
+
+    Returns dict with per-take lengths, per-window disagreement counts
+    (frames where not all takes agree), mean variance across takes,
+    per-take deviation counts per window and each take's first deviation.
+    """
+    takes = [open_capture(f)[0] for f in filenames]
+    num_takes = len(takes)
+    lengths = [len(t) for t in takes]
+    min_len = min(lengths)
+    channels = takes[0].shape[1]
+
+    num_windows = (min_len + window_frames - 1) // window_frames
+    disagree = np.zeros((num_windows, channels), dtype=np.int64)
+    variance = np.zeros((num_windows, channels), dtype=np.float64)
+    frames_in_window = np.zeros(num_windows, dtype=np.int64)
+    take_dev = np.zeros((num_takes, num_windows), dtype=np.int64)
+    first_dev = [None] * num_takes
+
+    # Blocks hold whole windows so per-window sums never straddle blocks
+    block_frames = window_frames * max(1, block_frames // window_frames)
+
+    for offset, _ in iter_blocks(takes[0], block_frames, stop=min_len):
+        end = min(offset + block_frames, min_len)
+        stack = np.stack([np.asarray(t[offset:end]) for t in takes])
+        consensus, agree = consensus_block(stack)
+
+        w0 = offset // window_frames
+        win = (np.arange(end - offset) // window_frames)
+        nwin = win[-1] + 1
+        frames_in_window[w0:w0 + nwin] += np.bincount(win, minlength=nwin)
+
+        differs = agree < num_takes
+        for ch in range(channels):
+            disagree[w0:w0 + nwin, ch] += np.bincount(win, weights=differs[:, ch], minlength=nwin).astype(np.int64)
+        frame_var = stack.astype(np.float32).var(axis=0)
+        for ch in range(channels):
+            variance[w0:w0 + nwin, ch] += np.bincount(win, weights=frame_var[:, ch], minlength=nwin)
+
+        deviates = np.any(stack != consensus[np.newaxis], axis=2)
+        for t in range(num_takes):
+            take_dev[t, w0:w0 + nwin] += np.bincount(win, weights=deviates[t], minlength=nwin).astype(np.int64)
+            if first_dev[t] is None and deviates[t].any():
+                first_dev[t] = offset + int(np.argmax(deviates[t]))
+
+    variance /= np.maximum(frames_in_window, 1)[:, None]
+
+    return {
+        'lengths': lengths,
+        'frames': min_len,
+        'window_frames': window_frames,
+        'disagree': disagree,
+        'variance': variance,
+        'take_dev': take_dev,
+        'first_dev': first_dev,
+    }
+
+def find_outliers(take_dev, k=5.0):
+    """
+    Takes whose total deviation from consensus is far above the others,
+    using median + k * MAD over all takes. Returns list of take indices.
+    """
+    totals = take_dev.sum(axis=1).astype(np.float64)
+    if len(totals) < 3:
+        return []
+    median = np.median(totals)
+    mad = np.median(np.abs(totals - median))
+    limit = median + k * max(mad, 0.01 * median, 1.0)
+    return [int(t) for t in np.flatnonzero(totals > limit)]
+
+def outlier_windows(take_dev, take, top=5):
+    """Windows where `take` deviates most relative to the typical take."""
+    typical = np.median(take_dev, axis=0)
+    excess = take_dev[take] - typical
+    order = np.argsort(-excess, kind='stable')[:top]
+    # Ignore windows that only carry the background noise level
+    floor = max(1.0, 0.1 * excess.max())
+    return [(int(w), int(take_dev[take, w])) for w in order if excess[w] >= floor]
+
+def print_consensus(names, result, sample_rate=96000):
+    """Print the consensus report."""
+    num_takes = len(names)
+    frames = result['frames']
+    window = result['window_frames']
+    disagree = result['disagree']
+    take_dev = result['take_dev']
+
     print("=" * 80)
-    print("FS-UAE Determinism Analysis")
+    print(f"Consensus Check ({num_takes} takes, {window / sample_rate:.2f}s windows)")
     print("=" * 80)
     print()
 
-    # Load all three takes
-    files = {
-        'Take 1': 'hippoplayer_channels_raw_take1.pcm',
-        'Take 2': 'hippoplayer_channels_raw_take2.pcm',
-        'Take 3': 'hippoplayer_channels_raw_take3.pcm'
-    }
+    lengths = np.array(result['lengths'])
+    print(f"  Lengths:                {lengths.min() / sample_rate:.2f}s .. {lengths.max() / sample_rate:.2f}s "
+          f"(compared first {frames:,} frames)")
 
-    recordings = {}
-    sample_rate = 96000
+    total = disagree.sum(axis=0)
+    pct = total / max(frames, 1) * 100
+    print(f"  Frames with any disagreement per channel:")
+    print("    " + "  ".join(f"Ch{ch}={n:,} ({p:.4f}%)" for ch, (n, p) in enumerate(zip(total, pct))))
 
-    print("Loading recordings...")
-    for name, filename in files.items():
-        if not Path(filename).exists():
-            print(f"Error: {filename} not found!")
-            return 1
+    mean_var = result['variance'].mean(axis=0) if len(result['variance']) else np.zeros(len(total))
+    print("  Mean variance across takes: " + "  ".join(f"Ch{ch}={v:.2f}" for ch, v in enumerate(mean_var)))
 
-        samples, sr = load_pcm(filename)
-        recordings[name] = samples
+    windows_hit = np.count_nonzero(disagree.sum(axis=1))
+    print(f"  Windows with disagreement: {windows_hit:,} / {len(disagree):,}")
+    print()
+
+    print("  Per-take deviation from consensus:")
+    for t, name in enumerate(names):
+        dev = int(take_dev[t].sum())
+        first = result['first_dev'][t]
+        where = "none" if first is None else f"first at frame {first:,} ({samples_to_time(first, sample_rate)})"
+        print(f"    {name:40s} {dev:10,} frames ({dev / max(frames, 1) * 100:7.4f}%)  {where}")
+    print()
+
+    outliers = find_outliers(take_dev)
+    if outliers:
+        print("  Outlier takes:")
+        for t in outliers:
+            print(f"    {names[t]}")
+            for w, count in outlier_windows(take_dev, t):
+                start = w * window / sample_rate
+                print(f"      {start:8.2f}s .. {start + window / sample_rate:8.2f}s: "
+                      f"{count:,} deviating frames")
+    else:
+        print("  Outlier takes:          none")
+    print()
 
-        duration = len(samples) / sr
-        print(f"  {name:8s}: {len(samples):,} frames, {duration:.2f}s, "
-              f"{samples.shape[1]} channels @ {sr}Hz")
+def pairwise_check(names, filenames, sample_rate=96000):
+    """Compare every pair of takes (the original O(N^2) report)."""
+    recordings = {}
+    for name, filename in zip(names, filenames):
+        samples, _ = load_pcm(filename)
+        recordings[name] = samples
 
+    print("=" * 80)
+    print("Determinism Check (pairwise)")
+    print("=" * 80)
     print()
 
-    # Check if recordings are identical
+    all_identical = True
+
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            name1, name2 = names[i], names[j]
+            samples1 = recordings[name1]
+            samples2 = recordings[name2]
+
+            # Ensure same length
+            min_len = min(len(samples1), len(samples2))
+            samples1_cmp = samples1[:min_len]
+            samples2_cmp = samples2[:min_len]
+
+            # Check if exactly identical
+            are_identical = np.array_equal(samples1_cmp, samples2_cmp)
+
+            # Calculate correlation
+            correlation = calculate_correlation(samples1_cmp, samples2_cmp)
+            per_ch_corr = calculate_per_channel_correlation(samples1_cmp, samples2_cmp)
+
+            # Find first difference
+            first_diff = find_first_difference(samples1_cmp, samples2_cmp)
+
+            # Count differences
+            diff = samples1_cmp != samples2_cmp
+            num_diffs = np.sum(diff)
+            total_samples = samples1_cmp.size
+            pct_diff = (num_diffs / total_samples) * 100
+
+            print(f"{name1} vs {name2}:")
+            print(f"  Exactly identical:      {are_identical}")
+            print(f"  Overall correlation:    {correlation:.10f}")
+            print("  Per-channel correlation: " +
+                  "  ".join(f"Ch{ch}={c:.10f}" for ch, c in enumerate(per_ch_corr)))
+
+            if first_diff is not None:
+                time_str = samples_to_time(first_diff, sample_rate)
+                print(f"  First difference:       Frame {first_diff:,} ({time_str})")
+            else:
+                print(f"  First difference:       None")
+
+            print(f"  Different samples:      {num_diffs:,} / {total_samples:,} ({pct_diff:.4f}%)")
+            print()
+
+            if not are_identical:
+                all_identical = False
+
+    return all_identical
+
+def main():
+    parser = argparse.ArgumentParser(description='FS-UAE determinism analysis over N takes.')
+    parser.add_argument('files', nargs='*', help='takes of the same replayer')
+    parser.add_argument('--replayer', help='use <replayer>_channels_raw_take*.pcm')
+    parser.add_argument('--window', type=float, default=1.0, help='window length in seconds (default 1.0)')
+    parser.add_argument('--maps', help='save per-window disagreement/variance maps to this .npz')
+    parser.add_argument('--pairwise', action='store_true', help='also compare every pair of takes')
+    parser.add_argument('--db', default=DB_FILE, help=f'results database to record into (default {DB_FILE})')
+    parser.add_argument('--no-db', action='store_true', help="don't record the verdict")
+    args = parser.parse_args()
+
     print("=" * 80)
-    print("Determinism Check")
+    print("FS-UAE Determinism Analysis")
     print("=" * 80)
     print()
 
-    comparisons = [
-        ('Take 1', 'Take 2'),
-        ('Take 1', 'Take 3'),
-        ('Take 2', 'Take 3')
-    ]
+    if args.files:
+        filenames = args.files
+    elif args.replayer:
+        filenames = sorted((str(p) for p in Path('.').glob(f"{args.replayer.lower()}_channels_raw_take*.pcm")),
+                           key=take_order)
+    else:
+        filenames = [
+            'hippoplayer_channels_raw_take1.pcm',
+            'hippoplayer_channels_raw_take2.pcm',
+            'hippoplayer_channels_raw_take3.pcm'
+        ]
 
-    all_identical = True
+    if len(filenames) < 2:
+        print("Error: need at least two takes!")
+        return 1
+
+    names = [Path(f).stem for f in filenames]
 
-    for name1, name2 in comparisons:
-        samples1 = recordings[name1]
-        samples2 = recordings[name2]
-
-        # Ensure same length
-        min_len = min(len(samples1), len(samples2))
-        samples1_cmp = samples1[:min_len]
-        samples2_cmp = samples2[:min_len]
-
-        # Check if exactly identical
-        are_identical = np.array_equal(samples1_cmp, samples2_cmp)
-
-        # Calculate correlation
-        correlation = calculate_correlation(samples1_cmp, samples2_cmp)
-        per_ch_corr = calculate_per_channel_correlation(samples1_cmp, samples2_cmp)
-
-        # Find first difference
-        first_diff = find_first_difference(samples1_cmp, samples2_cmp)
-
-        # Count differences
-        diff = samples1_cmp != samples2_cmp
-        num_diffs = np.sum(diff)
-        total_samples = samples1_cmp.size
-        pct_diff = (num_diffs / total_samples) * 100
-
-        print(f"{name1} vs {name2}:")
-        print(f"  Exactly identical:      {are_identical}")
-        print(f"  Overall correlation:    {correlation:.10f}")
-        print(f"  Per-channel correlation: Ch0={per_ch_corr[0]:.10f}  Ch1={per_ch_corr[1]:.10f}  "
-              f"Ch2={per_ch_corr[2]:.10f}  Ch3={per_ch_corr[3]:.10f}")
-        
-        if first_diff is not None:
-            time_str = samples_to_time(first_diff, sample_rate)
-            print(f"  First difference:       Frame {first_diff:,} ({time_str})")
-        else:
-            print(f"  First difference:       None")
-        
-        print(f"  Different samples:      {num_diffs:,} / {total_samples:,} ({pct_diff:.4f}%)")
+    print("Recordings:")
+    formats = set()
+    for name, filename in zip(names, filenames):
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+
+        samples, sample_rate = open_capture(filename)
+        channels = samples.shape[1]
+        formats.add((sample_rate, channels))
+        duration = len(samples) / sample_rate
+        print(f"  {name:40s}: {len(samples):,} frames, {duration:.2f}s, "
+              f"{channels} channels @ {sample_rate}Hz")
+
+    print()
+    # Takes are compared frame by frame, so they must share one format
+    if len(formats) > 1:
+        print("Error: takes differ in sample rate or channel count!")
+        return 1
+
+    result = analyze_consensus(filenames, window_frames=max(1, int(args.window * sample_rate)))
+    print_consensus(names, result, sample_rate)
+
+    if args.maps:
+        np.savez_compressed(args.maps, disagree=result['disagree'], variance=result['variance'],
+                            take_dev=result['take_dev'], takes=np.array(names),
+                            window_frames=result['window_frames'])
+        print(f"Saved per-window maps: {args.maps}")
         print()
 
-        if not are_identical:
-            all_identical = False
+    all_identical = result['disagree'].sum() == 0
+    if args.pairwise:
+        all_identical = pairwise_check(names, filenames, sample_rate) and all_identical
+
+    if not args.no_db:
+        conn = connect(args.db)
+        run_id = start_run(conn, 'analyze_determinism')
+        capture_ids = [record_capture(conn, run_id, f, length, sample_rate, channels)
+                       for f, length in zip(filenames, result['lengths'])]
+        replayer = identify(filenames[0])[0]
+        record_determinism(conn, run_id, replayer, capture_ids, result, all_identical,
+                           [names[t] for t in find_outliers(result['take_dev'])])
+        conn.commit()
+        conn.close()
+        print(f"Verdict recorded in {args.db} (run {run_id})")
+        print()
 
     # Overall assessment
     print("=" * 80)
@@ -148,7 +375,7 @@ def main():
 
     if all_identical:
         print("✓ FS-UAE is PERFECTLY DETERMINISTIC")
-        print("  All three recordings are byte-for-byte identical.")
+        print(f"  All {len(names)} recordings are byte-for-byte identical.")
     else:
         print("✗ FS-UAE is NOT DETERMINISTIC")
         print("  Recordings differ between runs.")
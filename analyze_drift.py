@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Track timing drift between ProTracker replayer recordings.
+
+A single global offset can't explain captures whose lengths differ by up to
+0.5s when every replayer runs off CIA timing: the tempo drifts. This tool
+splits the recordings into segments and estimates the local lag of each
+segment with a banded cross-correlation over decimated amplitude envelopes.
+
+Each segment only searches a narrow band of lags around the previous
+segment's lag, so the cost is O(length * band) and the whole song takes a
+few seconds. The result is a lag-vs-time curve per channel (plus a mix of
+all four) and a drift rate in ppm from a linear fit of that curve.
+
+Usage: ./analyze_drift.py                      # all three replayer pairs
+       ./analyze_drift.py a.pcm b.pcm [--csv out.csv]
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import sys
+import numpy as np
+from pathlib import Path
+from numpy.lib.stride_tricks import sliding_window_view
+
+from paula_pcm import SAMPLE_RATE, open_pcm, envelope
+from replayers import capture_files, replayer_pairs
+
+TRACKS = ['Ch0', 'Ch1', 'Ch2', 'Ch3', 'Mix']
+
+def banded_lag(a, env2, start, lo, hi):
+    """
+    Normalized cross-correlation of segment `a` against env2 for every lag in
+    [lo, hi], where lag L aligns a[0] with env2[start + L].
+    Returns (lags, correlations).
+    """
+    seg_len = len(a)
+    lo = max(lo, -start)
+    hi = min(hi, len(env2) - seg_len - start)
+    if hi < lo:
+        return None, None
+
+    window = env2[start + lo:start + hi + seg_len].astype(np.float64)
+    views = sliding_window_view(window, seg_len)
+
+    a0 = a - a.mean()
+    a_norm = np.sqrt(np.dot(a0, a0))
+
+    # Per-lag mean/energy of the env2 windows from running sums
+    csum = np.concatenate(([0.0], np.cumsum(window)))
+    csum2 = np.concatenate(([0.0], np.cumsum(window * window)))
+    win_sum = csum[seg_len:] - csum[:-seg_len]
+    win_sum2 = csum2[seg_len:] - csum2[:-seg_len]
+    win_var = np.maximum(win_sum2 - win_sum * win_sum / seg_len, 0.0)
+
+    # sum(a0) == 0, so the env2 window mean drops out of the numerator
+    numerator = views @ a0
+    denominator = a_norm * np.sqrt(win_var)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.where(denominator > 0, numerator / denominator, 0.0)
+
+    return np.arange(lo, hi + 1), corr
+
+def refine_peak(corr, idx):
+    """Parabolic interpolation around corr[idx]; returns fractional offset."""
+    if idx <= 0 or idx >= len(corr) - 1:
+        return 0.0
+    y0, y1, y2 = corr[idx - 1], corr[idx], corr[idx + 1]
+    denom = y0 - 2 * y1 + y2
+    if denom == 0:
+        return 0.0
+    return float(np.clip(0.5 * (y0 - y2) / denom, -0.5, 0.5))
+
+def track_lag(env1, env2, seg_len, band, search, min_corr=0.5):
+    """
+    Estimate the lag of env2 relative to env1 for consecutive segments.
+
+    The first confident segment searches +/- `search` points; every later one
+    only searches +/- `band` points around the last confident lag. Peaks on
+    a band edge clipped at either end of env2 are rejected.
+    Returns arrays (lags, corrs) in envelope points, NaN where no estimate.
+    """
+    num_segments = len(env1) // seg_len
+    lags = np.full(num_segments, np.nan)
+    corrs = np.full(num_segments, np.nan)
+    center = 0
+    locked = False
+
+    for seg in range(num_segments):
+        start = seg * seg_len
+        a = env1[start:start + seg_len].astype(np.float64)
+        if a.std() < 1.0:
+            continue  # silent segment carries no timing information
+
+        half = band if locked else search
+        lo, hi = center - half, center + half
+        cand, corr = banded_lag(a, env2, start, lo, hi)
+        if cand is None:
+            continue
+
+        idx = int(np.argmax(corr))
+        corrs[seg] = corr[idx]
+        if corr[idx] < min_corr:
+            continue
+        # A peak on a band edge clipped by the capture's ends is no peak:
+        # the true lag lies beyond what could be searched
+        if (idx == 0 and cand[0] > lo) or (idx == len(cand) - 1 and cand[-1] < hi):
+            continue
+
+        lags[seg] = cand[idx] + refine_peak(corr, idx)
+        center = int(cand[idx])
+        locked = True
+
+    return lags, corrs
+
+def drift_ppm(times, lags_frames, sample_rate):
+    """Least-squares slope of lag (frames) over time (s), in ppm of sample rate."""
+    valid = ~np.isnan(lags_frames)
+    if np.count_nonzero(valid) < 2:
+        return None, None
+    slope, intercept = np.polyfit(times[valid], lags_frames[valid], 1)
+    return slope / sample_rate * 1e6, intercept
+
+def analyze_drift(file1, file2, hop=96, segment=2.0, band_ms=20.0, search_ms=1000.0,
+                  sample_rate=SAMPLE_RATE):
+    """Compute per-track lag curves and drift rates between two recordings."""
+    samples1 = open_pcm(file1)
+    samples2 = open_pcm(file2)
+
+    env1 = envelope(samples1, hop)
+    env2 = envelope(samples2, hop)
+    env1 = np.column_stack([env1, env1.sum(axis=1)])
+    env2 = np.column_stack([env2, env2.sum(axis=1)])
+
+    points_per_sec = sample_rate / hop
+    seg_len = max(8, int(segment * points_per_sec))
+    band = max(1, int(band_ms / 1000.0 * points_per_sec))
+    search = max(band, int(search_ms / 1000.0 * points_per_sec))
+
+    num_segments = len(env1) // seg_len
+    times = (np.arange(num_segments) + 0.5) * seg_len * hop / sample_rate
+
+    tracks = {}
+    for i, track in enumerate(TRACKS):
+        lags, corrs = track_lag(env1[:, i], env2[:, i], seg_len, band, search)
+        lags_frames = lags * hop
+        ppm, offset = drift_ppm(times, lags_frames, sample_rate)
+        tracks[track] = {
+            'lags': lags_frames,
+            'corrs': corrs,
+            'ppm': ppm,
+            'offset': offset,
+        }
+
+    return {
+        'frames1': len(samples1),
+        'frames2': len(samples2),
+        'times': times,
+        'tracks': tracks,
+    }
+
+def save_csv(filename, result):
+    """Write the lag-vs-time curves as CSV (lags in frames)."""
+    with open(filename, 'w') as f:
+        header = ['time_s']
+        for track in TRACKS:
+            header += [f'{track.lower()}_lag_frames', f'{track.lower()}_corr']
+        f.write(','.join(header) + '\n')
+
+        for i, t in enumerate(result['times']):
+            row = [f'{t:.3f}']
+            for track in TRACKS:
+                lag = result['tracks'][track]['lags'][i]
+                corr = result['tracks'][track]['corrs'][i]
+                row.append('' if np.isnan(lag) else f'{lag:.1f}')
+                row.append('' if np.isnan(corr) else f'{corr:.4f}')
+            f.write(','.join(row) + '\n')
+
+def print_report(name1, name2, result, sample_rate=SAMPLE_RATE):
+    """Print drift summary for one pair."""
+    print(f"{name1} vs {name2}:")
+    len_diff = (result['frames2'] - result['frames1']) / sample_rate
+    print(f"  Length difference:      {len_diff:+.3f}s")
+
+    for track in TRACKS:
+        info = result['tracks'][track]
+        lags = info['lags']
+        valid = np.count_nonzero(~np.isnan(lags))
+        if info['ppm'] is None:
+            print(f"  {track}: not enough confident segments ({valid}/{len(lags)})")
+            continue
+
+        lag_ms = lags[~np.isnan(lags)] / sample_rate * 1000.0
+        print(f"  {track}: drift {info['ppm']:+9.1f} ppm  "
+              f"offset {info['offset'] / sample_rate * 1000.0:+8.2f} ms  "
+              f"lag {lag_ms.min():+8.2f}..{lag_ms.max():+8.2f} ms  "
+              f"({valid}/{len(lags)} segments)")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Track timing drift between two captures.')
+    parser.add_argument('files', nargs='*', help='two raw 4-channel PCM captures')
+    parser.add_argument('--csv', help='CSV output name when comparing two given files')
+    parser.add_argument('--hop', type=int, default=96,
+                        help='envelope decimation in frames (default 96 = 1ms)')
+    parser.add_argument('--segment', type=float, default=2.0,
+                        help='segment length in seconds (default 2.0)')
+    parser.add_argument('--band', type=float, default=20.0,
+                        help='lag search band per segment in ms (default 20)')
+    parser.add_argument('--search', type=float, default=1000.0,
+                        help='initial lag search range in ms (default 1000)')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("ProTracker Replayer Timing Drift (banded envelope cross-correlation)")
+    print("=" * 80)
+    print()
+
+    if args.files:
+        if len(args.files) != 2:
+            parser.error('expected exactly two capture files')
+        pairs = [(args.files[0], args.files[0], args.files[1], args.files[1])]
+    else:
+        files = capture_files()
+        comparisons = replayer_pairs(files)
+        pairs = [(n1, files[n1], n2, files[n2]) for n1, n2 in comparisons]
+
+    for name1, file1, name2, file2 in pairs:
+        for filename in (file1, file2):
+            if not Path(filename).exists():
+                print(f"Error: {filename} not found!")
+                return 1
+
+        result = analyze_drift(file1, file2, hop=args.hop, segment=args.segment,
+                               band_ms=args.band, search_ms=args.search)
+        print_report(name1, name2, result)
+
+        if args.files:
+            csv_name = args.csv or f"{Path(file1).stem}_vs_{Path(file2).stem}_drift.csv"
+        else:
+            csv_name = f"{name1.lower()}_vs_{name2.lower()}_drift.csv"
+        save_csv(csv_name, result)
+        print(f"  Saved lag curves: {csv_name}")
+        print()
+
+    print("Positive lag: the second recording plays the same material later.")
+    print("Drift in ppm is the slope of that lag; a constant offset has 0 ppm.")
+    print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
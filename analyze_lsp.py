@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Compare an LSP conversion against its MOD at the PAULA register level.
+
+When LSPlayer's capture diverges from PT2.3F it's either the converter
+(LSPConvert baked a different register stream into .lsmusic) or the player.
+This tool answers that without recording anything: it decodes the LSP
+command stream into a per-tick, per-channel table of register writes
+(lspfile.py), derives the same table from the MOD with the PT2.3F replay
+port (modfile.py), and diffs the two.
+
+Sample addresses are compared as (sample, offset) pairs: .lsbank offsets are
+mapped back to MOD samples by locating each sample's data in the bank, so a
+9xx sample offset or a relocated sample compares equal when it plays the
+same bytes. Differences are reported per field with the song position/row
+they happen at. Decoding and diffing both tables takes well under a second.
+
+Usage: ./analyze_lsp.py                  # test_lsplayer/the_loop.* vs the_loop.mod
+       ./analyze_lsp.py song.lsmusic song.lsbank song.mod [--offset N] [--save tables.npz]
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import sys
+import numpy as np
+from pathlib import Path
+
+from modfile import ModFile, play_mod
+from lspfile import LSPMusic, decode_lsp
+
+FIELDS = ['trigger', 'start', 'length', 'loop', 'loop_length', 'period', 'volume']
+PROBE_BYTES = 256
+
+def sample_ranges(starts, lengths, numbers):
+    """Sorted (starts, ends, numbers) arrays for resolve()."""
+    order = np.argsort(starts, kind='stable')
+    starts = np.asarray(starts, dtype=np.int64)[order]
+    ends = starts + np.asarray(lengths, dtype=np.int64)[order]
+    return starts, ends, np.asarray(numbers, dtype=np.int64)[order]
+
+def mod_ranges(mod):
+    """Address ranges of the MOD samples inside the .mod file."""
+    samples = [s for s in mod.samples[1:] if s.length]
+    return sample_ranges([s.start for s in samples], [s.length * 2 for s in samples],
+                         [s.number for s in samples])
+
+def bank_ranges(music, mod):
+    """
+    Address ranges of the MOD samples inside the .lsbank, found by searching
+    for each sample's data (from its first non-zero byte). Samples LSPConvert
+    dropped or that can't be found are left out.
+    """
+    starts, lengths, numbers = [], [], []
+    for s in mod.samples[1:]:
+        data = mod.raw[s.start:s.start + s.length * 2]
+        nonzero = np.flatnonzero(np.frombuffer(data, dtype=np.uint8)[2:])
+        if len(nonzero) == 0:
+            continue
+        first = int(nonzero[0]) + 2
+        found = music.bank_raw.find(data[first:first + PROBE_BYTES])
+        if found < 0:
+            continue
+        starts.append(found - first)
+        lengths.append(s.length * 2)
+        numbers.append(s.number)
+    return sample_ranges(starts, lengths, numbers)
+
+def resolve(addresses, ranges):
+    """Map addresses to (sample, offset) arrays; sample 0 keeps the raw address."""
+    starts, ends, numbers = ranges
+    addresses = addresses.astype(np.int64)
+    if len(starts) == 0:
+        return np.zeros_like(addresses), addresses
+    idx = np.searchsorted(starts, addresses, side='right') - 1
+    inside = (idx >= 0) & (addresses < ends[np.maximum(idx, 0)])
+    idx = np.maximum(idx, 0)
+    sample = np.where(inside, numbers[idx], 0)
+    offset = np.where(inside, addresses - starts[idx], addresses)
+    return sample, offset
+
+def first_trigger(channels):
+    """Index of the first tick with any DMA restart (0 if none)."""
+    hits = np.flatnonzero(channels['trigger'].any(axis=1))
+    return int(hits[0]) if len(hits) else 0
+
+def diff_tables(mod_channels, mod_ranges_, lsp_channels, lsp_ranges, offset=None):
+    """
+    Diff the MOD and LSP register tables over their common length.
+
+    `offset` is the MOD tick that LSP tick 0 lines up with; by default the
+    first DMA restarts of both tables are aligned. Period and volume are only
+    compared once a channel has been started in both tables, since the
+    converter may initialise idle channels differently. Loop registers are
+    skipped on ticks where both tables restart the channel on the next tick
+    (e.g. E91), as PAULA never gets to read them.
+    Returns dict with per-field (ticks, 4) boolean masks and the alignment.
+    """
+    if offset is None:
+        offset = first_trigger(mod_channels) - first_trigger(lsp_channels)
+    m = mod_channels[max(offset, 0):]
+    l = lsp_channels[max(-offset, 0):]
+    num_ticks = min(len(m), len(l))
+    m = m[:num_ticks]
+    l = l[:num_ticks]
+
+    m_sample, m_start = resolve(m['start'], mod_ranges_)
+    l_sample, l_start = resolve(l['start'], lsp_ranges)
+    m_loop_sample, m_loop = resolve(m['loop_start'], mod_ranges_)
+    l_loop_sample, l_loop = resolve(l['loop_start'], lsp_ranges)
+
+    both = m['trigger'] & l['trigger']
+    started = (np.maximum.accumulate(m['trigger'], axis=0) &
+               np.maximum.accumulate(l['trigger'], axis=0))
+    looped = started.copy()
+    looped[:-1] &= ~(m['trigger'][1:] & l['trigger'][1:])
+
+    masks = {
+        'trigger': m['trigger'] != l['trigger'],
+        'start': both & ((m_sample != l_sample) | (m_start != l_start)),
+        'length': both & (m['length'] != l['length']),
+        'loop': looped & ((m_loop_sample != l_loop_sample) | (m_loop != l_loop)),
+        'loop_length': looped & (m['loop_length'] != l['loop_length']),
+        'period': started & (m['period'] != l['period']),
+        'volume': started & (m['volume'] != l['volume']),
+    }
+
+    return {
+        'offset': offset,
+        'ticks': num_ticks,
+        'masks': masks,
+        'mod': m,
+        'lsp': l,
+        'mod_start': (m_sample, m_start),
+        'lsp_start': (l_sample, l_start),
+        'mod_loop': (m_loop_sample, m_loop),
+        'lsp_loop': (l_loop_sample, l_loop),
+    }
+
+def describe(result, field, tick, ch):
+    """One-line 'MOD -> LSP' description of a differing field."""
+    m = result['mod'][tick, ch]
+    l = result['lsp'][tick, ch]
+    if field == 'trigger':
+        return f"restart {'yes' if m['trigger'] else 'no'} -> {'yes' if l['trigger'] else 'no'}"
+    if field == 'start':
+        ms, mo = (a[tick, ch] for a in result['mod_start'])
+        ls, lo = (a[tick, ch] for a in result['lsp_start'])
+        return f"sample {ms}+{mo} -> {ls}+{lo}"
+    if field == 'loop':
+        ms, mo = (a[tick, ch] for a in result['mod_loop'])
+        ls, lo = (a[tick, ch] for a in result['lsp_loop'])
+        return f"loop {ms}+{mo} -> {ls}+{lo}"
+    return f"{field} {m[field]} -> {l[field]}"
+
+def print_diff(result, mod_ticks, show=8):
+    """Print per-channel, per-field difference counts and the first few differences."""
+    offset = result['offset']
+    num_ticks = result['ticks']
+    print(f"  Alignment: LSP tick 0 = MOD tick {offset}; {num_ticks:,} ticks compared")
+    print()
+
+    any_diff = False
+    for ch in range(4):
+        counts = {f: int(result['masks'][f][:, ch].sum()) for f in FIELDS}
+        if not any(counts.values()):
+            print(f"  Ch{ch}: identical")
+            continue
+        any_diff = True
+        summary = "  ".join(f"{f}={n:,}" for f, n in counts.items() if n)
+        print(f"  Ch{ch}: {summary}")
+
+        differ = np.zeros(num_ticks, dtype=bool)
+        for f in FIELDS:
+            differ |= result['masks'][f][:, ch]
+        for tick in np.flatnonzero(differ)[:show]:
+            mt = mod_ticks[tick + max(offset, 0)]
+            where = f"pos {mt['position']:2d} row {mt['row']:2d} tick {mt['counter']}"
+            fields = [describe(result, f, tick, ch) for f in FIELDS if result['masks'][f][tick, ch]]
+            print(f"         tick {tick:6d} ({where}): {'; '.join(fields)}")
+    print()
+    return any_diff
+
+def main():
+    parser = argparse.ArgumentParser(description='Register-level diff of an LSP conversion against its MOD.')
+    parser.add_argument('files', nargs='*', help='.lsmusic .lsbank .mod')
+    parser.add_argument('--offset', type=int,
+                        help='MOD tick that LSP tick 0 corresponds to (default: align first note)')
+    parser.add_argument('--show', type=int, default=8, help='differences to list per channel (default 8)')
+    parser.add_argument('--save', help='save both register tables to this .npz')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("LSP Conversion vs MOD (PAULA register tables)")
+    print("=" * 80)
+    print()
+
+    if args.files:
+        if len(args.files) != 3:
+            parser.error('expected .lsmusic, .lsbank and .mod')
+        music_file, bank_file, mod_file = args.files
+    else:
+        music_file = 'test_lsplayer/the_loop.lsmusic'
+        bank_file = 'test_lsplayer/the_loop.lsbank'
+        mod_file = 'the_loop.mod'
+
+    for filename in (music_file, bank_file, mod_file):
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+
+    mod = ModFile(mod_file)
+    music = LSPMusic(music_file, bank_file)
+    mod_ticks, mod_channels = play_mod(mod)
+    lsp_ticks, lsp_channels = decode_lsp(music)
+
+    lsp_ranges = bank_ranges(music, mod)
+    print(f"  MOD:  {len(mod_ticks):,} ticks (PT2.3F replay, incl. {first_trigger(mod_channels)} lead-in)")
+    print(f"  LSP:  {len(lsp_ticks):,} ticks, {len(music.instruments)} instruments, "
+          f"{len(music.codes)} codes, BPM {music.bpm}")
+    print(f"  Bank: {len(lsp_ranges[0])} of {sum(1 for s in mod.samples[1:] if s.length)} "
+          f"MOD samples located in {bank_file}")
+    print()
+
+    if args.save:
+        np.savez(args.save, mod_ticks=mod_ticks, mod_channels=mod_channels,
+                 lsp_ticks=lsp_ticks, lsp_channels=lsp_channels)
+        print(f"  Saved register tables: {args.save}")
+        print()
+
+    result = diff_tables(mod_channels, mod_ranges(mod), lsp_channels, lsp_ranges, args.offset)
+    any_diff = print_diff(result, mod_ticks, show=args.show)
+
+    if any_diff:
+        print("The conversion changes the register stream at the ticks above; differences")
+        print("there are the converter's, anything else in the capture is the player's.")
+    else:
+        print("Register streams are identical: any capture difference comes from the player.")
+    print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
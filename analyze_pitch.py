@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Estimate the PAULA playback period of each channel at every replayer tick.
+
+With uae_sound_interpol = none, every channel in the capture is a
+zero-order hold of the sample bytes: the output steps to a new value each
+time PAULA fetches the next byte, i.e. every period * 96000 / 3546895 frames.
+The step positions form a pulse train whose spacing gives the period
+directly, independent of the waveform or volume.
+
+The capture is cut at the song's own tick boundaries, from playing the MOD
+(modfile.tick_starts(): the_loop.mod runs at 121 BPM, about 1983 frames per
+tick, and any song may change tempo), so row i of the table is song tick i.
+--bpm cuts a fixed CIA tempo grid instead, for captures of other songs.
+
+Ticks of equal length are autocorrelated together with batched FFTs. A
+coarse spacing comes from the first autocorrelation peak, then it is
+refined on peaks at 2, 4, 8, ... times the spacing, which averages out the
++/-1 frame jitter of a non-integer spacing.
+
+The result is a compact (ticks, 4) uint16 period table (0 = no pitch, or a
+tick before the capture starts). Diffing two tables is millions of times
+cheaper than diffing samples and points straight at the tick whose period
+slide, vibrato or arpeggio differs.
+
+Usage: ./analyze_pitch.py                          # all three replayers + diffs
+       ./analyze_pitch.py capture.pcm [-o periods.npy] [--mod the_loop.mod | --bpm 125]
+       ./analyze_pitch.py --diff a_periods.npy b_periods.npy
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import sys
+import numpy as np
+from pathlib import Path
+
+from modfile import ModFile, play_mod, tick_starts
+from paula_pcm import SAMPLE_RATE, open_pcm
+from replayers import capture_files
+
+PAULA_CLOCK_PAL = 3546895
+MIN_LAG = 2          # period ~74, above anything ProTracker plays
+MAX_LAG = 48         # period ~1773, below anything ProTracker plays
+MIN_STEPS = 8        # fewer byte steps than this in a tick means no pitch
+BATCH_TICKS = 1024
+MOD_FILE = 'the_loop.mod'
+
+def tick_frames(bpm, sample_rate=SAMPLE_RATE):
+    """CIA tick length in frames: the tick rate is BPM * 2 / 5 Hz."""
+    return int(round(sample_rate * 5 / (bpm * 2)))
+
+def tick_bounds(num_frames=None, mod_file=None, bpm=None, offset=0, sample_rate=SAMPLE_RATE):
+    """
+    Frame boundaries of the ticks that end within num_frames (all song ticks
+    for None): tick i spans bounds[i]..bounds[i + 1]. The ticks are those of
+    playing mod_file, or a fixed grid at `bpm`. Frame `offset` is the first
+    DMA restart (tick time 0, see modfile.tick_starts()); song ticks before
+    it get negative bounds.
+    """
+    if bpm:
+        tick_len = tick_frames(bpm, sample_rate)
+        return offset + np.arange(max(0, (num_frames - offset) // tick_len) + 1) * tick_len
+
+    ticks, channels = play_mod(ModFile(mod_file))
+    starts = tick_starts(ticks, channels)
+    seconds = np.append(starts, starts[-1] + ticks['seconds'][-1])
+    bounds = offset + np.rint(seconds * sample_rate).astype(np.int64)
+    if num_frames is not None:
+        bounds = bounds[:np.searchsorted(bounds, num_frames, side='right')]
+    return bounds
+
+def step_trains(samples, starts, tick_len):
+    """
+    Byte-fetch pulse trains for the ticks starting at frames `starts`, each
+    tick_len frames long. Returns float32 array (ticks, channels, tick_len),
+    1.0 where the output changes from the previous frame.
+    """
+    blocks = np.empty((len(starts), tick_len + 1, samples.shape[1]), dtype=samples.dtype)
+    for i, start in enumerate(starts):
+        blocks[i, 0] = samples[max(start - 1, 0)]
+        blocks[i, 1:] = samples[start:start + tick_len]
+    steps = (blocks[:, 1:] != blocks[:, :-1]).astype(np.float32)
+    return steps.transpose(0, 2, 1)
+
+def peak_centroid(ac, lags):
+    """Centroid of ac over lags-1..lags+1 (per row), clipped to positive weights."""
+    rows = np.arange(ac.shape[0])
+    lags = np.clip(lags, 1, ac.shape[1] - 2)
+    w = np.stack([ac[rows, lags - 1], ac[rows, lags], ac[rows, lags + 1]], axis=1)
+    w = np.maximum(w, 0.0)
+    total = w.sum(axis=1)
+    offset = np.where(total > 0, (w[:, 2] - w[:, 0]) / np.where(total > 0, total, 1.0), 0.0)
+    return lags + offset
+
+def estimate_spacing(trains):
+    """
+    Estimate byte-step spacing (frames) for each row of trains (rows, tick_len).
+    Returns float64 array, NaN where there's no periodic step train.
+    """
+    rows, tick_len = trains.shape
+    counts = trains.sum(axis=1)
+
+    x = trains - trains.mean(axis=1, keepdims=True)
+    nfft = 1 << int(np.ceil(np.log2(2 * tick_len)))
+    spectrum = np.fft.rfft(x, n=nfft, axis=1)
+    ac = np.fft.irfft(spectrum * np.conj(spectrum), n=nfft, axis=1)[:, :tick_len]
+    energy = ac[:, 0].copy()
+    ac /= np.where(energy > 0, energy, 1.0)[:, None]
+
+    # Coarse: first lag whose smoothed autocorrelation reaches 60% of the best.
+    # A non-integer spacing splits each peak over two lags, so sum neighbours
+    # after lifting the "no pulse" floor to zero.
+    lifted = ac - ac[:, MIN_LAG:MAX_LAG + 1].min(axis=1, keepdims=True)
+    smooth = (lifted[:, MIN_LAG - 1:MAX_LAG] + lifted[:, MIN_LAG:MAX_LAG + 1] +
+              lifted[:, MIN_LAG + 1:MAX_LAG + 2])
+    best = smooth.max(axis=1)
+    first = np.argmax(smooth >= 0.6 * best[:, None], axis=1)
+    # Climb to the local maximum following that first crossing
+    for _ in range(3):
+        nxt = np.minimum(first + 1, smooth.shape[1] - 1)
+        climb = smooth[np.arange(rows), nxt] > smooth[np.arange(rows), first]
+        first = np.where(climb, nxt, first)
+    spacing = peak_centroid(ac, first + MIN_LAG)
+
+    # Refine on higher multiples: each doubling halves the jitter error
+    row_idx = np.arange(rows)[:, None]
+    width = int(np.ceil(MAX_LAG / 3))
+    k = 2
+    while k * MIN_LAG < tick_len - 2:
+        center = k * spacing
+        half = spacing / 3
+        offsets = np.arange(-width, width + 1)
+        lags = np.rint(center)[:, None].astype(np.int64) + offsets[None, :]
+        inside = (np.abs(lags - center[:, None]) <= half[:, None]) & (lags >= 1) & (lags < tick_len - 1)
+        usable = inside.any(axis=1) & (center + half < tick_len - 1)
+        vals = np.where(inside, ac[row_idx, np.clip(lags, 0, tick_len - 1)], -np.inf)
+        peak = lags[np.arange(rows), np.argmax(vals, axis=1)]
+        refined = peak_centroid(ac, peak) / k
+        spacing = np.where(usable, refined, spacing)
+        k *= 2
+
+    valid = (counts >= MIN_STEPS) & (best > 0.3) & (energy > 0)
+    return np.where(valid, spacing, np.nan)
+
+def estimate_periods(filename, mod_file=MOD_FILE, bpm=None, offset=0, sample_rate=SAMPLE_RATE,
+                     paula_clock=PAULA_CLOCK_PAL):
+    """
+    Build the (ticks, channels) uint16 period table for one capture, with
+    ticks as in tick_bounds(). Returns (periods, bounds).
+    """
+    samples = open_pcm(filename)
+    bounds = tick_bounds(len(samples), mod_file, bpm, offset, sample_rate)
+    num_ticks = max(0, len(bounds) - 1)
+    periods = np.zeros((num_ticks, samples.shape[1]), dtype=np.uint16)
+
+    # Ticks that start before the capture stay 0; the rest are batched by length
+    lengths = np.diff(bounds)
+    inside = np.flatnonzero(bounds[:-1] >= 0)
+    for tick_len in np.unique(lengths[inside]):
+        same = inside[lengths[inside] == tick_len]
+        for first in range(0, len(same), BATCH_TICKS):
+            batch = same[first:first + BATCH_TICKS]
+            trains = step_trains(samples, bounds[batch], int(tick_len))
+            spacing = estimate_spacing(trains.reshape(-1, int(tick_len)))
+            period = spacing * paula_clock / sample_rate
+            period = np.where(np.isnan(period), 0, np.clip(np.rint(period), 0, 65535))
+            periods[batch] = period.reshape(len(batch), -1).astype(np.uint16)
+
+    return periods, bounds
+
+def diff_periods(periods1, periods2):
+    """Compare two period tables tick by tick over their common length."""
+    num_ticks = min(len(periods1), len(periods2))
+    p1 = periods1[:num_ticks].astype(np.int32)
+    p2 = periods2[:num_ticks].astype(np.int32)
+    differ = p1 != p2
+
+    per_channel = []
+    for ch in range(p1.shape[1]):
+        ticks = np.flatnonzero(differ[:, ch])
+        per_channel.append({
+            'count': len(ticks),
+            'first': int(ticks[0]) if len(ticks) else None,
+            'ticks': ticks,
+        })
+
+    return {
+        'ticks': num_ticks,
+        'differ': differ,
+        'per_channel': per_channel,
+        'p1': p1,
+        'p2': p2,
+    }
+
+def print_diff(name1, name2, result, bounds, sample_rate=SAMPLE_RATE, show=8):
+    """Print per-channel differing tick counts and the first few differences (times from tick bounds)."""
+    num_ticks = result['ticks']
+    print(f"{name1} vs {name2}: {num_ticks:,} ticks compared")
+    if num_ticks == 0:
+        print()
+        return
+
+    for ch, info in enumerate(result['per_channel']):
+        pct = info['count'] / num_ticks * 100
+        if info['first'] is None:
+            print(f"  Ch{ch}: identical")
+            continue
+        when = f" ({bounds[info['first']] / sample_rate:.3f}s)" if info['first'] < len(bounds) else ""
+        print(f"  Ch{ch}: {info['count']:6,} ticks differ ({pct:5.2f}%), "
+              f"first at tick {info['first']:,}{when}")
+        for tick in info['ticks'][:show]:
+            print(f"         tick {tick:6d}: {result['p1'][tick, ch]:5d} -> {result['p2'][tick, ch]:5d}")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-tick PAULA period estimation.')
+    parser.add_argument('files', nargs='*', help='capture (.pcm) or two period tables with --diff')
+    parser.add_argument('-o', '--output', help='period table output (.npy) for a single capture')
+    parser.add_argument('--diff', action='store_true', help='compare two saved period tables')
+    parser.add_argument('--mod', default=MOD_FILE, help=f'module whose ticks cut the table (default {MOD_FILE})')
+    parser.add_argument('--bpm', type=float, help='fixed CIA tempo grid instead of the module\'s ticks')
+    parser.add_argument('--offset', type=int, default=0,
+                        help='frame of the first DMA restart, i.e. tick time 0 (default 0: trimmed capture)')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Per-Tick PAULA Period Estimation")
+    print("=" * 80)
+    print()
+
+    mod_file = None if args.bpm else args.mod
+    if mod_file and not Path(mod_file).exists():
+        print(f"Error: {mod_file} not found!")
+        return 1
+
+    if args.diff:
+        if len(args.files) != 2:
+            parser.error('--diff expects two period tables')
+        tables = [np.load(f) for f in args.files]
+        num_frames = None
+        if args.bpm:
+            num_frames = args.offset + max(len(t) for t in tables) * tick_frames(args.bpm)
+        bounds = tick_bounds(num_frames, mod_file, args.bpm, args.offset)
+        print_diff(args.files[0], args.files[1], diff_periods(*tables), bounds)
+        return 0
+
+    if args.files:
+        if len(args.files) != 1:
+            parser.error('expected a single capture (use --diff for two tables)')
+        files = {Path(args.files[0]).stem: args.files[0]}
+    else:
+        files = capture_files()
+
+    tables = {}
+    bounds = {}
+    for name, filename in files.items():
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+
+        periods, bounds[name] = estimate_periods(filename, mod_file, args.bpm, args.offset)
+        tables[name] = periods
+
+        out = args.output if args.output else f"{Path(filename).stem}_periods.npy"
+        np.save(out, periods)
+        voiced = np.count_nonzero(periods, axis=0)
+        print(f"  {name:12s}: {len(periods):,} ticks x {periods.shape[1]} channels "
+              f"({np.diff(bounds[name]).mean():.1f} frames/tick) -> {out}")
+        print(f"  {'':12s}  pitched ticks: Ch0={voiced[0]:,}  Ch1={voiced[1]:,}  "
+              f"Ch2={voiced[2]:,}  Ch3={voiced[3]:,}")
+    print()
+
+    names = list(tables)
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            result = diff_periods(tables[names[i]], tables[names[j]])
+            print_diff(names[i], names[j], result, bounds[names[i]])
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
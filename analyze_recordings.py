@@ -1,8 +1,16 @@
-#!/Users/erik/src/the_loop_test/venv/bin/python
+#!/usr/bin/env python3
 """
 Analyze and compare three ProTracker replayer recordings using NumPy.
 Now supports 4-channel raw PCM files (16-bit signed, 96000Hz).
 
+Captures with a different format (WAV files, or raw files with a
+<capture>.json sidecar, see paula_pcm.py) are compared at a common rate:
+both are streamed through a polyphase resampler block by block, and a
+4-channel capture is mixed to Amiga stereo when compared against a stereo one.
+
+Usage: ./analyze_recordings.py                              # the three default captures
+       ./analyze_recordings.py a.pcm b.wav [c.pcm ...] [--rate 44100]
+
 Requirements:
   - NumPy (install in venv)
 
@@ -11,31 +19,51 @@ To initialize venv:
   ./venv/bin/pip install numpy
 """
 
-import struct
+import argparse
+import itertools
 import sys
 import numpy as np
 from pathlib import Path
 
-def load_pcm(filename, sample_rate=96000, channels=4):
-    """Load raw PCM file and return numpy array of samples."""
-    with open(filename, 'rb') as f:
-        data = f.read()
-
-    # Convert to numpy array (16-bit signed)
-    samples = np.frombuffer(data, dtype=np.int16)
+from modfile import ModFile, play_mod, song_rows
+from paula_pcm import (SAMPLE_RATE, BLOCK_FRAMES, open_pcm, open_capture, paired_blocks, resampled_length,
+                       load_activity, union_spans, ordered_map, default_threads)
+from replayers import capture_files, replayer_pairs
+from results_db import DB_FILE, connect, start_run, record_capture, record_pair
 
-    # Reshape to (frames, channels)
-    samples = samples.reshape(-1, channels)
-
-    return samples, sample_rate
-
-def calculate_rms(samples):
+def load_pcm(filename, sample_rate=96000, channels=4):
+    """Load raw PCM file (interleaved or planar) and return numpy array of samples."""
+    return np.asarray(open_pcm(filename, channels)), sample_rate
+
+def channel_block_levels(samples, ch, start, stop):
+    """Sum of squares and max |value| of one channel over one block."""
+    block = np.asarray(samples[start:stop, ch], dtype=np.int64)
+    return ch, int(np.square(block).sum()), int(np.abs(block).max())
+
+def channel_levels(samples, threads=None, block_frames=BLOCK_FRAMES):
+    """
+    (rms, max_amp) per channel, as (channel, block) tasks on a thread pool
+    with exact integer accumulation.
+    """
+    channels = samples.shape[1]
+    sum_sq = [0] * channels
+    max_amp = [0] * channels
+    tasks = ((samples, ch, start, min(start + block_frames, len(samples)))
+             for start in range(0, len(samples), block_frames) for ch in range(channels))
+    for ch, part_sq, part_max in ordered_map(channel_block_levels, tasks, threads):
+        sum_sq[ch] += part_sq
+        max_amp[ch] = max(max_amp[ch], part_max)
+    with np.errstate(invalid='ignore'):
+        rms = np.sqrt(np.array(sum_sq, dtype=np.float64) / len(samples)) if len(samples) else np.full(channels, np.nan)
+    return rms, np.array(max_amp)
+
+def calculate_rms(samples, threads=None):
     """Calculate RMS (Root Mean Square) for each channel."""
-    return np.sqrt(np.mean(samples.astype(np.float64)**2, axis=0))
+    return channel_levels(samples, threads)[0]
 
-def calculate_max_amplitude(samples):
+def calculate_max_amplitude(samples, threads=None):
     """Calculate maximum amplitude for each channel."""
-    return np.max(np.abs(samples), axis=0)
+    return channel_levels(samples, threads)[1]
 
 def find_first_divergence(samples1, samples2, threshold=100):
     """Find first sample where recordings diverge beyond threshold."""
@@ -64,6 +92,234 @@ def calculate_per_channel_correlation(samples1, samples2):
         correlations.append(corr)
     return correlations
 
+def calculate_cross_channel_sums(samples1, samples2, window_frames=96000, block_frames=1 << 18,
+                                 rate1=SAMPLE_RATE, rate2=SAMPLE_RATE, rate=None, spans=None, threads=None):
+    """
+    One streaming pass collecting the per-window sums needed for every
+    channel-to-channel correlation: counts, sums and sums of squares per
+    channel of each recording, and the 4x4 cross products samples1^T samples2.
+    Products of int16 values summed in float64 stay exact for a full capture.
+    Captures at different rates are resampled on the fly, and with spans
+    only active frames are read (see compare_captures).
+    """
+    sums, _ = compare_captures(samples1, rate1, samples2, rate2, rate=rate,
+                               window_frames=window_frames, block_frames=block_frames, spans=spans,
+                               threads=threads)
+    return sums
+
+def piece_stats(offset, a, b, window_frames, threshold):
+    """
+    Partial accumulators of compare_captures() for one piece of a pair
+    starting at frame `offset`: per-window sums (pieces may start and end
+    mid-window), difference totals, first divergence and |diff| histogram.
+    """
+    n, channels = a.shape
+    diff = np.abs(a - b)
+
+    windows = []
+    pos = 0
+    while pos < n:
+        w0, lead = divmod(offset + pos, window_frames)
+        if lead or n - pos < window_frames:
+            end = min(n, pos + window_frames - lead)
+            count = 1
+        else:
+            count = (n - pos) // window_frames
+            end = pos + count * window_frames
+        wa = a[pos:end].reshape(count, -1, channels)
+        wb = b[pos:end].reshape(count, -1, channels)
+        windows.append((w0, wa.sum(axis=1), wb.sum(axis=1),
+                        np.einsum('wfi,wfi->wi', wa, wa), np.einsum('wfi,wfi->wi', wb, wb),
+                        np.einsum('wfi,wfj->wij', wa, wb),
+                        diff[pos:end].reshape(count, -1, channels).max(axis=1)))
+        pos = end
+
+    over = diff > threshold
+    over_frames = np.flatnonzero(over.any(axis=1))
+    return {
+        'windows': windows,
+        'total': diff.sum(),
+        'total_sq': np.einsum('fc,fc->', diff, diff),
+        'ch_total': diff.sum(axis=0),
+        'ch_max': diff.max(axis=0),
+        'ch_significant': over.sum(axis=0),
+        'significant': len(over_frames),
+        'first_divergence': offset + int(over_frames[0]) if len(over_frames) else None,
+        'histogram': np.bincount(np.rint(diff).astype(np.int64).ravel()),
+        'frames': n,
+    }
+
+def compare_captures(samples1, rate1, samples2, rate2, rate=None, window_frames=None,
+                     threshold=100, block_frames=1 << 18, spans=None, threads=None):
+    """
+    Single streaming pass over a pair of captures at a common rate (default:
+    the lower one; window_frames defaults to one second of it).
+
+    Returns (sums, analysis): the per-window cross-channel sums, and the
+    difference statistics of analyze_waveform_similarity() plus
+    'first_divergence', 'window_max' (max |difference| per window and
+    channel), 'window_frames', 'frames', 'active_frames' and 'rate'. The median
+    comes from a histogram of |difference| rounded to integers, which is
+    exact when no resampling is involved.
+
+    With spans (union_spans() of both activity indexes) only the active
+    frames are read; skipped frames are zero in both captures, so they only
+    count towards the window sizes and the zero bin of the histogram.
+
+    Blocks are processed on `threads` worker threads (default: all CPUs)
+    and merged in block order, so the result doesn't depend on the count.
+    """
+    if rate is None:
+        rate = min(rate1, rate2)
+    if window_frames is None:
+        window_frames = rate
+
+    channels = samples1.shape[1] if samples1.shape[1] == samples2.shape[1] else 2
+    frames = min(resampled_length(len(samples1), rate1, rate),
+                 resampled_length(len(samples2), rate2, rate))
+    num_windows = -(-frames // window_frames)
+
+    sums = {
+        'n': np.full(num_windows, float(window_frames)),
+        's1': np.zeros((num_windows, channels)),
+        's2': np.zeros((num_windows, channels)),
+        's11': np.zeros((num_windows, channels)),
+        's22': np.zeros((num_windows, channels)),
+        's12': np.zeros((num_windows, channels, channels)),
+    }
+    if num_windows:
+        sums['n'][-1] = frames - (num_windows - 1) * window_frames
+
+    window_max = np.zeros((num_windows, channels))
+    histogram = np.zeros(1, dtype=np.int64)
+    total = total_sq = 0.0
+    ch_total = np.zeros(channels)
+    ch_max = np.zeros(channels)
+    ch_significant = np.zeros(channels, dtype=np.int64)
+    significant = 0
+    first_divergence = None
+    active = 0
+
+    # Blocks hold whole windows so per-window sums never straddle blocks
+    block_frames = window_frames * max(1, block_frames // window_frames)
+
+    def pieces():
+        for offset, a, b in paired_blocks(samples1, rate1, samples2, rate2, rate, block_frames, spans):
+            n = min(len(a), frames - offset)
+            if n <= 0:
+                return
+            yield offset, a[:n], b[:n], window_frames, threshold
+
+    # Pieces are summed on worker threads and merged here in order
+    for part in ordered_map(piece_stats, pieces(), threads):
+        for w0, s1, s2, s11, s22, s12, wmax in part['windows']:
+            w = slice(w0, w0 + len(s1))
+            sums['s1'][w] += s1
+            sums['s2'][w] += s2
+            sums['s11'][w] += s11
+            sums['s22'][w] += s22
+            sums['s12'][w] += s12
+            window_max[w] = np.maximum(window_max[w], wmax)
+
+        total += part['total']
+        total_sq += part['total_sq']
+        ch_total += part['ch_total']
+        ch_max = np.maximum(ch_max, part['ch_max'])
+        ch_significant += part['ch_significant']
+        significant += part['significant']
+        if first_divergence is None:
+            first_divergence = part['first_divergence']
+
+        counts = part['histogram']
+        if len(counts) > len(histogram):
+            histogram = np.pad(histogram, (0, len(counts) - len(histogram)))
+        histogram[:len(counts)] += counts
+        active += part['frames']
+
+    histogram[0] += (frames - active) * channels
+    count = max(frames * channels, 1)
+    mean = total / count
+    cumulative = np.cumsum(histogram)
+    lo = int(np.searchsorted(cumulative, (count - 1) // 2 + 1))
+    hi = int(np.searchsorted(cumulative, count // 2 + 1))
+    analysis = {
+        'mean': mean,
+        'median': (lo + hi) / 2.0,
+        'std': np.sqrt(max(total_sq / count - mean * mean, 0.0)),
+        'max': float(ch_max.max()),
+        'pct_significant': significant / max(frames, 1) * 100,
+        'per_channel': [{'mean': ch_total[ch] / max(frames, 1),
+                         'max': ch_max[ch],
+                         'pct_significant': ch_significant[ch] / max(frames, 1) * 100}
+                        for ch in range(channels)],
+        'first_divergence': first_divergence,
+        'window_max': window_max,
+        'window_frames': window_frames,
+        'frames': frames,
+        'active_frames': active,
+        'rate': rate,
+    }
+    return sums, analysis
+
+def total_sums(sums):
+    """Collapse per-window sums into whole-recording sums (window axis of 1)."""
+    return {k: v.sum(axis=0, keepdims=True) for k, v in sums.items()}
+
+def correlation_matrix(sums):
+    """
+    Per-window 4x4 correlation matrices from cross-channel sums:
+    entry [w, i, j] correlates channel i of samples1 with channel j of samples2.
+    NaN where either channel is constant (e.g. silent) in that window.
+    """
+    n = sums['n'][:, np.newaxis]
+    var1 = sums['s11'] - sums['s1'] ** 2 / n
+    var2 = sums['s22'] - sums['s2'] ** 2 / n
+    cov = sums['s12'] - sums['s1'][:, :, np.newaxis] * sums['s2'][:, np.newaxis, :] / n[:, :, np.newaxis]
+    denom = np.sqrt(var1[:, :, np.newaxis] * var2[:, np.newaxis, :])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denom > 0, cov / denom, np.nan)
+
+def flattened_correlation(sums):
+    """Correlation of the flattened (all channels interleaved) recordings."""
+    n = sums['n'].sum() * sums['s1'].shape[1]
+    s1, s2 = sums['s1'].sum(), sums['s2'].sum()
+    s11, s22 = sums['s11'].sum(), sums['s22'].sum()
+    s12 = np.trace(sums['s12'], axis1=1, axis2=2).sum()
+    denom = np.sqrt((s11 - s1 * s1 / n) * (s22 - s2 * s2 / n))
+    return (s12 - s1 * s2 / n) / denom if denom > 0 else np.nan
+
+def best_permutations(matrices, margin=0.0):
+    """
+    Channel permutation maximizing the summed correlation for each matrix:
+    perm[i] is the samples2 channel best matching samples1 channel i.
+    The identity mapping is kept unless another one scores at least `margin`
+    higher. Returns (perms, scores) with perms shaped (windows, channels).
+    """
+    channels = matrices.shape[1]
+    perms = np.array(list(itertools.permutations(range(channels))))  # perms[0] is identity
+    scores = np.nan_to_num(matrices)[:, np.arange(channels), perms].sum(axis=2)
+    best = np.argmax(scores, axis=1)
+    best = np.where(scores[np.arange(len(best)), best] - scores[:, 0] > margin, best, 0)
+    return perms[best], scores[np.arange(len(best)), best]
+
+def remapped_correlation(sums, perms):
+    """
+    Per-channel correlation after mapping samples1 channel i onto samples2
+    channel perms[w, i] separately in every window w.
+    """
+    windows = np.arange(len(perms))[:, np.newaxis]
+    channels = np.arange(perms.shape[1])[np.newaxis, :]
+    remapped = {
+        'n': sums['n'],
+        's1': sums['s1'],
+        's2': sums['s2'][windows, perms],
+        's11': sums['s11'],
+        's22': sums['s22'][windows, perms],
+        's12': np.zeros_like(sums['s12']),
+    }
+    remapped['s12'][:, channels[0], channels[0]] = sums['s12'][windows, channels, perms]
+    return np.diagonal(correlation_matrix(total_sums(remapped))[0]).copy()
+
 def samples_to_time(sample_idx, sample_rate=96000):
     """Convert sample index to time string."""
     seconds = sample_idx / sample_rate
@@ -78,7 +334,7 @@ def analyze_waveform_similarity(samples1, samples2):
     s2 = samples2[:min_len]
 
     # Calculate absolute differences
-    diff = np.abs(s1 - s2)
+    diff = np.abs(s1.astype(np.int32) - s2)
 
     # Statistics
     mean_diff = np.mean(diff)
@@ -109,21 +365,52 @@ def analyze_waveform_similarity(samples1, samples2):
         'per_channel': per_channel
     }
 
+def channel_values(values, fmt):
+    """'Ch0=..  Ch1=..' line for per-channel values."""
+    return "  ".join(f"Ch{ch}={format(v, fmt)}" for ch, v in enumerate(values))
+
 def main():
+    parser = argparse.ArgumentParser(description='Compare replayer captures (correlation and differences).')
+    parser.add_argument('files', nargs='*',
+                        help='captures to compare pairwise (default: the PT2.3F, HippoPlayer and LSPlayer captures)')
+    parser.add_argument('--rate', type=int,
+                        help='common sample rate for the comparison (default: the lower rate of each pair)')
+    parser.add_argument('-j', '--threads', type=int, default=default_threads(),
+                        help='worker threads (default: $PAULA_THREADS or all CPUs; results are identical for any count)')
+    parser.add_argument('--db', default=DB_FILE, help=f'results database to record into (default {DB_FILE})')
+    parser.add_argument('--no-db', action='store_true', help="don't record the results")
+    parser.add_argument('--mod', default='the_loop.mod',
+                        help='module for song positions of the recorded windows (default the_loop.mod)')
+    args = parser.parse_args()
+
     print("=" * 80)
     print("ProTracker Replayer Audio Comparison (4-Channel Raw PCM, NumPy)")
     print("=" * 80)
     print()
 
     # Load all three recordings
-    files = {
-        'PT2.3F': 'pt23f_channels_raw.pcm',
-        'HippoPlayer': 'hippoplayer_channels_raw.pcm',
-        'LSPlayer': 'lsplayer_channels_raw.pcm'
-    }
+    if args.files:
+        files = {Path(f).stem.replace('_channels_raw', ''): f for f in args.files}
+        if len(files) < 2:
+            parser.error('need at least two captures with distinct names')
+        comparisons = replayer_pairs(files)
+    else:
+        files = capture_files()
+        comparisons = replayer_pairs(files)
 
     recordings = {}
-    sample_rate = 96000
+    rates = {}
+    activity = {}
+    capture_ids = {}
+
+    conn = None
+    if not args.no_db:
+        conn = connect(args.db)
+        run_id = start_run(conn, 'analyze_recordings')
+    song = None
+    if conn is not None and Path(args.mod).exists():
+        ticks, channels = play_mod(ModFile(args.mod))
+        song = lambda seconds: song_rows(ticks, channels, seconds)
 
     print("Loading recordings...")
     for name, filename in files.items():
@@ -131,12 +418,15 @@ def main():
             print(f"Error: {filename} not found!")
             return 1
 
-        samples, sr = load_pcm(filename)
+        samples, sr = open_capture(filename)
         recordings[name] = samples
+        rates[name] = sr
+        activity[name] = load_activity(filename)
 
         duration = len(samples) / sr
+        active = [int((ends - starts).sum()) / max(len(samples), 1) * 100 for starts, ends in activity[name]]
         print(f"  {name:12s}: {len(samples):,} frames, {duration:.2f}s, "
-              f"{samples.shape[1]} channels @ {sr}Hz")
+              f"{samples.shape[1]} channels @ {sr}Hz, active " + " ".join(f"{p:.0f}%" for p in active))
 
     print()
 
@@ -147,12 +437,21 @@ def main():
     print()
 
     for name, samples in recordings.items():
-        rms = calculate_rms(samples)
-        max_amp = calculate_max_amplitude(samples)
+        if not len(samples):
+            if conn is not None:
+                capture_ids[name] = record_capture(conn, run_id, files[name], 0, rates[name],
+                                                   samples.shape[1], name=name)
+            print(f"{name}: empty capture")
+            print()
+            continue
+        rms, max_amp = channel_levels(samples, args.threads)
+        if conn is not None:
+            capture_ids[name] = record_capture(conn, run_id, files[name], len(samples), rates[name],
+                                               samples.shape[1], rms, max_amp, name=name)
 
         print(f"{name}:")
-        print(f"  RMS:     Ch0={rms[0]:7.2f}  Ch1={rms[1]:7.2f}  Ch2={rms[2]:7.2f}  Ch3={rms[3]:7.2f}")
-        print(f"  Max Amp: Ch0={int(max_amp[0]):5d}  Ch1={int(max_amp[1]):5d}  Ch2={int(max_amp[2]):5d}  Ch3={int(max_amp[3]):5d}")
+        print(f"  RMS:     {channel_values(rms, '7.2f')}")
+        print(f"  Max Amp: {channel_values(max_amp.astype(int), '5d')}")
         print()
 
     # Pairwise comparisons
@@ -161,42 +460,58 @@ def main():
     print("=" * 80)
     print()
 
-    comparisons = [
-        ('PT2.3F', 'HippoPlayer'),
-        ('PT2.3F', 'LSPlayer'),
-        ('HippoPlayer', 'LSPlayer')
-    ]
+    pair_correlation = {}
 
     for name1, name2 in comparisons:
         samples1 = recordings[name1]
         samples2 = recordings[name2]
-
-        # Ensure same length
-        min_len = min(len(samples1), len(samples2))
-        samples1 = samples1[:min_len]
-        samples2 = samples2[:min_len]
-
-        # Calculate correlation
-        correlation = calculate_correlation(samples1, samples2)
-        per_ch_corr = calculate_per_channel_correlation(samples1, samples2)
-
-        # Find first divergence
-        divergence_idx = find_first_divergence(samples1, samples2, threshold=100)
-
-        # Detailed analysis
-        analysis = analyze_waveform_similarity(samples1, samples2)
+        rate = args.rate or min(rates[name1], rates[name2])
+
+        # One pass for the correlations and the difference statistics
+        try:
+            sums, analysis = compare_captures(samples1, rates[name1], samples2, rates[name2], rate=rate,
+                                              spans=union_spans(activity[name1], activity[name2]),
+                                              threads=args.threads)
+        except ValueError as e:
+            print(f"{name1} vs {name2}: skipped ({e})")
+            print()
+            continue
+        matrix = correlation_matrix(total_sums(sums))[0]
+        correlation = flattened_correlation(sums)
+        per_ch_corr = np.diagonal(matrix)
+        pair_correlation[(name1, name2)] = correlation
+
+        window_matrices = correlation_matrix(sums)
+        window_perms, _ = best_permutations(window_matrices, margin=0.1)
+        global_perm, _ = best_permutations(matrix[np.newaxis], margin=0.1)
+        remapped_corr = remapped_correlation(sums, window_perms)
+        identity = np.arange(len(matrix))
+        remapped_windows = np.flatnonzero(np.any(window_perms != identity, axis=1))
+        divergence_idx = analysis['first_divergence']
+
+        if conn is not None:
+            starts = np.arange(len(window_perms)) * analysis['window_frames'] / rate
+            record_pair(conn, run_id, capture_ids[name1], capture_ids[name2], analysis, correlation,
+                        per_ch_corr, remapped_corr, np.diagonal(window_matrices, axis1=1, axis2=2),
+                        rows=None if song is None else song(starts))
 
         print(f"{name1} vs {name2}:")
+        if rates[name1] != rate or rates[name2] != rate or samples1.shape[1] != samples2.shape[1]:
+            layout = "stereo" if len(matrix) == 2 else f"{len(matrix)} channels"
+            print(f"  Compared at:            {rate}Hz, {layout} "
+                  f"({rates[name1]}Hz x {samples1.shape[1]} vs {rates[name2]}Hz x {samples2.shape[1]})")
+        if analysis['active_frames'] < analysis['frames']:
+            print(f"  Active frames:          {analysis['active_frames']:,} / {analysis['frames']:,} "
+                  f"(silent in both elsewhere, skipped)")
         print(f"  Overall correlation:    {correlation:.6f}")
-        print(f"  Per-channel correlation: Ch0={per_ch_corr[0]:.6f}  Ch1={per_ch_corr[1]:.6f}  "
-              f"Ch2={per_ch_corr[2]:.6f}  Ch3={per_ch_corr[3]:.6f}")
+        print(f"  Per-channel correlation: {channel_values(per_ch_corr, '.6f')}")
         print(f"  Mean difference:        {analysis['mean']:.2f}")
         print(f"  Median difference:      {analysis['median']:.2f}")
         print(f"  Std deviation:          {analysis['std']:.2f}")
         print(f"  Max difference:         {analysis['max']:.2f}")
 
         if divergence_idx is not None:
-            time_str = samples_to_time(divergence_idx, sample_rate)
+            time_str = samples_to_time(divergence_idx, rate)
             print(f"  First divergence:       Frame {divergence_idx:,} ({time_str})")
         else:
             print(f"  First divergence:       None detected (threshold=100)")
@@ -204,14 +519,29 @@ def main():
         print(f"  Significant diffs:      {analysis['pct_significant']:.2f}% of samples")
 
         # Per-channel differences
-        print(f"  Per-channel mean diff:  Ch0={analysis['per_channel'][0]['mean']:.2f}  "
-              f"Ch1={analysis['per_channel'][1]['mean']:.2f}  "
-              f"Ch2={analysis['per_channel'][2]['mean']:.2f}  "
-              f"Ch3={analysis['per_channel'][3]['mean']:.2f}")
-        print(f"  Per-channel max diff:   Ch0={analysis['per_channel'][0]['max']:.0f}  "
-              f"Ch1={analysis['per_channel'][1]['max']:.0f}  "
-              f"Ch2={analysis['per_channel'][2]['max']:.0f}  "
-              f"Ch3={analysis['per_channel'][3]['max']:.0f}")
+        print(f"  Per-channel mean diff:  "
+              f"{channel_values([ch['mean'] for ch in analysis['per_channel']], '.2f')}")
+        print(f"  Per-channel max diff:   "
+              f"{channel_values([ch['max'] for ch in analysis['per_channel']], '.0f')}")
+
+        # Cross-channel correlation (rows: name1 channels, columns: name2 channels)
+        print(f"  Cross-channel correlation ({name1} rows x {name2} columns):")
+        for i, row in enumerate(matrix):
+            print(f"    Ch{i}: " + "  ".join(f"{c:9.6f}" for c in row))
+        print(f"  Best global mapping:    " +
+              "  ".join(f"Ch{i}->Ch{j}" for i, j in enumerate(global_perm[0])))
+        print(f"  Remapped windows:       {len(remapped_windows):,} / {len(window_perms):,} "
+              f"(1s windows whose best mapping is not the identity)")
+        for w in remapped_windows[:5]:
+            mapping = "  ".join(f"Ch{i}->Ch{j}" for i, j in enumerate(window_perms[w]) if i != j)
+            print(f"    {samples_to_time(w * rate, rate)}: {mapping}")
+        print(f"  Remapped correlation:   {channel_values(remapped_corr, '.6f')}")
+        print()
+
+    if conn is not None:
+        conn.commit()
+        conn.close()
+        print(f"Results recorded in {args.db} (run {run_id}); query with ./paula.py query")
         print()
 
     # Overall assessment
@@ -220,43 +550,24 @@ def main():
     print("=" * 80)
     print()
 
-    # Check if all three are identical
-    pt23_hippo_corr = calculate_correlation(
-        recordings['PT2.3F'][:min(len(recordings['PT2.3F']), len(recordings['HippoPlayer']))],
-        recordings['HippoPlayer'][:min(len(recordings['PT2.3F']), len(recordings['HippoPlayer']))]
-    )
-    pt23_lsp_corr = calculate_correlation(
-        recordings['PT2.3F'][:min(len(recordings['PT2.3F']), len(recordings['LSPlayer']))],
-        recordings['LSPlayer'][:min(len(recordings['PT2.3F']), len(recordings['LSPlayer']))]
-    )
-    hippo_lsp_corr = calculate_correlation(
-        recordings['HippoPlayer'][:min(len(recordings['HippoPlayer']), len(recordings['LSPlayer']))],
-        recordings['LSPlayer'][:min(len(recordings['HippoPlayer']), len(recordings['LSPlayer']))]
-    )
-
+    # Check if all recordings are identical (correlations from the pairwise pass)
     threshold = 0.9999
 
-    if pt23_hippo_corr > threshold and pt23_lsp_corr > threshold and hippo_lsp_corr > threshold:
-        print(f"✓ All three recordings are effectively identical (correlation > {threshold})")
+    if all(corr > threshold for corr in pair_correlation.values()):
+        print(f"✓ All {len(recordings)} recordings are effectively identical (correlation > {threshold})")
         print("  No significant playback differences detected.")
     else:
         print("✗ Recordings show significant differences:")
-        if pt23_hippo_corr <= threshold:
-            print(f"  - PT2.3F differs from HippoPlayer (corr: {pt23_hippo_corr:.6f})")
-        if pt23_lsp_corr <= threshold:
-            print(f"  - PT2.3F differs from LSPlayer (corr: {pt23_lsp_corr:.6f})")
-        if hippo_lsp_corr <= threshold:
-            print(f"  - HippoPlayer differs from LSPlayer (corr: {hippo_lsp_corr:.6f})")
+        for (name1, name2), corr in pair_correlation.items():
+            if not corr > threshold:
+                print(f"  - {name1} differs from {name2} (corr: {corr:.6f})")
 
         print()
         print("  Recommended next steps:")
-        print("  1. Convert to WAV for visual inspection:")
-        print("     ffmpeg -f s16le -ar 96000 -ac 4 -i <file>.pcm <file>.wav")
-        print("  2. Extract individual channels for analysis:")
-        print("     ffmpeg -f s16le -ar 96000 -ac 4 -i <file>.pcm -filter_complex \\")
-        print("       \"channelsplit=channel_layout=quad[c0][c1][c2][c3]\" \\")
-        print("       -map \"[c0]\" ch0.wav -map \"[c1]\" ch1.wav \\")
-        print("       -map \"[c2]\" ch2.wav -map \"[c3]\" ch3.wav")
+        print("  1. Convert to WAV for visual inspection (quad, stereo mix and per-channel files):")
+        print("     ./export_wav.py <file>.pcm")
+        print("  2. Generate per-channel difference files:")
+        print("     ./generate_channel_diffs.py")
 
     print()
     return 0
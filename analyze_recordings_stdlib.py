@@ -4,13 +4,26 @@ Analyze and compare three ProTracker replayer recordings (stdlib version).
 Now supports 4-channel raw PCM files (16-bit signed, 96000Hz).
 """
 
+import argparse
 import struct
 import sys
 import math
 from pathlib import Path
 
+from planar_pcm import read_header, read_planes
+from replayers import capture_files, replayer_pairs
+
 def load_pcm(filename, sample_rate=96000, channels=4):
-    """Load raw PCM file and return list of samples."""
+    """Load raw PCM file (interleaved or planar) and return list of samples."""
+    if read_header(filename) is not None:
+        # Planar: interleave the channel arrays back into one list
+        sample_rate, planes = read_planes(filename)
+        channels = len(planes)
+        samples = [0] * sum(len(plane) for plane in planes)
+        for ch, plane in enumerate(planes):
+            samples[ch::channels] = plane
+        return samples, sample_rate, channels
+
     with open(filename, 'rb') as f:
         data = f.read()
 
@@ -152,17 +165,20 @@ def analyze_waveform_similarity(samples1, samples2, channels=4):
     }
 
 def main():
+    parser = argparse.ArgumentParser(description='Compare replayer captures (stdlib only).')
+    parser.add_argument('files', nargs='*', help='captures to compare pairwise (default: registry captures)')
+    args = parser.parse_args()
+
     print("=" * 80)
     print("ProTracker Replayer Audio Comparison (4-Channel Raw PCM, stdlib)")
     print("=" * 80)
     print()
 
     # Load all three recordings
-    files = {
-        'PT2.3F': 'pt23f_channels_raw.pcm',
-        'HippoPlayer': 'hippoplayer_channels_raw.pcm',
-        'LSPlayer': 'lsplayer_channels_raw.pcm'
-    }
+    if args.files:
+        files = {Path(f).stem.replace('_channels_raw', ''): f for f in args.files}
+    else:
+        files = capture_files()
 
     recordings = {}
     params = {}
@@ -207,11 +223,7 @@ def main():
     print("=" * 80)
     print()
 
-    comparisons = [
-        ('PT2.3F', 'HippoPlayer'),
-        ('PT2.3F', 'LSPlayer'),
-        ('HippoPlayer', 'LSPlayer')
-    ]
+    comparisons = replayer_pairs(files)
 
     for name1, name2 in comparisons:
         samples1 = recordings[name1]
@@ -259,35 +271,23 @@ def main():
     print("=" * 80)
     print()
 
-    # Check if all three are identical
-    pt23_hippo_identical = calculate_correlation(recordings['PT2.3F'], recordings['HippoPlayer']) > 0.9999
-    pt23_lsp_identical = calculate_correlation(recordings['PT2.3F'], recordings['LSPlayer']) > 0.9999
-    hippo_lsp_identical = calculate_correlation(recordings['HippoPlayer'], recordings['LSPlayer']) > 0.9999
+    # Check if all recordings are identical
+    pair_correlation = {(name1, name2): calculate_correlation(recordings[name1], recordings[name2])
+                        for name1, name2 in comparisons}
 
-    if pt23_hippo_identical and pt23_lsp_identical and hippo_lsp_identical:
-        print("✓ All three recordings are effectively identical (correlation > 0.9999)")
+    if all(corr > 0.9999 for corr in pair_correlation.values()):
+        print(f"✓ All {len(recordings)} recordings are effectively identical (correlation > 0.9999)")
         print("  No significant playback differences detected.")
     else:
         print("✗ Recordings show differences:")
-        if not pt23_hippo_identical:
-            corr = calculate_correlation(recordings['PT2.3F'], recordings['HippoPlayer'])
-            print(f"  - PT2.3F differs from HippoPlayer (corr: {corr:.6f})")
-        if not pt23_lsp_identical:
-            corr = calculate_correlation(recordings['PT2.3F'], recordings['LSPlayer'])
-            print(f"  - PT2.3F differs from LSPlayer (corr: {corr:.6f})")
-        if not hippo_lsp_identical:
-            corr = calculate_correlation(recordings['HippoPlayer'], recordings['LSPlayer'])
-            print(f"  - HippoPlayer differs from LSPlayer (corr: {corr:.6f})")
+        for (name1, name2), corr in pair_correlation.items():
+            if not corr > 0.9999:
+                print(f"  - {name1} differs from {name2} (corr: {corr:.6f})")
 
         print()
         print("  Recommended next steps:")
-        print("  1. Convert to WAV for visual inspection:")
-        print("     ffmpeg -f s16le -ar 96000 -ac 4 -i <file>.pcm <file>.wav")
-        print("  2. Extract individual channels for analysis:")
-        print("     ffmpeg -f s16le -ar 96000 -ac 4 -i <file>.pcm -filter_complex \\")
-        print("       \"channelsplit=channel_layout=quad[c0][c1][c2][c3]\" \\")
-        print("       -map \"[c0]\" ch0.wav -map \"[c1]\" ch1.wav \\")
-        print("       -map \"[c2]\" ch2.wav -map \"[c3]\" ch3.wav")
+        print("  1. Convert to WAV for visual inspection (quad, stereo mix and per-channel files):")
+        print("     ./export_wav.py <file>.pcm")
 
     print()
     return 0
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Attribute each stretch of every capture channel to the MOD sample playing it.
+
+With uae_sound_interpol = none a channel is a zero-order hold of
+byte * volume: collapsing runs of equal frames gives back the sample bytes
+(consecutive equal bytes merge into one run), whatever the period. Dividing
+a window of K run values by their GCD also removes the volume. The same
+fingerprint is computed for every position in every MOD sample (including
+one pass through its loop) and stored in a sorted hash index.
+
+Each capture channel is then streamed in blocks: run values are
+fingerprinted with a sliding window and looked up with a binary search, so
+the cost is linear in the capture rather than a matched filter per sample.
+Matches are merged into a compact attribution track of
+(channel, start frame, end frame, sample, offset) segments, saved as
+<capture>_attribution.npy.
+
+With several captures, the tracks are compared on a 1ms grid and every
+disagreement is charged to the instrument the first capture was playing, so
+divergence can be reported per instrument.
+
+Usage: ./analyze_samples.py                       # all three replayers + pairwise comparison
+       ./analyze_samples.py capture.pcm [...] [--mod the_loop.mod] [--window 12]
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import sys
+import numpy as np
+from pathlib import Path
+from numpy.lib.stride_tricks import sliding_window_view
+
+from modfile import ModFile
+from paula_pcm import SAMPLE_RATE, BLOCK_FRAMES, open_pcm, iter_blocks
+from replayers import capture_files
+
+WINDOW = 12              # runs per fingerprint
+MAX_RUN = 256            # frames; longer holds are silence or DMA off, not sample data
+MERGE_GAP = 480          # frames (5ms) between matches that still belong to one segment
+HOP = 96                 # 1ms grid for comparing tracks
+HASH_MULT = np.uint64(0x100000001B3)
+
+ATTRIBUTION_DTYPE = np.dtype([
+    ('channel', '<u1'),
+    ('sample', '<u1'),
+    ('start', '<u4'),
+    ('end', '<u4'),
+    ('offset', '<u4'),
+])
+
+def fingerprint(windows):
+    """
+    Volume-invariant hashes of (n, K) run-value windows.
+    Returns (hashes uint64, valid bool): windows that are all zero are invalid.
+    """
+    values = windows.astype(np.int64)
+    g = np.gcd.reduce(np.abs(values), axis=1)
+    valid = g > 0
+    values = values // np.where(valid, g, 1)[:, None]
+
+    h = np.zeros(len(values), dtype=np.uint64)
+    for k in range(values.shape[1]):
+        h = h * HASH_MULT + (values[:, k] + 128).astype(np.uint64)
+    return h, valid
+
+def played_bytes(mod, s):
+    """Bytes of sample s as PAULA plays them (with one extra loop pass) and their offsets."""
+    data = mod.data[s.start:s.start + s.length * 2]
+    offsets = np.arange(len(data))
+    if s.repeat + s.replen > 1:
+        end = min(len(data), (s.repeat + s.replen) * 2)
+        loop = np.arange(s.repeat * 2, end)
+        offsets = np.concatenate((np.arange(end), loop))
+        data = mod.data[s.start + offsets]
+    return data, offsets
+
+class SampleIndex:
+    """Sorted fingerprint index over all samples of a MOD."""
+
+    def __init__(self, mod, window=WINDOW):
+        self.window = window
+        hashes, samples, offsets = [], [], []
+        for s in mod.samples[1:]:
+            if s.length < 2:
+                continue
+            data, positions = played_bytes(mod, s)
+            keep = np.ones(len(data), dtype=bool)
+            keep[1:] = data[1:] != data[:-1]
+            runs = data[keep]
+            if len(runs) < window:
+                continue
+            h, valid = fingerprint(sliding_window_view(runs, window))
+            hashes.append(h[valid])
+            samples.append(np.full(np.count_nonzero(valid), s.number, dtype=np.uint8))
+            offsets.append(positions[keep][:len(h)][valid].astype(np.uint32))
+
+        hashes = np.concatenate(hashes) if hashes else np.zeros(0, np.uint64)
+        samples = np.concatenate(samples) if samples else np.zeros(0, np.uint8)
+        offsets = np.concatenate(offsets) if offsets else np.zeros(0, np.uint32)
+
+        order = np.argsort(hashes, kind='stable')
+        self.hashes = hashes[order]
+        self.samples = samples[order]
+        self.offsets = offsets[order]
+
+        # A hash shared by different samples can't attribute anything
+        self.unique = np.ones(len(self.hashes), dtype=bool)
+        if len(self.hashes):
+            first = np.ones(len(self.hashes), dtype=bool)
+            first[1:] = self.hashes[1:] != self.hashes[:-1]
+            bounds = np.flatnonzero(first)
+            group = np.cumsum(first) - 1
+            lo = np.minimum.reduceat(self.samples, bounds)
+            hi = np.maximum.reduceat(self.samples, bounds)
+            self.unique = (lo == hi)[group]
+
+    def lookup(self, hashes):
+        """(sample, offset) for each hash; sample 0 where unknown or ambiguous."""
+        if len(self.hashes) == 0:
+            return np.zeros(len(hashes), np.uint8), np.zeros(len(hashes), np.uint32)
+        idx = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        found = (self.hashes[idx] == hashes) & self.unique[idx]
+        sample = np.where(found, self.samples[idx], 0).astype(np.uint8)
+        offset = np.where(found, self.offsets[idx], 0).astype(np.uint32)
+        return sample, offset
+
+def channel_runs(samples, ch, block_frames=BLOCK_FRAMES):
+    """Yield (run start frames, run lengths, run values) for one channel, block by block."""
+    prev = None
+    pending = None   # last run of the previous block, whose length isn't known yet
+    for offset, block in iter_blocks(samples, block_frames):
+        col = np.asarray(block[:, ch])
+        change = np.ones(len(col), dtype=bool)
+        change[1:] = col[1:] != col[:-1]
+        if prev is not None:
+            change[0] = col[0] != prev
+        starts = np.flatnonzero(change) + offset
+        values = col[change]
+        prev = col[-1]
+
+        if pending is not None:
+            starts = np.concatenate(([pending[0]], starts))
+            values = np.concatenate(([pending[1]], values))
+        ends = np.append(starts[1:], offset + len(col))
+        pending = (starts[-1], values[-1])
+        yield starts[:-1], (ends - starts)[:-1], values[:-1]
+
+    if pending is not None:
+        yield np.array([pending[0]]), np.array([len(samples) - pending[0]]), np.array([pending[1]])
+
+def attribute_channel(samples, ch, index, block_frames=BLOCK_FRAMES):
+    """Match every window of runs on one channel. Returns (frames, sample, offset) of matches."""
+    k = index.window
+    tail_starts = np.zeros(0, np.int64)
+    tail_lens = np.zeros(0, np.int64)
+    tail_values = np.zeros(0, np.int16)
+    frames, sample, offset = [], [], []
+
+    for starts, lens, values in channel_runs(samples, ch, block_frames):
+        starts = np.concatenate((tail_starts, starts))
+        lens = np.concatenate((tail_lens, lens))
+        values = np.concatenate((tail_values, values))
+        if len(values) >= k:
+            h, valid = fingerprint(sliding_window_view(values, k))
+            # Every run inside the window must look like PAULA stepping through bytes
+            long_run = sliding_window_view(lens, k).max(axis=1) > MAX_RUN
+            s, o = index.lookup(h)
+            hit = valid & ~long_run & (s > 0)
+            frames.append(starts[:len(h)][hit])
+            sample.append(s[hit])
+            offset.append(o[hit])
+        keep = max(len(values) - (k - 1), 0)
+        tail_starts, tail_lens, tail_values = starts[keep:], lens[keep:], values[keep:]
+
+    if not frames:
+        return np.zeros(0, np.int64), np.zeros(0, np.uint8), np.zeros(0, np.uint32)
+    return np.concatenate(frames), np.concatenate(sample), np.concatenate(offset)
+
+def merge_segments(ch, frames, sample, offset, gap=MERGE_GAP):
+    """Collapse per-window matches into (channel, sample, start, end, offset) segments."""
+    if len(frames) == 0:
+        return np.zeros(0, dtype=ATTRIBUTION_DTYPE)
+    new = np.ones(len(frames), dtype=bool)
+    new[1:] = (sample[1:] != sample[:-1]) | (np.diff(frames) > gap)
+    first = np.flatnonzero(new)
+    last = np.append(first[1:], len(frames)) - 1
+
+    track = np.zeros(len(first), dtype=ATTRIBUTION_DTYPE)
+    track['channel'] = ch
+    track['sample'] = sample[first]
+    track['start'] = frames[first]
+    track['end'] = frames[last] + 1
+    track['offset'] = offset[first]
+    return track
+
+def attribute_capture(filename, index, block_frames=BLOCK_FRAMES):
+    """Attribution track (ATTRIBUTION_DTYPE) for all channels of a capture."""
+    samples = open_pcm(filename)
+    tracks = []
+    for ch in range(samples.shape[1]):
+        frames, sample, offset = attribute_channel(samples, ch, index, block_frames)
+        tracks.append(merge_segments(ch, frames, sample, offset))
+    return np.concatenate(tracks), len(samples)
+
+def timeline(track, num_frames, channels=4, hop=HOP):
+    """Per-hop sample labels (points, channels) uint8 from an attribution track, 0 = unknown."""
+    labels = np.zeros((num_frames // hop + 1, channels), dtype=np.uint8)
+    for seg in track:
+        labels[seg['start'] // hop:(seg['end'] + hop - 1) // hop, seg['channel']] = seg['sample']
+    return labels
+
+def instrument_seconds(track, channels=4):
+    """{channel: {sample: seconds}} attributed in a track."""
+    result = {ch: {} for ch in range(channels)}
+    for seg in track:
+        per = result[int(seg['channel'])]
+        per[int(seg['sample'])] = per.get(int(seg['sample']), 0.0) + (seg['end'] - seg['start']) / SAMPLE_RATE
+    return result
+
+def compare_tracks(labels1, labels2):
+    """
+    Per-channel disagreement charged to the first capture's instrument.
+    Returns {channel: {sample: (points compared, points differing)}}.
+    """
+    n = min(len(labels1), len(labels2))
+    a, b = labels1[:n], labels2[:n]
+    result = {}
+    for ch in range(a.shape[1]):
+        both = (a[:, ch] > 0) & (b[:, ch] > 0)
+        differ = both & (a[:, ch] != b[:, ch])
+        compared = np.bincount(a[both, ch], minlength=256)
+        wrong = np.bincount(a[differ, ch], minlength=256)
+        result[ch] = {int(s): (int(compared[s]), int(wrong[s])) for s in np.flatnonzero(compared)}
+    return result
+
+def print_attribution(name, track, num_frames):
+    """Print how much of each channel was attributed and to which samples."""
+    coverage = instrument_seconds(track)
+    total = num_frames / SAMPLE_RATE
+    print(f"  {name}: {len(track):,} segments")
+    for ch, per in coverage.items():
+        attributed = sum(per.values())
+        top = sorted(per.items(), key=lambda kv: -kv[1])[:6]
+        samples = "  ".join(f"#{s}:{sec:.1f}s" for s, sec in top)
+        print(f"    Ch{ch}: {attributed:6.1f}s of {total:.1f}s attributed   {samples}")
+    print()
+
+def print_comparison(name1, name2, result, hop=HOP):
+    """Print per-instrument disagreement between two attribution tracks."""
+    print(f"{name1} vs {name2} (per instrument playing in {name1}):")
+    for ch, per in result.items():
+        differing = {s: v for s, v in per.items() if v[1]}
+        if not differing:
+            print(f"  Ch{ch}: all attributed time agrees")
+            continue
+        parts = []
+        for s, (compared, wrong) in sorted(differing.items(), key=lambda kv: -kv[1][1])[:5]:
+            parts.append(f"#{s} {wrong * hop / SAMPLE_RATE:.2f}s/{compared * hop / SAMPLE_RATE:.1f}s")
+        print(f"  Ch{ch}: " + "  ".join(parts))
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Attribute capture channels to MOD samples.')
+    parser.add_argument('files', nargs='*', help='raw 4-channel PCM captures')
+    parser.add_argument('--mod', default='the_loop.mod', help='module the captures play (default the_loop.mod)')
+    parser.add_argument('--window', type=int, default=WINDOW,
+                        help=f'runs per fingerprint (default {WINDOW})')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Sample Attribution (hashed PAULA fingerprints)")
+    print("=" * 80)
+    print()
+
+    if args.files:
+        files = {Path(f).stem: f for f in args.files}
+    else:
+        files = capture_files()
+
+    for filename in [args.mod] + list(files.values()):
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+
+    index = SampleIndex(ModFile(args.mod), window=args.window)
+    print(f"  Index: {len(index.hashes):,} fingerprints "
+          f"({np.count_nonzero(index.unique):,} unambiguous) from {args.mod}")
+    print()
+
+    labels = {}
+    for name, filename in files.items():
+        track, num_frames = attribute_capture(filename, index)
+        out = f"{Path(filename).stem}_attribution.npy"
+        np.save(out, track)
+        print_attribution(name, track, num_frames)
+        print(f"    Saved: {out}")
+        print()
+        labels[name] = timeline(track, num_frames)
+
+    names = list(labels)
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            print_comparison(names[i], names[j], compare_tracks(labels[names[i]], labels[names[j]]))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
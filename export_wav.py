@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Export a raw 4-channel PAULA capture to WAV files in a single pass.
+
+Replaces the ffmpeg channelsplit/amix round-trips: the capture is read once,
+block by block, and every target is written from the same block:
+
+  <name>_ch0.wav .. <name>_ch3.wav   one mono file per PAULA channel
+  <capture>.wav                      all four channels (quad)
+  <name>_stereo.wav                  Amiga panning: Ch0+Ch3 left, Ch1+Ch2 right
+
+stereo_separation works like UAE's: 100% is the hard Amiga panning, 0% is
+mono; in between each side gets (1 - separation) / 2 of the other side. The
+mix is a single matrix product per block. Channels are at most +/-8192, so
+the stereo sum fits 16 bits without scaling.
+
+Other captures (see open_capture() in paula_pcm.py) are written at their own
+rate and channel count; a stereo capture's mix keeps its two sides.
+
+Usage: ./export_wav.py pt23f_channels_raw.pcm                 # all targets
+       ./export_wav.py capture.pcm --stereo --separation 70   # only the stereo mix
+       ./export_wav.py capture.pcm --channels -o wav/         # only per-channel files
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import sys
+import wave
+import numpy as np
+from pathlib import Path
+
+from paula_pcm import SAMPLE_RATE, CHANNELS, BLOCK_FRAMES, open_capture, iter_blocks, stereo_matrix
+
+def open_wav(filename, channels, sample_rate=SAMPLE_RATE):
+    """Open a 16-bit PCM WAV for writing."""
+    wav = wave.open(str(filename), 'wb')
+    wav.setnchannels(channels)
+    wav.setsampwidth(2)
+    wav.setframerate(sample_rate)
+    return wav
+
+def output_names(filename, out_dir=None, channels=CHANNELS):
+    """Target filenames for a capture: (per-channel list, quad, stereo)."""
+    path = Path(filename)
+    out_dir = Path(out_dir) if out_dir else path.parent
+    name = path.stem.replace('_channels_raw', '')
+    channel_files = [out_dir / f"{name}_ch{ch}.wav" for ch in range(channels)]
+    return channel_files, out_dir / f"{path.stem}.wav", out_dir / f"{name}_stereo.wav"
+
+def mix_matrix(separation, channels):
+    """Stereo mixing matrix: Amiga panning for PAULA channels, a stereo capture keeps its sides."""
+    if channels == 2:
+        own, other = (1.0 + separation) / 2.0, (1.0 - separation) / 2.0
+        return np.array([[own, other], [other, own]], dtype=np.float32)
+    return stereo_matrix(separation, channels)
+
+def export(filename, split=True, quad=True, stereo=True, separation=1.0,
+           out_dir=None, block_frames=BLOCK_FRAMES):
+    """Write the selected WAV targets for one capture (at its own rate). Returns list of files written."""
+    samples, sample_rate = open_capture(filename)
+    channel_files, quad_file, stereo_file = output_names(filename, out_dir, samples.shape[1])
+    matrix = mix_matrix(separation, samples.shape[1])
+
+    writers = {}
+    if split:
+        for name in channel_files:
+            writers[name] = open_wav(name, 1, sample_rate)
+    if quad:
+        writers[quad_file] = open_wav(quad_file, samples.shape[1], sample_rate)
+    if stereo:
+        writers[stereo_file] = open_wav(stereo_file, 2, sample_rate)
+
+    try:
+        for _, block in iter_blocks(samples, block_frames):
+            block = np.asarray(block)
+            if split:
+                for ch, name in enumerate(channel_files):
+                    writers[name].writeframes(block[:, ch].astype('<i2').tobytes())
+            if quad:
+                writers[quad_file].writeframes(block.astype('<i2').tobytes())
+            if stereo:
+                mix = np.rint(block.astype(np.float32) @ matrix)
+                writers[stereo_file].writeframes(np.clip(mix, -32768, 32767).astype('<i2').tobytes())
+    finally:
+        for wav in writers.values():
+            wav.close()
+
+    return list(writers)
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-pass WAV export of a 4-channel capture.')
+    parser.add_argument('files', nargs='+', help='raw 4-channel PCM captures')
+    parser.add_argument('--channels', action='store_true', help='write per-channel mono WAVs')
+    parser.add_argument('--quad', action='store_true', help='write the 4-channel WAV')
+    parser.add_argument('--stereo', action='store_true', help='write the Amiga-panned stereo mix')
+    parser.add_argument('--separation', type=float, default=100.0,
+                        help='stereo separation in percent, 100 = hard Amiga panning (default 100)')
+    parser.add_argument('-o', '--output-dir', help='directory for the WAV files (default: next to the capture)')
+    args = parser.parse_args()
+
+    if not 0.0 <= args.separation <= 100.0:
+        parser.error('--separation must be between 0 and 100')
+    # No target selected means all of them
+    everything = not (args.channels or args.quad or args.stereo)
+
+    print("=" * 80)
+    print("PAULA Capture WAV Export")
+    print("=" * 80)
+    print()
+
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    for filename in args.files:
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+
+        written = export(filename, split=everything or args.channels, quad=everything or args.quad,
+                         stereo=everything or args.stereo, separation=args.separation / 100.0,
+                         out_dir=args.output_dir)
+        print(f"  {filename}:")
+        for name in written:
+            print(f"    -> {name}")
+        print()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Golden fingerprints of the replayer captures, and the regression check
+against them.
+
+Verifying a rebuilt test harness used to mean a full capture plus a full
+analysis against a kept 90 MB reference capture. A fingerprint replaces the
+reference capture with a few tens of kilobytes, committed in goldens/:
+
+  blocks     exact hash of every second of the capture (all channels)
+  envelopes  per song row (from the MOD, see modfile.py), one 16-bit hash
+             per channel of the 1 ms amplitude envelope quantized to steps
+             of 64; per second instead with --per-second
+
+`check` streams a new capture once, hashing as it reads, and stops at the
+first block whose hash differs from the golden, reporting its time, the song
+position and row playing there, and the first row in it (and the channels)
+whose envelope changed. A block can differ while all its envelopes match:
+then the difference is below the envelope resolution. With --level envelope
+only the envelopes are compared, which tolerates such bit-level noise (see
+FS-UAE Non-Determinism in README.md).
+
+The golden of each replayer is named in replayers.json ('golden', default
+goldens/<replayer>.json) and records the harness build it was taken from.
+
+Usage: ./fingerprint.py record                        # goldens for the registry captures
+       ./fingerprint.py record LSPlayer --mod the_loop.mod
+       ./fingerprint.py check                         # registry captures against their goldens
+       ./fingerprint.py check PT2.3F --capture new_pt23f.pcm --level envelope
+       ./paula.py fingerprint check                   # same thing
+       make check
+
+check exits with status 1 at the first mismatch, so it can gate a build.
+goldens/ starts out empty: until `record` has been run, check only says
+so and exits with status 0.
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+from pathlib import Path
+
+from modfile import ModFile, play_mod, row_starts
+from paula_pcm import open_capture, iter_blocks
+from replayers import load_replayers
+
+VERSION = 1
+GOLDEN_DIR = Path('goldens')
+ENVELOPE_HOP = 96        # envelope frames per point: 1 ms at 96kHz
+QUANTUM = 64             # envelope quantization step
+
+def golden_file(name, info):
+    """Golden fingerprint file of a registry replayer."""
+    return Path(info.get('golden') or GOLDEN_DIR / f"{name.lower()}.json")
+
+def block_hash(block):
+    """Exact hash of a block of frames, independent of the capture layout."""
+    return hashlib.blake2b(np.ascontiguousarray(block, dtype='<i2').tobytes(), digest_size=8).hexdigest()
+
+def envelope_hash(levels):
+    """Per-channel 16-bit hashes of a segment's quantized envelope, concatenated."""
+    return ''.join(hashlib.blake2b(np.ascontiguousarray(levels[:, ch]).tobytes(), digest_size=2).hexdigest()
+                   for ch in range(levels.shape[1]))
+
+def changed_channels(hash1, hash2):
+    """Channels whose part of two envelope hashes differs."""
+    return [ch for ch in range(len(hash1) // 4) if hash1[ch * 4:ch * 4 + 4] != hash2[ch * 4:ch * 4 + 4]]
+
+def song_segments(mod_file, num_frames, sample_rate):
+    """Segment start frames, positions and rows: one segment per song row within the capture."""
+    seconds, positions, rows = row_starts(*play_mod(ModFile(mod_file)))
+    starts = np.clip(np.rint(seconds * sample_rate), 0, num_frames).astype(np.int64)
+    # Rows that start before the capture (or at the same frame) give way to the later one
+    keep = np.append(starts[1:] > starts[:-1], True) & (starts < max(num_frames, 1))
+    return starts[keep], positions[keep], rows[keep]
+
+def second_segments(num_frames, sample_rate):
+    """Segment start frames for one segment per second."""
+    return np.arange(0, max(num_frames, 1), sample_rate, dtype=np.int64), None, None
+
+def fingerprint_blocks(samples, block_frames, starts, hop=ENVELOPE_HOP, quantum=QUANTUM):
+    """
+    Stream a capture once. Yields (block_index, block_hash, completed) per
+    block, completed being [(segment, envelope_hash), ...] for the segments
+    (given by their start frames) that end within that block.
+    """
+    num_frames, channels = samples.shape
+    num_hops = num_frames // hop
+    levels = np.zeros((num_hops, channels), dtype='<u2')
+    # A segment owns the envelope points that start inside it
+    hop_starts = np.minimum(-(-np.asarray(starts, dtype=np.int64) // hop), num_hops)
+    hop_ends = np.append(hop_starts[1:], num_hops)
+    done = 0
+
+    for index, (offset, block) in enumerate(iter_blocks(samples, block_frames)):
+        block = np.asarray(block)
+        first, n = offset // hop, len(block) // hop
+        if n:
+            sums = np.abs(block[:n * hop].astype(np.int32)).reshape(n, hop, channels).sum(axis=1)
+            levels[first:first + n] = sums // (hop * quantum)
+
+        completed = []
+        while done < len(hop_starts) and hop_ends[done] <= first + n:
+            completed.append((done, envelope_hash(levels[hop_starts[done]:hop_ends[done]])))
+            done += 1
+        yield index, block_hash(block), completed
+
+def harness_build(name):
+    """Content hash of a replayer's test harness binary (None if it isn't built)."""
+    from pipeline import file_hashes
+    harness = load_replayers().get(name, {}).get('harness')
+    if not harness or not os.path.exists(harness):
+        return None
+    return file_hashes([harness])[harness]
+
+def record(name, filename, mod_file=None, block_seconds=1):
+    """Fingerprint of one capture as a JSON-ready dict (song rows from mod_file, else seconds)."""
+    from pipeline import file_hashes
+
+    samples, sample_rate = open_capture(filename)
+    num_frames = len(samples)
+    if mod_file:
+        starts, positions, rows = song_segments(mod_file, num_frames, sample_rate)
+    else:
+        starts, positions, rows = second_segments(num_frames, sample_rate)
+
+    block_frames = block_seconds * sample_rate
+    block_frames -= block_frames % ENVELOPE_HOP
+    blocks = []
+    envelopes = [None] * len(starts)
+    for _, digest, completed in fingerprint_blocks(samples, block_frames, starts):
+        blocks.append(digest)
+        for segment, envelope in completed:
+            envelopes[segment] = envelope
+
+    digest = file_hashes([filename])[str(filename)]
+    fingerprint = {
+        'version': VERSION,
+        'replayer': name,
+        'capture': str(filename),
+        'hash': digest,
+        'build': harness_build(name),
+        'sample_rate': sample_rate,
+        'channels': samples.shape[1],
+        'frames': num_frames,
+        'block_frames': block_frames,
+        'blocks': blocks,
+        'envelope_hop': ENVELOPE_HOP,
+        'quantum': QUANTUM,
+        'segments': 'rows' if mod_file else 'seconds',
+        'starts': starts.tolist(),
+        'envelopes': envelopes,
+    }
+    if mod_file:
+        fingerprint['mod'] = str(mod_file)
+        fingerprint['positions'] = positions.tolist()
+        fingerprint['rows'] = rows.tolist()
+    return fingerprint
+
+def segment_label(golden, segment):
+    """Song position and row (or second) of a golden segment."""
+    start = golden['starts'][segment] / golden['sample_rate']
+    if golden['segments'] == 'rows':
+        return f"position {golden['positions'][segment]}, row {golden['rows'][segment]} ({start:.3f}s)"
+    return f"second {segment} ({start:.3f}s)"
+
+def segment_at(golden, frame):
+    """Golden segment playing at a frame."""
+    return max(int(np.searchsorted(golden['starts'], frame, side='right')) - 1, 0)
+
+def check(golden, filename, level='exact'):
+    """
+    Compare a capture against a golden fingerprint in one streaming pass.
+    Returns None if it matches, else a list of report lines for the first mismatch.
+    """
+    samples, sample_rate = open_capture(filename)
+    if (sample_rate, samples.shape[1]) != (golden['sample_rate'], golden['channels']):
+        return [f"format differs: {samples.shape[1]}ch @ {sample_rate}Hz, golden "
+                f"{golden['channels']}ch @ {golden['sample_rate']}Hz"]
+
+    block_frames = golden['block_frames']
+    envelopes = golden['envelopes']
+    for index, digest, completed in fingerprint_blocks(samples, block_frames, golden['starts'],
+                                                       golden['envelope_hop'], golden['quantum']):
+        changed = [(segment, envelope) for segment, envelope in completed if envelope != envelopes[segment]]
+        block_differs = index >= len(golden['blocks']) or digest != golden['blocks'][index]
+        if level == 'exact' and block_differs:
+            start = index * block_frames
+            lines = [f"block {index} differs ({start / sample_rate:.3f}s - "
+                     f"{min(start + block_frames, len(samples)) / sample_rate:.3f}s), "
+                     f"starting in {segment_label(golden, segment_at(golden, start))}"]
+            if changed:
+                segment, envelope = changed[0]
+                channels = ' '.join(f"Ch{ch}" for ch in changed_channels(envelope, envelopes[segment]))
+                lines.append(f"first envelope change: {segment_label(golden, segment)}, {channels}")
+            else:
+                lines.append("envelopes of the rows ending in this block match (difference below envelope resolution)")
+            if len(samples) != golden['frames']:
+                lines.append(f"length differs: {len(samples):,} frames, golden {golden['frames']:,}")
+            return lines
+        if level == 'envelope' and changed:
+            segment, envelope = changed[0]
+            channels = ' '.join(f"Ch{ch}" for ch in changed_channels(envelope, envelopes[segment]))
+            return [f"envelope changed: {segment_label(golden, segment)}, {channels}"]
+
+    if len(samples) != golden['frames']:
+        frame = min(len(samples), golden['frames'])
+        return [f"length differs: {len(samples):,} frames, golden {golden['frames']:,} "
+                f"(from {segment_label(golden, segment_at(golden, frame))})"]
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or check golden capture fingerprints.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('record', help='write golden fingerprints from the current captures')
+    p.add_argument('--mod', default='the_loop.mod', help='MOD for the song rows (default the_loop.mod)')
+    p.add_argument('--per-second', action='store_true', help='envelope hashes per second instead of per row')
+
+    p = sub.add_parser('check', help='compare captures against their golden fingerprints')
+    p.add_argument('--level', choices=['exact', 'envelope'], default='exact',
+                   help='exact block hashes (default) or envelopes only')
+
+    for p in sub.choices.values():
+        p.add_argument('replayers', nargs='*', metavar='REPLAYER', help='registry replayers (default: all)')
+        p.add_argument('--capture', help='capture file to use (one replayer only; default: the registry capture)')
+        p.add_argument('--golden', help='golden fingerprint file (one replayer only; default: from the registry)')
+    args = parser.parse_args()
+
+    registry = load_replayers()
+    names = args.replayers or list(registry)
+    for name in names:
+        if name not in registry:
+            parser.error(f"unknown replayer '{name}' (see replayers.json)")
+    if (args.capture or args.golden) and len(names) != 1:
+        parser.error('--capture and --golden need exactly one replayer')
+
+    print("=" * 80)
+    print(f"Golden Fingerprints ({args.command})")
+    print("=" * 80)
+    print()
+
+    # A fresh checkout has no goldens: nothing to check against yet
+    if args.command == 'check' and not args.golden and \
+            not any(golden_file(name, registry[name]).exists() for name in names):
+        print("  No goldens recorded yet (run ./fingerprint.py record), nothing checked.")
+        print()
+        return 0
+
+    for name in names:
+        capture = args.capture or registry[name]['capture']
+        golden = Path(args.golden) if args.golden else golden_file(name, registry[name])
+        if not Path(capture).exists():
+            print(f"Error: {capture} not found!")
+            return 1
+
+        if args.command == 'record':
+            mod_file = None if args.per_second else args.mod
+            if mod_file and not Path(mod_file).exists():
+                print(f"Error: {mod_file} not found!")
+                return 1
+            fingerprint = record(name, capture, mod_file)
+            golden.parent.mkdir(parents=True, exist_ok=True)
+            with open(golden, 'w') as f:
+                json.dump(fingerprint, f, indent=1)
+                f.write('\n')
+            print(f"  {name:12s}: {capture} -> {golden} ({len(fingerprint['blocks'])} blocks, "
+                  f"{len(fingerprint['envelopes'])} {fingerprint['segments']}, {golden.stat().st_size // 1024} KB)")
+            continue
+
+        if not golden.exists():
+            print(f"Error: {golden} not found! (record it with ./fingerprint.py record {name})")
+            return 1
+        with open(golden) as f:
+            fingerprint = json.load(f)
+        if fingerprint.get('version') != VERSION:
+            print(f"Error: {golden}: fingerprint version {fingerprint.get('version')} not supported")
+            return 1
+
+        mismatch = check(fingerprint, capture, args.level)
+        if mismatch is None:
+            print(f"  {name:12s}: {capture} matches {golden} ({args.level})")
+            continue
+        print(f"  {name:12s}: {capture} does NOT match {golden}")
+        for line in mismatch:
+            print(f"    {line}")
+        build = harness_build(name)
+        if build and fingerprint['build']:
+            print(f"    harness build {'unchanged' if build == fingerprint['build'] else 'changed'} "
+                  f"since the golden ({fingerprint['build'][:16]} -> {build[:16]})")
+        print()
+        return 1
+
+    print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,16 @@
-#!/Users/erik/src/the_loop_test/venv/bin/python
+#!/usr/bin/env python3
 """
 Generate per-channel difference files between ProTracker replayer recordings.
 Creates difference files for each channel that can be visualized or played back.
 
+Only the spans where either recording is non-silent are read and diffed
+(activity index, see paula_pcm.py); everything else is zero in the output.
+Blocks are diffed in parallel (-j, default $PAULA_THREADS or all CPUs); the
+statistics are integer sums merged in block order, so they don't depend on
+the thread count.
+
+Usage: ./generate_channel_diffs.py [-j THREADS]
+
 Requirements:
   - NumPy (install in venv)
 
@@ -11,23 +19,19 @@ To initialize venv:
   ./venv/bin/pip install numpy
 """
 
+import argparse
 import struct
 import sys
 import numpy as np
 from pathlib import Path
 
-def load_pcm(filename, sample_rate=96000, channels=4):
-    """Load raw PCM file and return numpy array of samples."""
-    with open(filename, 'rb') as f:
-        data = f.read()
-
-    # Convert to numpy array (16-bit signed)
-    samples = np.frombuffer(data, dtype=np.int16)
+from paula_pcm import (SAMPLE_RATE, open_pcm, load_activity, union_spans, span_chunks,
+                       ordered_map, default_threads)
+from replayers import capture_files, replayer_pairs
 
-    # Reshape to (frames, channels)
-    samples = samples.reshape(-1, channels)
-
-    return samples, sample_rate
+def load_pcm(filename, sample_rate=96000, channels=4):
+    """Load raw PCM file (interleaved or planar) and return numpy array of samples."""
+    return np.asarray(open_pcm(filename, channels)), sample_rate
 
 def save_pcm_4channel(filename, samples):
     """Save 4-channel interleaved PCM (16-bit signed)."""
@@ -36,43 +40,83 @@ def save_pcm_4channel(filename, samples):
     with open(filename, 'wb') as f:
         f.write(samples.tobytes())
 
-def generate_diffs(name1, file1, name2, file2):
-    """Generate per-channel difference files between two recordings."""
+def diff_block(samples1, samples2, out, start, stop):
+    """Write the difference of frames start..stop to out; returns its statistics."""
+    diff = (np.asarray(samples1[start:stop], dtype=np.int32) -
+            np.asarray(samples2[start:stop], dtype=np.int32))
+    out[start:stop] = np.clip(diff, -32768, 32767)
+    abs_diff = np.abs(diff)
+    return {
+        'sum_abs': abs_diff.sum(axis=0, dtype=np.int64),
+        'sum_sq': np.square(abs_diff, dtype=np.int64).sum(axis=0),
+        'max_abs': abs_diff.max(axis=0),
+        'significant': (abs_diff > 100).sum(axis=0),
+        'frames': stop - start,
+    }
+
+def generate_diffs(name1, file1, name2, file2, diff_filename=None, threads=None):
+    """
+    Generate per-channel difference files between two recordings.
+    Writes <name1>_vs_<name2>_diff.pcm unless diff_filename is given.
+    Returns the per-channel difference statistics.
+    """
     print(f"\n{'='*80}")
     print(f"Generating diffs: {name1} vs {name2}")
     print(f"{'='*80}\n")
 
-    # Load both recordings
-    samples1, sr = load_pcm(file1)
-    samples2, sr = load_pcm(file2)
+    # Memory-map both recordings and index their non-silent spans
+    samples1 = open_pcm(file1)
+    samples2 = open_pcm(file2)
+    sr = SAMPLE_RATE
 
     # Use minimum length
     min_len = min(len(samples1), len(samples2))
-    samples1 = samples1[:min_len]
-    samples2 = samples2[:min_len]
+    spans = union_spans(load_activity(file1), load_activity(file2))
 
     print(f"Loaded {min_len:,} frames ({min_len/sr:.2f}s)\n")
 
-    # Calculate difference for all channels
-    diff = samples1.astype(np.int32) - samples2.astype(np.int32)
-
-    # Clip to int16 range
-    diff_clipped = np.clip(diff, -32768, 32767).astype(np.int16)
+    # The diff is zero wherever both are silent, so only active spans are
+    # computed; the rest of the (zero-filled) output is left untouched
+    prefix = f"{name1.lower()}_vs_{name2.lower()}"
+    if diff_filename is None:
+        diff_filename = f"{prefix}_diff.pcm"
+    out = np.memmap(diff_filename, dtype='<i2', mode='w+', shape=(max(min_len, 1), 4))
+
+    # Blocks are diffed on worker threads (each writes its own slice of the
+    # output) and their integer statistics merged in block order
+    tasks = ((samples1, samples2, out, start, end)
+             for start, end in span_chunks(spans, stop=min_len))
+    sum_abs = np.zeros(4, dtype=np.int64)
+    sum_sq = np.zeros(4, dtype=np.int64)
+    max_abs = np.zeros(4, dtype=np.int64)
+    significant = np.zeros(4, dtype=np.int64)
+    active = 0
+    for part in ordered_map(diff_block, tasks, threads):
+        sum_abs += part['sum_abs']
+        sum_sq += part['sum_sq']
+        max_abs = np.maximum(max_abs, part['max_abs'])
+        significant += part['significant']
+        active += part['frames']
+
+    out.flush()
+    del out
+    if min_len == 0:
+        open(diff_filename, 'wb').close()
+
+    print(f"Active frames: {active:,} of {min_len:,} (the rest is silent in both)\n")
 
     # Calculate per-channel statistics
     diff_stats = []
+    frames = max(min_len, 1)
 
     for ch in range(4):
-        ch_diff = diff[:, ch]
-
         # Statistics
-        mean_abs_diff = np.mean(np.abs(ch_diff))
-        max_abs_diff = np.max(np.abs(ch_diff))
-        rms_diff = np.sqrt(np.mean(ch_diff.astype(np.float64)**2))
+        mean_abs_diff = sum_abs[ch] / frames
+        max_abs_diff = max_abs[ch]
+        rms_diff = np.sqrt(sum_sq[ch] / frames)
 
         # Count significant differences
-        significant = np.sum(np.abs(ch_diff) > 100)
-        pct_significant = (significant / len(ch_diff)) * 100
+        pct_significant = (significant[ch] / frames) * 100
 
         diff_stats.append({
             'channel': ch,
@@ -89,10 +133,6 @@ def generate_diffs(name1, file1, name2, file2):
         print(f"  Significant:   {pct_significant:6.2f}% (>{100})")
         print()
 
-    # Save 4-channel diff as single PCM file
-    prefix = f"{name1.lower()}_vs_{name2.lower()}"
-    diff_filename = f"{prefix}_diff.pcm"
-    save_pcm_4channel(diff_filename, diff_clipped)
     print(f"Saved 4-channel diff: {diff_filename}\n")
 
     # Summary
@@ -107,30 +147,27 @@ def generate_diffs(name1, file1, name2, file2):
     print()
 
     # Conversion examples
-    print("To convert 4-channel diff to WAV:")
-    print(f"  ffmpeg -f s16le -ar 96000 -ac 4 -i {prefix}_diff.pcm {prefix}_diff.wav")
-    print()
-    print("To extract individual channels:")
-    print(f"  ffmpeg -f s16le -ar 96000 -ac 4 -i {prefix}_diff.pcm -filter_complex \\")
-    print(f"    \"channelsplit=channel_layout=quad[c0][c1][c2][c3]\" \\")
-    print(f"    -map \"[c0]\" {prefix}_ch0_diff.wav -map \"[c1]\" {prefix}_ch1_diff.wav \\")
-    print(f"    -map \"[c2]\" {prefix}_ch2_diff.wav -map \"[c3]\" {prefix}_ch3_diff.wav")
+    print("To convert 4-channel diff to WAV (quad, stereo mix and per-channel files):")
+    print(f"  ./export_wav.py {diff_filename}")
     print()
     print("To amplify all channels for easier hearing (10x gain):")
-    print(f"  ffmpeg -f s16le -ar 96000 -ac 4 -i {prefix}_diff.pcm -filter:a \"volume=10\" {prefix}_diff_10x.wav")
+    print(f"  ffmpeg -f s16le -ar 96000 -ac 4 -i {diff_filename} -filter:a \"volume=10\" {prefix}_diff_10x.wav")
     print()
 
+    return diff_stats
+
 def main():
+    parser = argparse.ArgumentParser(description='Generate 4-channel difference files for every replayer pair.')
+    parser.add_argument('-j', '--threads', type=int, default=default_threads(),
+                        help='worker threads (default: $PAULA_THREADS or all CPUs)')
+    args = parser.parse_args()
+
     print("="*80)
     print("Per-Channel Difference Generator")
     print("="*80)
 
     # Define comparisons
-    files = {
-        'PT2.3F': 'pt23f_channels_raw.pcm',
-        'HippoPlayer': 'hippoplayer_channels_raw.pcm',
-        'LSPlayer': 'lsplayer_channels_raw.pcm'
-    }
+    files = capture_files()
 
     # Check files exist
     for name, filename in files.items():
@@ -139,14 +176,10 @@ def main():
             return 1
 
     # Generate all pairwise diffs
-    comparisons = [
-        ('PT2.3F', 'HippoPlayer'),
-        ('PT2.3F', 'LSPlayer'),
-        ('HippoPlayer', 'LSPlayer')
-    ]
+    comparisons = replayer_pairs(files)
 
     for name1, name2 in comparisons:
-        generate_diffs(name1, files[name1], name2, files[name2])
+        generate_diffs(name1, files[name1], name2, files[name2], threads=args.threads)
 
     print("\nDone! All 4-channel difference files generated.")
     return 0
@@ -0,0 +1,197 @@
+"""
+LightSpeedPlayer (.lsmusic/.lsbank) parsing and a register-level decoder.
+
+LSPConvert turns a MOD into a stream of PAULA register writes, one command
+per tick. decode_lsp() replays LSP_MusicPlayTick from
+test_lsplayer/LightSpeedPlayer.asm and records the same per-tick, per-channel
+register table as modfile.play_mod() (modfile.CHANNEL_DTYPE), except that
+sample addresses are offsets into the .lsbank instead of the .mod.
+
+Each tick of the command stream is a byte code (0 = extended code, add
+$100 and read the next byte) indexing the code table. A code word holds:
+
+  bits 7-4    new volume for d, c, b, a (bytes from the byte stream)
+  bits 3-0    new period for d, c, b, a (words from the word stream)
+  bits 15-8   two bits per voice d..a: set instrument (+ DMA restart), or
+              reload the loop pair of the last instrument
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import struct
+import numpy as np
+
+from modfile import CHANNEL_DTYPE
+
+LSP_TICK_DTYPE = np.dtype([
+    ('bpm', '<u2'),
+    ('seq', '<u2'),
+    ('rewind', '?'),
+])
+
+class LSPMusic:
+    """A .lsmusic score plus the .lsbank sample bank it was converted with."""
+
+    def __init__(self, music_filename, bank_filename):
+        with open(music_filename, 'rb') as f:
+            self.raw = f.read()
+        with open(bank_filename, 'rb') as f:
+            self.bank_raw = f.read()
+
+        raw = self.raw
+        if raw[:4] != b'LSP1':
+            raise ValueError(f"{music_filename}: not an LSP music file")
+        (self.unique_id, self.version, _reloc, self.bpm, self.esc_rewind,
+         self.esc_set_bpm, self.esc_get_pos, self.length_ticks,
+         num_instruments) = struct.unpack('>LHHHHHHLH', raw[4:26])
+        if self.bank_raw[:4] != raw[4:8]:
+            raise ValueError(f"{bank_filename}: sample bank doesn't match {music_filename}")
+        if self.version < 0x010b:
+            raise ValueError(f"{music_filename}: LSP version {self.version:04x} too old")
+
+        # Instrument entries: start.l, len.w, repeat start.l, replen.w
+        self.instruments_offset = 26
+        self.instruments = [struct.unpack('>LHLH', raw[26 + i * 12:38 + i * 12])
+                            for i in range(num_instruments)]
+
+        pos = 26 + num_instruments * 12
+        num_codes, = struct.unpack('>H', raw[pos:pos + 2])
+        self.codes = list(struct.unpack(f'>{num_codes}H', raw[pos + 2:pos + 2 + num_codes * 2]))
+        pos += 2 + num_codes * 2
+
+        num_seq, = struct.unpack('>H', raw[pos:pos + 2])
+        pos += 2 + num_seq * 8
+
+        word_size, byte_loop, word_loop = struct.unpack('>LLL', raw[pos:pos + 12])
+        pos += 12
+        self.word_stream = raw[pos:pos + word_size]
+        self.byte_stream = raw[pos + word_size:]
+        self.word_loop = word_loop
+        self.byte_loop = byte_loop
+
+        # Signed view of the sample bank: decoded addresses index into this
+        self.data = np.frombuffer(self.bank_raw, dtype=np.int8)
+
+    def read_pair(self, pointer):
+        """(address, length in words) stored at an instrument table pointer."""
+        return struct.unpack('>LH', self.raw[pointer:pointer + 6])
+
+    def instrument_at(self, pointer):
+        """1-based instrument number an instrument table pointer falls in."""
+        return (pointer - self.instruments_offset) // 12 + 1
+
+def decode_lsp(music, num_ticks=None):
+    """
+    Expand the LSP command stream into per-tick register writes.
+
+    Decodes music.length_ticks ticks (one pass of the song) unless num_ticks
+    is given, in which case the stream loops at the rewind code like the
+    player does. Returns (ticks, channels): LSP_TICK_DTYPE (n,) and
+    CHANNEL_DTYPE (n, 4), with addresses and lengths in bytes.
+
+    LSPConvert writes the loop pair one tick after a DMA restart, where
+    PT2.3F writes it in the same tick after the DMA wait. PAULA only reads it
+    when the first block runs out, so it is folded back onto the restart tick
+    to keep both tables comparable.
+    """
+    if num_ticks is None:
+        num_ticks = music.length_ticks
+
+    ticks = np.zeros(num_ticks, dtype=LSP_TICK_DTYPE)
+    channels = np.zeros((num_ticks, 4), dtype=CHANNEL_DTYPE)
+
+    byte_stream = music.byte_stream
+    word_stream = music.word_stream
+    bpos = 0
+    wpos = 0
+    bpm = music.bpm
+    seq = 0
+
+    lc = [0] * 4
+    length = [0] * 4
+    per = [0] * 4
+    vol = [0] * 4
+    sample = [0] * 4
+    resetv = [0] * 4
+    restarted = [-2] * 4
+
+    def byte():
+        nonlocal bpos
+        if bpos >= len(byte_stream):
+            raise ValueError("LSP byte stream ended early")
+        bpos += 1
+        return byte_stream[bpos - 1]
+
+    def word():
+        nonlocal wpos
+        value, = struct.unpack('>H', word_stream[wpos:wpos + 2])
+        wpos += 2
+        return value
+
+    def read_code():
+        """Next code word, and whether it came through the extended (0) prefix."""
+        index = byte()
+        if index:
+            return music.codes[index], False
+        while index & 0xFF == 0:
+            index = (index + 0x100) & 0xFF00 | byte()
+        return music.codes[index], True
+
+    for tick in range(num_ticks):
+        rewind = False
+        while True:
+            code, extended = read_code()
+            if not extended:
+                break
+            if code == music.esc_rewind:
+                bpos = music.byte_loop
+                wpos = music.word_loop
+                rewind = True
+            elif code == music.esc_set_bpm:
+                bpm = byte()
+            elif code == music.esc_get_pos:
+                seq = byte()
+            else:
+                break
+
+        trigger = [False] * 4
+        loop_write = [False] * 4
+
+        for i, ch in enumerate((3, 2, 1, 0)):
+            if code & (0x80 >> i):
+                vol[ch] = byte()
+        if code & 0x0F:
+            for i, ch in enumerate((3, 2, 1, 0)):
+                if code & (0x08 >> i):
+                    per[ch] = word()
+
+        if code & 0xFF00:
+            pointer = music.instruments_offset - 12
+            for i, ch in enumerate((3, 2, 1, 0)):
+                set_ins = code & (0x8000 >> (2 * i))
+                flag = code & (0x4000 >> (2 * i))
+                if set_ins:
+                    offset = word()
+                    pointer += offset - 0x10000 if offset & 0x8000 else offset
+                    lc[ch], length[ch] = music.read_pair(pointer)
+                    sample[ch] = music.instrument_at(pointer)
+                    pointer += 6
+                    resetv[ch] = pointer
+                    trigger[ch] = bool(flag)
+                elif flag:
+                    lc[ch], length[ch] = music.read_pair(resetv[ch])
+                    loop_write[ch] = True
+
+        ticks[tick] = (bpm, seq, rewind)
+        for ch in range(4):
+            start, size = (lc[ch], length[ch] * 2) if trigger[ch] else (0, 0)
+            channels[tick, ch] = (trigger[ch], start, size, lc[ch], length[ch] * 2,
+                                  per[ch], vol[ch], sample[ch])
+            if trigger[ch]:
+                restarted[ch] = tick
+            elif loop_write[ch] and restarted[ch] == tick - 1:
+                channels['loop_start'][tick - 1, ch] = lc[ch]
+                channels['loop_length'][tick - 1, ch] = length[ch] * 2
+
+    return ticks, channels
@@ -0,0 +1,801 @@
+"""
+ProTracker MOD parsing and a tick-accurate port of the PT2.3F replay routine.
+
+The replayer is a straight translation of mt_IntMusic and friends from
+test_pt23f/PT2.3F_replay_cia.s. Instead of writing $DFF0A0.. it records the
+PAULA register state of every channel after every replayer tick:
+
+  trigger      DMA was restarted this tick (new note, retrig or note delay)
+  start        AUDxLC latched by that restart (file offset of sample data)
+  length       AUDxLEN latched by that restart, in bytes
+  loop_start   AUDxLC left in the register for the next wrap
+  loop_length  AUDxLEN left in the register for the next wrap, in bytes
+  period       AUDxPER
+  volume       AUDxVOL
+  sample       instrument number last set on the channel (0 = none)
+
+Sample addresses are offsets into the .mod file, so `ModFile.data` is the
+"chip memory" those registers point into.
+
+Not implemented: EFx (invert loop, rewrites sample memory) and E0x (filter).
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import struct
+import numpy as np
+
+PAULA_CLOCK_PAL = 3546895
+CIA_CLOCK_PAL = 709379
+CIA_TEMPO_CONSTANT = 1773447   # PT2.3F: timer value = 1773447 / BPM
+
+PERIOD_TABLE = [
+    # Finetune 0
+    856, 808, 762, 720, 678, 640, 604, 570, 538, 508, 480, 453,
+    428, 404, 381, 360, 339, 320, 302, 285, 269, 254, 240, 226,
+    214, 202, 190, 180, 170, 160, 151, 143, 135, 127, 120, 113,
+    0,
+    # Finetune 1
+    850, 802, 757, 715, 674, 637, 601, 567, 535, 505, 477, 450,
+    425, 401, 379, 357, 337, 318, 300, 284, 268, 253, 239, 225,
+    213, 201, 189, 179, 169, 159, 150, 142, 134, 126, 119, 113,
+    0,
+    # Finetune 2
+    844, 796, 752, 709, 670, 632, 597, 563, 532, 502, 474, 447,
+    422, 398, 376, 355, 335, 316, 298, 282, 266, 251, 237, 224,
+    211, 199, 188, 177, 167, 158, 149, 141, 133, 125, 118, 112,
+    0,
+    # Finetune 3
+    838, 791, 746, 704, 665, 628, 592, 559, 528, 498, 470, 444,
+    419, 395, 373, 352, 332, 314, 296, 280, 264, 249, 235, 222,
+    209, 198, 187, 176, 166, 157, 148, 140, 132, 125, 118, 111,
+    0,
+    # Finetune 4
+    832, 785, 741, 699, 660, 623, 588, 555, 524, 495, 467, 441,
+    416, 392, 370, 350, 330, 312, 294, 278, 262, 247, 233, 220,
+    208, 196, 185, 175, 165, 156, 147, 139, 131, 124, 117, 110,
+    0,
+    # Finetune 5
+    826, 779, 736, 694, 655, 619, 584, 551, 520, 491, 463, 437,
+    413, 390, 368, 347, 328, 309, 292, 276, 260, 245, 232, 219,
+    206, 195, 184, 174, 164, 155, 146, 138, 130, 123, 116, 109,
+    0,
+    # Finetune 6
+    820, 774, 730, 689, 651, 614, 580, 547, 516, 487, 460, 434,
+    410, 387, 365, 345, 325, 307, 290, 274, 258, 244, 230, 217,
+    205, 193, 183, 172, 163, 154, 145, 137, 129, 122, 115, 109,
+    0,
+    # Finetune 7
+    814, 768, 725, 684, 646, 610, 575, 543, 513, 484, 457, 431,
+    407, 384, 363, 342, 323, 305, 288, 272, 256, 242, 228, 216,
+    204, 192, 181, 171, 161, 152, 144, 136, 128, 121, 114, 108,
+    0,
+    # Finetune -8
+    907, 856, 808, 762, 720, 678, 640, 604, 570, 538, 508, 480,
+    453, 428, 404, 381, 360, 339, 320, 302, 285, 269, 254, 240,
+    226, 214, 202, 190, 180, 170, 160, 151, 143, 135, 127, 120,
+    0,
+    # Finetune -7
+    900, 850, 802, 757, 715, 675, 636, 601, 567, 535, 505, 477,
+    450, 425, 401, 379, 357, 337, 318, 300, 284, 268, 253, 238,
+    225, 212, 200, 189, 179, 169, 159, 150, 142, 134, 126, 119,
+    0,
+    # Finetune -6
+    894, 844, 796, 752, 709, 670, 632, 597, 563, 532, 502, 474,
+    447, 422, 398, 376, 355, 335, 316, 298, 282, 266, 251, 237,
+    223, 211, 199, 188, 177, 167, 158, 149, 141, 133, 125, 118,
+    0,
+    # Finetune -5
+    887, 838, 791, 746, 704, 665, 628, 592, 559, 528, 498, 470,
+    444, 419, 395, 373, 352, 332, 314, 296, 280, 264, 249, 235,
+    222, 209, 198, 187, 176, 166, 157, 148, 140, 132, 125, 118,
+    0,
+    # Finetune -4
+    881, 832, 785, 741, 699, 660, 623, 588, 555, 524, 494, 467,
+    441, 416, 392, 370, 350, 330, 312, 294, 278, 262, 247, 233,
+    220, 208, 196, 185, 175, 165, 156, 147, 139, 131, 123, 117,
+    0,
+    # Finetune -3
+    875, 826, 779, 736, 694, 655, 619, 584, 551, 520, 491, 463,
+    437, 413, 390, 368, 347, 328, 309, 292, 276, 260, 245, 232,
+    219, 206, 195, 184, 174, 164, 155, 146, 138, 130, 123, 116,
+    0,
+    # Finetune -2
+    868, 820, 774, 730, 689, 651, 614, 580, 547, 516, 487, 460,
+    434, 410, 387, 365, 345, 325, 307, 290, 274, 258, 244, 230,
+    217, 205, 193, 183, 172, 163, 154, 145, 137, 129, 122, 115,
+    0,
+    # Finetune -1
+    862, 814, 768, 725, 684, 646, 610, 575, 543, 513, 484, 457,
+    431, 407, 384, 363, 342, 323, 305, 288, 272, 256, 242, 228,
+    216, 203, 192, 181, 171, 161, 152, 144, 136, 128, 121, 114,
+    0,
+    # Overflow words following the table in PT2.3F (arpeggio past the end)
+    774, 1800, 2314, 3087, 4113, 4627, 5400, 6426, 6940, 7713, 8739, 9253, 24625, 12851, 13365,
+]
+PERIOD_ROW = 37
+
+VIBRATO_TABLE = [
+      0,  24,  49,  74,  97, 120, 141, 161,
+    180, 197, 212, 224, 235, 244, 250, 253,
+    255, 253, 250, 244, 235, 224, 212, 197,
+    180, 161, 141, 120,  97,  74,  49,  24,
+]
+
+ARP_TABLE = [0, 1, 2] * 10 + [0, 1]
+
+CHANNEL_DTYPE = np.dtype([
+    ('trigger', '?'),
+    ('start', '<u4'),
+    ('length', '<u4'),
+    ('loop_start', '<u4'),
+    ('loop_length', '<u4'),
+    ('period', '<u2'),
+    ('volume', '<u1'),
+    ('sample', '<u1'),
+])
+
+TICK_DTYPE = np.dtype([
+    ('position', '<u1'),
+    ('pattern', '<u1'),
+    ('row', '<u1'),
+    ('counter', '<u1'),
+    ('bpm', '<u2'),
+    ('seconds', '<f8'),
+])
+
+class Sample:
+    """One of the 31 sample headers."""
+
+    def __init__(self, number, name, length, finetune, volume, repeat, replen, start):
+        self.number = number
+        self.name = name
+        self.length = length      # words
+        self.finetune = finetune
+        self.volume = volume
+        self.repeat = repeat      # words
+        self.replen = replen      # words
+        self.start = start        # byte offset of sample data in the file
+
+class ModFile:
+    """31-instrument ProTracker module (M.K. and friends)."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.raw = f.read()
+
+        raw = self.raw
+        self.title = raw[:20].rstrip(b'\0').decode('latin-1')
+        self.song_length = raw[950]
+        self.restart = raw[951]
+        self.order = list(raw[952:952 + 128])
+        self.signature = raw[1080:1084]
+        self.num_patterns = max(self.order) + 1
+
+        offset = 1084 + self.num_patterns * 1024
+        self.samples = [None]
+        for i in range(31):
+            h = 20 + i * 30
+            name = raw[h:h + 22].rstrip(b'\0').decode('latin-1')
+            length, finetune, volume, repeat, replen = struct.unpack('>HBBHH', raw[h + 22:h + 30])
+            self.samples.append(Sample(i + 1, name, length, finetune & 0x0F, min(volume, 64),
+                                       repeat, replen or 1, offset))
+            offset += length * 2
+
+        # Signed copy of the whole file: sample registers index into this.
+        # Like mt_init, silence the first word of every non-looping sample and
+        # pad so a loop register near the end can't run off the buffer.
+        data = np.zeros(max(len(raw), offset) + 2, dtype=np.int8)
+        data[:len(raw)] = np.frombuffer(raw, dtype=np.int8)
+        for s in self.samples[1:]:
+            if s.length and s.repeat + s.replen <= 1:
+                data[s.start:s.start + 2] = 0
+        self.data = data
+
+    def pattern_row(self, position, row):
+        """The four 32-bit channel words of one pattern row."""
+        base = 1084 + self.order[int(position)] * 1024 + int(row) * 16
+        return struct.unpack('>4L', self.raw[base:base + 16])
+
+    def sample_at(self, address):
+        """(sample number, byte offset) containing file offset `address`, or (0, address)."""
+        for s in self.samples[1:]:
+            if s.length and s.start <= address < s.start + s.length * 2:
+                return s.number, address - s.start
+        return 0, address
+
+class Voice:
+    """mt_audchanXtemp: per-channel replayer state."""
+
+    def __init__(self, index):
+        self.index = index
+        self.word = 0            # note word as read from the pattern (TST.L (A6))
+        self.note = 0
+        self.cmd = 0
+        self.cmdlo = 0
+        self.start = 0
+        self.length = 0          # words
+        self.loopstart = 0
+        self.replen = 0          # words
+        self.wavestart = 0
+        self.finetune = 0
+        self.volume = 0
+        self.period = 0
+        self.wantedperiod = 0
+        self.toneportdirec = 0
+        self.toneportspeed = 0
+        self.vibratocmd = 0
+        self.vibratopos = 0
+        self.tremolocmd = 0
+        self.tremolopos = 0
+        self.wavecontrol = 0
+        self.glissfunk = 0
+        self.sampleoffset = 0
+        self.pattpos = 0
+        self.loopcount = 0
+        self.sample = 0
+
+class Paula:
+    """Audio registers of one channel plus what happened to them this tick."""
+
+    def __init__(self):
+        self.lc = 0
+        self.len = 0             # words
+        self.per = 0
+        self.vol = 0
+        self.trigger = None      # (lc, len) latched by a DMA restart this tick
+
+class PT23FReplayer:
+    """
+    Tick-by-tick PT2.3F replay. Call tick() once per CIA interrupt; the
+    `paula` list holds the resulting register state.
+    """
+
+    def __init__(self, mod):
+        self.mod = mod
+        self.voices = [Voice(i) for i in range(4)]
+        self.paula = [Paula() for _ in range(4)]
+        self.speed = 6
+        self.counter = 0
+        self.song_pos = 0
+        self.pattern_pos = 0     # row
+        self.patt_delay_time = 0
+        self.patt_delay_time2 = 0
+        self.pbreak_pos = 0
+        self.pbreak_flag = False
+        self.pos_jump_flag = False
+        self.low_mask = 0xFF
+        self.bpm = 125
+        self.dmacon_temp = 0
+        self.song_end = False
+        self.stopped = False
+        self.row_position = 0    # position/row the current row was read from
+        self.row_index = 0
+
+    # -- period table helpers ------------------------------------------------
+
+    @staticmethod
+    def find_period(row_base, period):
+        """Index of the first entry <= period in a 37-entry table row (37 if none)."""
+        for i in range(PERIOD_ROW):
+            if period >= PERIOD_TABLE[row_base + i]:
+                return i
+        return PERIOD_ROW
+
+    def peroffset(self, v):
+        return v.finetune * PERIOD_ROW
+
+    # -- hardware ------------------------------------------------------------
+
+    def dma_restart(self, ch):
+        """DMA off then on: PAULA latches the current AUDxLC/AUDxLEN."""
+        p = self.paula[ch]
+        p.trigger = (p.lc, p.len)
+
+    # -- new row -------------------------------------------------------------
+
+    def get_new_note(self):
+        self.dmacon_temp = 0
+        self.row_position = self.song_pos
+        self.row_index = self.pattern_pos
+        words = self.mod.pattern_row(self.song_pos, self.pattern_pos)
+        for ch in range(4):
+            self.play_voice(ch, words[ch])
+            self.paula[ch].vol = self.voices[ch].volume
+        self.set_dma()
+
+    def play_voice(self, ch, word):
+        v = self.voices[ch]
+        p = self.paula[ch]
+        if v.word == 0:
+            p.per = v.period
+        v.word = word
+        v.note = (word >> 16) & 0x0FFF
+        v.cmd = (word >> 8) & 0x0F
+        v.cmdlo = word & 0xFF
+
+        instrument = ((word >> 24) & 0xF0) | ((word >> 12) & 0x0F)
+        if instrument:
+            s = self.mod.samples[instrument]
+            v.sample = instrument
+            v.start = s.start
+            v.length = s.length
+            v.finetune = s.finetune
+            v.volume = s.volume
+            if s.repeat:
+                v.loopstart = s.start + s.repeat * 2
+                v.wavestart = v.loopstart
+                v.length = s.repeat + s.replen
+            else:
+                v.loopstart = s.start
+                v.wavestart = v.loopstart
+            v.replen = s.replen
+
+        # mt_SetRegisters
+        if v.note == 0:
+            self.check_more_effects(ch)
+            return
+        if (word & 0x0FF0) == 0x0E50:
+            self.set_finetune(v)
+        elif v.cmd in (3, 5):
+            self.set_tone_porta(v)
+            self.check_more_effects(ch)
+            return
+        elif v.cmd == 9:
+            self.check_more_effects(ch)
+        self.set_period(ch)
+
+    def set_period(self, ch):
+        v = self.voices[ch]
+        p = self.paula[ch]
+        idx = self.find_period(0, v.note)
+        v.period = PERIOD_TABLE[self.peroffset(v) + idx]
+
+        if v.cmd == 0x0E and (v.cmdlo & 0xF0) == 0xD0:
+            self.check_more_effects(ch)
+            return
+
+        if not (v.wavecontrol & 0x04):
+            v.vibratopos = 0
+        if not (v.wavecontrol & 0x40):
+            v.tremolopos = 0
+        p.len = v.length
+        p.lc = v.start
+        if v.start == 0:
+            v.loopstart = 0
+            p.len = 1
+            v.replen = 1
+        p.per = v.period
+        self.dmacon_temp |= 1 << ch
+        self.check_more_effects(ch)
+
+    def set_dma(self):
+        for ch in range(4):
+            if self.dmacon_temp & (1 << ch):
+                self.dma_restart(ch)
+        for ch in range(4):
+            self.paula[ch].lc = self.voices[ch].loopstart
+            self.paula[ch].len = self.voices[ch].replen
+
+    # -- effects on the row tick (mt_CheckMoreEffects) -------------------------
+
+    def check_more_effects(self, ch):
+        v = self.voices[ch]
+        cmd = v.cmd
+        if cmd == 0x9:
+            self.sample_offset(v)
+        elif cmd == 0xB:
+            self.song_pos = (v.cmdlo - 1) & 0xFF
+            self.pbreak_pos = 0
+            self.pos_jump_flag = True
+        elif cmd == 0xC:
+            v.volume = min(v.cmdlo, 64)
+        elif cmd == 0xD:
+            row = (v.cmdlo >> 4) * 10 + (v.cmdlo & 0x0F)
+            if row > 63:
+                self.pbreak_pos = 0
+            else:
+                self.pbreak_pos = row
+            self.pos_jump_flag = True
+        elif cmd == 0xE:
+            self.e_commands(ch)
+        elif cmd == 0xF:
+            self.set_speed(v)
+        else:
+            self.paula[ch].per = v.period
+
+    def sample_offset(self, v):
+        if v.cmdlo:
+            v.sampleoffset = v.cmdlo
+        offset = (v.sampleoffset << 7) & 0xFFFF
+        if offset < v.length:
+            v.length -= offset
+            v.start += offset * 2
+        else:
+            v.length = 1
+
+    def set_speed(self, v):
+        value = v.cmdlo
+        if value == 0:
+            self.stopped = True
+        elif value >= 32:
+            self.bpm = value
+        else:
+            self.counter = 0
+            self.speed = value
+
+    # -- per-tick effects (mt_CheckEffects) ------------------------------------
+
+    def check_effects(self, ch):
+        v = self.voices[ch]
+        p = self.paula[ch]
+        set_volume = True
+        if (v.word & 0x0FFF) != 0:
+            cmd = v.cmd
+            if cmd == 0x0:
+                self.arpeggio(ch)
+            elif cmd == 0x1:
+                self.porta_up(ch)
+            elif cmd == 0x2:
+                self.porta_down(ch)
+            elif cmd == 0x3:
+                self.tone_portamento(ch)
+            elif cmd == 0x4:
+                self.vibrato(ch)
+            elif cmd == 0x5:
+                self.tone_port_no_change(ch)
+                self.volume_slide(v)
+            elif cmd == 0x6:
+                self.vibrato2(ch)
+                self.volume_slide(v)
+            elif cmd == 0xE:
+                self.e_commands(ch)
+            else:
+                p.per = v.period
+                if cmd == 0x7:
+                    self.tremolo(ch)
+                    set_volume = False
+                elif cmd == 0xA:
+                    self.volume_slide(v)
+        if set_volume:
+            p.vol = v.volume
+
+    def arpeggio(self, ch):
+        v = self.voices[ch]
+        p = self.paula[ch]
+        step = ARP_TABLE[self.counter & 0x1F]
+        if step == 0:
+            p.per = v.period
+            return
+        note = (v.cmdlo >> 4) if step == 1 else (v.cmdlo & 0x0F)
+        base = self.peroffset(v)
+        for i in range(PERIOD_ROW):
+            if v.period >= PERIOD_TABLE[base + i]:
+                p.per = PERIOD_TABLE[base + i + note]
+                return
+
+    def porta_up(self, ch):
+        v = self.voices[ch]
+        v.period -= v.cmdlo & self.low_mask
+        self.low_mask = 0xFF
+        if (v.period & 0x0FFF) < 113:
+            v.period = (v.period & 0xF000) | 113
+        self.paula[ch].per = v.period & 0x0FFF
+
+    def porta_down(self, ch):
+        v = self.voices[ch]
+        v.period = (v.period + (v.cmdlo & self.low_mask)) & 0xFFFF
+        self.low_mask = 0xFF
+        if (v.period & 0x0FFF) >= 856:
+            v.period = (v.period & 0xF000) | 856
+        self.paula[ch].per = v.period & 0x0FFF
+
+    def set_tone_porta(self, v):
+        base = self.peroffset(v)
+        idx = self.find_period(base, v.note)
+        if idx == PERIOD_ROW:
+            idx = PERIOD_ROW - 3    # mt_StpLoop falls through to &periods[35]
+        if (v.finetune & 8) and idx != 0:
+            idx -= 1
+        v.wantedperiod = PERIOD_TABLE[base + idx]
+        v.toneportdirec = 0
+        if v.wantedperiod == v.period:
+            v.wantedperiod = 0
+        elif v.wantedperiod < v.period:
+            v.toneportdirec = 1
+
+    def tone_portamento(self, ch):
+        v = self.voices[ch]
+        if v.cmdlo:
+            v.toneportspeed = v.cmdlo
+            v.cmdlo = 0
+            v.word &= ~0xFF
+        self.tone_port_no_change(ch)
+
+    def tone_port_no_change(self, ch):
+        v = self.voices[ch]
+        if v.wantedperiod == 0:
+            return
+        if v.toneportdirec == 0:
+            v.period += v.toneportspeed
+            if v.wantedperiod <= v.period:
+                v.period = v.wantedperiod
+                v.wantedperiod = 0
+        else:
+            v.period -= v.toneportspeed
+            if v.wantedperiod >= v.period:
+                v.period = v.wantedperiod
+                v.wantedperiod = 0
+
+        period = v.period
+        if v.glissfunk & 0x0F:
+            base = self.peroffset(v)
+            idx = self.find_period(base, period)
+            period = PERIOD_TABLE[base + min(idx, PERIOD_ROW - 3)]
+        self.paula[ch].per = period
+
+    def vibrato(self, ch):
+        v = self.voices[ch]
+        if v.cmdlo:
+            cmd = v.vibratocmd
+            if v.cmdlo & 0x0F:
+                cmd = (cmd & 0xF0) | (v.cmdlo & 0x0F)
+            if v.cmdlo & 0xF0:
+                cmd = (cmd & 0x0F) | (v.cmdlo & 0xF0)
+            v.vibratocmd = cmd
+        self.vibrato2(ch)
+
+    def wave_value(self, pos, control, sign_pos):
+        """Vibrato/tremolo waveform magnitude for a position byte."""
+        idx = (pos >> 2) & 0x1F
+        shape = control & 3
+        if shape == 0:
+            return VIBRATO_TABLE[idx]
+        ramp = (idx << 3) & 0xFF
+        if shape == 1:
+            return (255 - ramp) & 0xFF if sign_pos & 0x80 else ramp
+        return 255
+
+    def vibrato2(self, ch):
+        v = self.voices[ch]
+        depth = self.wave_value(v.vibratopos, v.wavecontrol, v.vibratopos)
+        delta = (depth * (v.vibratocmd & 0x0F)) >> 7
+        if v.vibratopos & 0x80:
+            self.paula[ch].per = (v.period - delta) & 0xFFFF
+        else:
+            self.paula[ch].per = (v.period + delta) & 0xFFFF
+        v.vibratopos = (v.vibratopos + ((v.vibratocmd >> 2) & 0x3C)) & 0xFF
+
+    def tremolo(self, ch):
+        v = self.voices[ch]
+        if v.cmdlo:
+            cmd = v.tremolocmd
+            if v.cmdlo & 0x0F:
+                cmd = (cmd & 0xF0) | (v.cmdlo & 0x0F)
+            if v.cmdlo & 0xF0:
+                cmd = (cmd & 0x0F) | (v.cmdlo & 0xF0)
+            v.tremolocmd = cmd
+        # PT2.3F tests n_vibratopos (not tremolopos) for the ramp direction
+        depth = self.wave_value(v.tremolopos, v.wavecontrol >> 4, v.vibratopos)
+        delta = (depth * (v.tremolocmd & 0x0F)) >> 6
+        volume = v.volume - delta if v.tremolopos & 0x80 else v.volume + delta
+        self.paula[ch].vol = max(0, min(64, volume))
+        v.tremolopos = (v.tremolopos + ((v.tremolocmd >> 2) & 0x3C)) & 0xFF
+
+    def volume_slide(self, v):
+        up = v.cmdlo >> 4
+        if up:
+            v.volume = min(64, v.volume + up)
+        else:
+            v.volume = max(0, v.volume - (v.cmdlo & 0x0F))
+
+    # -- Exy -----------------------------------------------------------------
+
+    def e_commands(self, ch):
+        v = self.voices[ch]
+        sub = v.cmdlo >> 4
+        x = v.cmdlo & 0x0F
+        if sub == 0x1:
+            if self.counter == 0:
+                self.low_mask = 0x0F
+                self.porta_up(ch)
+        elif sub == 0x2:
+            if self.counter == 0:
+                self.low_mask = 0x0F
+                self.porta_down(ch)
+        elif sub == 0x3:
+            v.glissfunk = (v.glissfunk & 0xF0) | x
+        elif sub == 0x4:
+            v.wavecontrol = (v.wavecontrol & 0xF0) | x
+        elif sub == 0x5:
+            self.set_finetune(v)
+        elif sub == 0x6:
+            self.jump_loop(v)
+        elif sub == 0x7:
+            v.wavecontrol = (v.wavecontrol & 0x0F) | (x << 4)
+        elif sub == 0x9:
+            self.retrig_note(ch)
+        elif sub == 0xA:
+            if self.counter == 0:
+                v.volume = min(64, v.volume + x)
+        elif sub == 0xB:
+            if self.counter == 0:
+                v.volume = max(0, v.volume - x)
+        elif sub == 0xC:
+            if x == self.counter:
+                v.volume = 0
+        elif sub == 0xD:
+            if x == self.counter and v.note:
+                self.do_retrig(ch)
+        elif sub == 0xE:
+            if self.counter == 0 and self.patt_delay_time2 == 0:
+                self.patt_delay_time = x + 1
+
+    def set_finetune(self, v):
+        v.finetune = v.cmdlo & 0x0F
+
+    def jump_loop(self, v):
+        if self.counter:
+            return
+        x = v.cmdlo & 0x0F
+        if x == 0:
+            v.pattpos = self.pattern_pos & 63
+            return
+        if v.loopcount:
+            v.loopcount -= 1
+            if v.loopcount == 0:
+                return
+        else:
+            v.loopcount = x
+        self.pbreak_pos = v.pattpos
+        self.pbreak_flag = True
+
+    def retrig_note(self, ch):
+        v = self.voices[ch]
+        x = v.cmdlo & 0x0F
+        if x == 0:
+            return
+        if self.counter == 0 and v.note:
+            return
+        if self.counter % x:
+            return
+        self.do_retrig(ch)
+
+    def do_retrig(self, ch):
+        v = self.voices[ch]
+        p = self.paula[ch]
+        p.lc = v.start
+        p.len = v.length
+        p.per = v.period
+        self.dma_restart(ch)
+        p.lc = v.loopstart
+        p.len = v.replen
+
+    # -- sequencing (mt_IntMusic) ----------------------------------------------
+
+    def tick(self):
+        """Run one CIA interrupt worth of replay."""
+        for p in self.paula:
+            p.trigger = None
+        if self.stopped:
+            return
+
+        self.counter += 1
+        if self.counter >= self.speed:
+            self.counter = 0
+            if self.patt_delay_time2 == 0:
+                self.get_new_note()
+            else:
+                self.no_new_all_channels()
+            self.dskip()
+        else:
+            self.no_new_all_channels()
+
+        if self.pos_jump_flag:
+            self.next_position()
+
+    def no_new_all_channels(self):
+        for ch in range(4):
+            self.check_effects(ch)
+
+    def dskip(self):
+        self.pattern_pos += 1
+        if self.patt_delay_time:
+            self.patt_delay_time2 = self.patt_delay_time
+            self.patt_delay_time = 0
+        if self.patt_delay_time2:
+            self.patt_delay_time2 -= 1
+            if self.patt_delay_time2:
+                self.pattern_pos -= 1
+        if self.pbreak_flag:
+            self.pbreak_flag = False
+            self.pattern_pos = self.pbreak_pos
+            self.pbreak_pos = 0
+        if self.pattern_pos >= 64:
+            self.next_position()
+
+    def next_position(self):
+        self.pattern_pos = self.pbreak_pos
+        self.pbreak_pos = 0
+        self.pos_jump_flag = False
+        previous = self.song_pos
+        self.song_pos = (self.song_pos + 1) & 127
+        if self.song_pos >= self.mod.song_length:
+            self.song_pos = 0
+        if self.song_pos <= previous:
+            self.song_end = True
+
+def cia_tick_seconds(bpm):
+    """Length of one replayer tick for a CIA-timed player at `bpm`."""
+    return (CIA_TEMPO_CONSTANT // max(bpm, 32)) / CIA_CLOCK_PAL
+
+def play_mod(mod, max_seconds=None, loop=False):
+    """
+    Run the PT2.3F replayer over the song and record every tick.
+
+    Stops at the end of the song (position wraps or jumps backwards) unless
+    `loop` is set, and after `max_seconds` of playback if given.
+    Returns (ticks, channels): TICK_DTYPE (n,) and CHANNEL_DTYPE (n, 4) arrays.
+    """
+    player = PT23FReplayer(mod)
+    ticks = []
+    channels = []
+    elapsed = 0.0
+    limit = 100000 if max_seconds is None else None
+
+    while True:
+        if max_seconds is not None and elapsed >= max_seconds:
+            break
+        if limit is not None and len(ticks) >= limit:
+            break
+        # The position wrapped while reading the last row; stop once that row is done
+        if player.song_end and not loop and player.counter + 1 >= player.speed:
+            break
+
+        player.tick()
+        seconds = cia_tick_seconds(player.bpm)
+        ticks.append((player.row_position, mod.order[player.row_position],
+                      player.row_index, player.counter, player.bpm, seconds))
+
+        row = []
+        for ch in range(4):
+            p = player.paula[ch]
+            start, length = p.trigger if p.trigger else (0, 0)
+            row.append((p.trigger is not None, start, length * 2, p.lc, p.len * 2,
+                        p.per & 0xFFFF, p.vol, player.voices[ch].sample))
+        channels.append(row)
+        elapsed += seconds
+
+        if player.stopped:
+            break
+
+    return np.array(ticks, dtype=TICK_DTYPE), np.array(channels, dtype=CHANNEL_DTYPE)
+
+def tick_starts(ticks, channels):
+    """
+    Start time of every tick, with time 0 at the first DMA restart like a
+    capture trimmed by strip_leading_silence.
+    """
+    starts = np.concatenate(([0.0], np.cumsum(ticks['seconds'])[:-1]))
+    first = np.flatnonzero(channels['trigger'].any(axis=1))
+    if len(first):
+        starts = starts - starts[first[0]]
+    return starts
+
+def row_starts(ticks, channels):
+    """(seconds, position, row) of the first tick of every row played, timed as in tick_starts()."""
+    key = ticks['position'].astype(np.int64) * 256 + ticks['row']
+    new = np.ones(len(ticks), dtype=bool)
+    new[1:] = key[1:] != key[:-1]
+    return tick_starts(ticks, channels)[new], ticks['position'][new], ticks['row'][new]
+
+def song_rows(ticks, channels, seconds):
+    """
+    Song (position, row) playing at each time in `seconds` (see tick_starts()).
+    Times before the first or after the last tick clamp to those ticks.
+    """
+    starts = tick_starts(ticks, channels)
+    idx = np.searchsorted(starts, np.asarray(seconds, dtype=np.float64), side='right') - 1
+    idx = np.clip(idx, 0, len(ticks) - 1)
+    return ticks['position'][idx], ticks['row'][idx]
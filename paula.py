@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the replayer capture tools.
+
+  trim         strip leading silence from a capture (strip_leading_silence.py)
+  stats        correlation and difference statistics (analyze_recordings.py,
+               or analyze_recordings_stdlib.py when NumPy isn't available)
+  compare      are these captures identical? Content hashes (cached in
+               pipeline_out/hashes.json); captures stored differently
+               (planar, WAV) are compared sample by sample. No NumPy
+  determinism  consensus check over N takes (analyze_determinism.py)
+  diff         4-channel difference files (generate_channel_diffs.py)
+  export       WAV export (export_wav.py)
+  planar       convert captures to the channel-planar layout (planar_pcm.py)
+  fingerprint  record / check golden capture fingerprints (fingerprint.py)
+  query        results history (results_db.py), no NumPy
+  serve        analysis daemon keeping captures mapped (paula_daemon.py)
+  ask          query the daemon (paula_client.py), no NumPy
+
+Default captures come from the replayer registry (replayers.json). Each
+subcommand imports its tool only when it runs, so NumPy and the analysis
+modules are never loaded for trim, compare, query or ask; these start in a few
+tens of milliseconds and then only cost the time to read their input.
+Arguments after the subcommand are passed through to the tool (see
+<subcommand> --help).
+
+Usage: ./paula.py compare                                   # registry captures
+       ./paula.py compare hippoplayer_channels_raw_take*.pcm
+       ./paula.py stats [files...] [--rate 44100] [--engine stdlib]
+       ./paula.py trim input.pcm output.pcm --threshold 100
+       ./paula.py determinism --replayer lsplayer
+       ./paula.py diff
+       ./paula.py export pt23f_channels_raw.pcm --stereo
+       ./paula.py planar *_channels_raw.pcm --in-place
+       ./paula.py fingerprint check PT2.3F
+       ./paula.py query pairs PT2.3F LSPlayer --channel 1 --last 20
+       ./paula.py serve &
+       ./paula.py ask diff PT2.3F LSPlayer --channel 1 --start 45 --end 46
+
+compare and fingerprint check exit with status 1 on a mismatch, so they can gate scripts.
+
+Requirements:
+  - NumPy for stats (optional), determinism, diff, export, planar, fingerprint and serve
+"""
+
+import argparse
+import array
+import importlib.util
+import sys
+from pathlib import Path
+
+from planar_pcm import HEADER_SIZE, read_header, capture_format
+from replayers import capture_files
+
+CHUNK_BYTES = 1 << 20
+
+def have_numpy():
+    """True if NumPy can be imported (checked without importing it)."""
+    return importlib.util.find_spec('numpy') is not None
+
+def run_tool(module, argv):
+    """Import a tool module and run its main() with argv as its command line."""
+    tool = importlib.import_module(module)
+    sys.argv = [f"{module}.py"] + argv
+    return tool.main()
+
+def first_difference(file1, file2, offset1=0, offset2=0, length=None):
+    """
+    Byte offset (relative to offset1/offset2) of the first difference
+    between two files, or between `length` bytes of them; None if identical.
+    """
+    with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
+        f1.seek(offset1)
+        f2.seek(offset2)
+        offset = 0
+        while True:
+            size = CHUNK_BYTES if length is None else min(CHUNK_BYTES, length - offset)
+            a = f1.read(size)
+            b = f2.read(size)
+            if a != b:
+                return offset + first_mismatch(a, b)
+            if not a:
+                return None
+            offset += len(a)
+
+def first_mismatch(a, b):
+    """Index of the first differing byte of two unequal byte strings."""
+    # Bisect with slice comparisons: a[:lo] == b[:lo] throughout
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if a[lo:mid + 1] == b[lo:mid + 1]:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def capture_frames(filename):
+    """(frames, sample_rate, channels) of a capture in any format (see capture_format())."""
+    header = read_header(filename)
+    if header is not None:
+        return header[2], header[0], header[1]
+    sample_rate, channels, offset = capture_format(filename)
+    return (Path(filename).stat().st_size - offset) // (2 * channels), sample_rate, channels
+
+def data_layout(filename):
+    """How a capture's samples are stored: ('planar' | 'WAV' | 'raw', data offset)."""
+    if read_header(filename) is not None:
+        return 'planar', HEADER_SIZE
+    offset = capture_format(filename)[2]
+    return 'WAV' if offset else 'raw', offset
+
+def read_channels(filename, start, count):
+    """Frames start..start+count of a capture in any layout, as one array('h') per channel."""
+    header = read_header(filename)
+    with open(filename, 'rb') as f:
+        if header is not None:
+            _, channels, frames = header
+            count = max(0, min(count, frames - start))
+            planes = []
+            for ch in range(channels):
+                f.seek(HEADER_SIZE + (ch * frames + start) * 2)
+                plane = array.array('h')
+                plane.frombytes(f.read(count * 2))
+                planes.append(plane)
+            return planes
+        _, channels, offset = capture_format(filename)
+        f.seek(offset + start * 2 * channels)
+        data = f.read(count * 2 * channels)
+        samples = array.array('h')
+        samples.frombytes(data[:len(data) - len(data) % (2 * channels)])
+        return [samples[ch::channels] for ch in range(channels)]
+
+def decoded_difference(file1, file2):
+    """
+    (frame, channel) of the first differing sample of two captures of the
+    same format stored differently (planar vs interleaved, WAV vs raw), None
+    if their samples are identical. Reads both in chunks of decoded frames.
+    """
+    frames1, _, channels = capture_frames(file1)
+    frames2 = capture_frames(file2)[0]
+    common = min(frames1, frames2)
+    chunk = CHUNK_BYTES // (2 * channels)
+    for start in range(0, common, chunk):
+        count = min(chunk, common - start)
+        first = None
+        for ch, (a, b) in enumerate(zip(read_channels(file1, start, count), read_channels(file2, start, count))):
+            if a != b:
+                frame = first_mismatch(a.tobytes(), b.tobytes()) // 2
+                if first is None or frame < first[0]:
+                    first = (frame, ch)
+        if first is not None:
+            return start + first[0], first[1]
+    return None if frames1 == frames2 else (common, 0)
+
+def difference_position(file1, file2):
+    """(frame, channel) of the first difference between two captures of the same layout and format."""
+    header1, header2 = read_header(file1), read_header(file2)
+    if header1 is None:
+        _, channels, offset1 = capture_format(file1)
+        offset2 = capture_format(file2)[2]
+        offset = first_difference(file1, file2, offset1, offset2)
+        return offset // (2 * channels), offset % (2 * channels) // 2
+
+    # Planar: the earliest difference over the channel planes
+    frames1, frames2 = header1[2], header2[2]
+    first = None
+    for ch in range(min(header1[1], header2[1])):
+        offset = first_difference(file1, file2, HEADER_SIZE + ch * frames1 * 2, HEADER_SIZE + ch * frames2 * 2,
+                                  min(frames1, frames2) * 2)
+        if offset is not None and (first is None or offset // 2 < first[0]):
+            first = (offset // 2, ch)
+    # Planes identical over the common length: they differ in length (or channel count)
+    return first or (min(frames1, frames2), 0)
+
+def frame_time(frame, sample_rate):
+    """Frame index as a time string."""
+    seconds = frame / sample_rate
+    return f"{int(seconds // 60)}m {seconds % 60:.3f}s"
+
+def cmd_compare(args):
+    if args.files:
+        files = {f: f for f in args.files}
+    else:
+        files = {name: f for name, f in capture_files().items() if Path(f).exists()}
+    if len(files) < 2:
+        print("Error: need at least two captures!")
+        return 2
+    for filename in files.values():
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 2
+
+    # (size, mtime)-keyed hash cache that also reads the pipeline's, so
+    # captures the pipeline has already seen aren't read again
+    from pipeline import file_hashes
+    digests = file_hashes(files.values())
+    hashes = {name: digests[str(filename)] for name, filename in files.items()}
+
+    width = max(len(name) for name in files)
+    formats = {}
+    for name, filename in files.items():
+        frames, sample_rate, channels = capture_frames(filename)
+        formats[name] = (sample_rate, channels)
+        layout = '' if read_header(filename) is None else '  (planar)'
+        print(f"  {name:{width}s}  {hashes[name][:16]}  {frames:,} frames, {channels}ch @ {sample_rate}Hz{layout}")
+    print()
+
+    names = list(files)
+    reference = names[0]
+    identical = True
+    for name in names[1:]:
+        if hashes[name] == hashes[reference]:
+            print(f"  {name}: identical to {reference}")
+            continue
+        if formats[name] != formats[reference]:
+            identical = False
+            print(f"  {name}: differs from {reference} (different sample rate or channel count)")
+            continue
+        if data_layout(files[name]) == data_layout(files[reference]):
+            position = difference_position(files[reference], files[name])
+        else:
+            # Stored differently (planar, WAV): the bytes differ anyway, compare the samples
+            position = decoded_difference(files[reference], files[name])
+            if position is None:
+                print(f"  {name}: same samples as {reference} (stored as {data_layout(files[name])[0]})")
+                continue
+        identical = False
+        frame, channel = position
+        print(f"  {name}: differs from {reference} at frame {frame:,} "
+              f"({frame_time(frame, formats[name][0])}), Ch{channel}")
+    print()
+    return 0 if identical else 1
+
+def cmd_trim(args):
+    return run_tool('strip_leading_silence', args.args)
+
+def cmd_stats(args):
+    engine = args.engine
+    if engine == 'auto':
+        engine = 'numpy' if have_numpy() else 'stdlib'
+    if engine == 'numpy':
+        return run_tool('analyze_recordings', args.args)
+    return run_tool('analyze_recordings_stdlib', args.args)
+
+def numpy_tool(module):
+    """Subcommand handler for a tool that needs NumPy."""
+    def run(args):
+        if not have_numpy():
+            print(f"Error: '{args.command}' needs NumPy (install it in the venv)")
+            return 1
+        return run_tool(module, args.args)
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description='Replayer capture tools.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('compare', help='identical check via content hashes or decoded samples (no NumPy)')
+    p.add_argument('files', nargs='*', help='captures (default: registry captures on disk)')
+    p.set_defaults(run=cmd_compare)
+
+    p = sub.add_parser('trim', help='strip leading silence', add_help=False)
+    p.set_defaults(run=cmd_trim)
+
+    p = sub.add_parser('stats', help='correlation and difference statistics', add_help=False)
+    p.add_argument('--engine', choices=['auto', 'numpy', 'stdlib'], default='auto',
+                   help='analysis engine (default: NumPy when installed)')
+    p.set_defaults(run=cmd_stats)
+
+    p = sub.add_parser('query', help='results history (see results_db.py)', add_help=False)
+    p.set_defaults(run=lambda args: run_tool('results_db', args.args))
+
+    p = sub.add_parser('ask', help='query the analysis daemon (see paula_client.py)', add_help=False)
+    p.set_defaults(run=lambda args: run_tool('paula_client', args.args))
+
+    for name, module, text in [('determinism', 'analyze_determinism', 'FS-UAE determinism over N takes'),
+                               ('diff', 'generate_channel_diffs', '4-channel difference files'),
+                               ('export', 'export_wav', 'WAV export'),
+                               ('planar', 'planar_pcm', 'channel-planar layout conversion'),
+                               ('fingerprint', 'fingerprint', 'golden capture fingerprints'),
+                               ('serve', 'paula_daemon', 'analysis daemon keeping captures mapped')]:
+        p = sub.add_parser(name, help=text, add_help=False)
+        p.set_defaults(run=numpy_tool(module))
+
+    # Everything a subcommand doesn't define itself (including --help) goes to the tool
+    args, args.args = parser.parse_known_args()
+    if args.command == 'compare' and args.args:
+        parser.error(f"unrecognized arguments: {' '.join(args.args)}")
+    return args.run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
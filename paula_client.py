@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Thin client for the analysis daemon (paula_daemon.py).
+
+Sends one query over the daemon's Unix socket and prints the answer. Only
+the standard library is imported, so a query costs interpreter start plus
+the daemon's (millisecond) answer; the captures, their activity indexes,
+envelopes and hashes stay loaded in the daemon.
+
+Times are in seconds from the start of the capture; --channel limits the
+answer to one PAULA channel.
+
+Usage: ./paula_client.py list
+       ./paula_client.py stats PT2.3F --start 45 --end 46
+       ./paula_client.py diff PT2.3F LSPlayer --channel 1 --start 45 --end 46
+       ./paula_client.py envelope LSPlayer --start 45 --end 46 --points 50
+       ./paula_client.py activity HippoPlayer --channel 3 --start 0 --end 10
+       ./paula_client.py info PT2.3F
+       ./paula_client.py register take2 pt23f_channels_raw_take2.pcm
+       ./paula_client.py shutdown
+       ./paula.py ask ...                    # same thing
+
+The socket is $PAULA_SOCKET, default paula.sock in the current directory.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+SOCKET_FILE = os.environ.get('PAULA_SOCKET', 'paula.sock')
+
+def request(query, socket_file=SOCKET_FILE, timeout=600.0):
+    """Send one query (a dict with a 'query' key) and return the daemon's reply dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_file)
+        sock.sendall(json.dumps(query).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        return {'error': 'daemon closed the connection'}
+    return json.loads(line)
+
+def channel_table(per_channel, keys):
+    """Print per-channel results as an aligned table."""
+    print("  " + "".join(f"{key:>16s}" for key in ['channel'] + keys))
+    for entry in per_channel:
+        cells = [f"{entry['channel']:>16d}"]
+        for key in keys:
+            value = entry[key]
+            cells.append(f"{'-':>16s}" if value is None else f"{value:16.4f}")
+        print("  " + "".join(cells))
+
+def print_result(args, result):
+    if args.query == 'list':
+        for entry in result['captures']:
+            print(f"  {entry['name']:14s} {entry['file']:36s} {entry['frames']:>11,} frames  "
+                  f"{entry['channels']}ch @ {entry['rate']}Hz  {entry['duration']:8.2f}s")
+    elif args.query == 'info':
+        for key, value in result.items():
+            print(f"  {key:16s} {value}")
+    elif args.query == 'stats':
+        print(f"  {result['name']}: {result['start']:.3f}s - {result['end']:.3f}s ({result['frames']:,} frames)")
+        channel_table(result['per_channel'], ['rms', 'max', 'active_pct'])
+    elif args.query == 'diff':
+        print(f"  {result['names'][0]} vs {result['names'][1]}: {result['start']:.3f}s - {result['end']:.3f}s "
+              f"({result['frames']:,} frames @ {result['rate']}Hz)")
+        divergence = result['first_divergence']
+        print(f"  first divergence: {'none' if divergence is None else f'{divergence:.6f}s'}")
+        channel_table(result['per_channel'], ['correlation', 'mean_diff', 'max_diff', 'significant_pct'])
+    elif args.query == 'envelope':
+        print(f"  {result['name']}: {len(result['times'])} points, {result['step']:.4f}s apart (max per point)")
+        for t, values in zip(result['times'], result['values']):
+            print(f"  {t:10.4f}s  " + "  ".join(f"{v:8.1f}" for v in values))
+    elif args.query == 'activity':
+        for entry in result['per_channel']:
+            spans = ", ".join(f"{a:.3f}-{b:.3f}" for a, b in entry['spans'])
+            print(f"  Ch{entry['channel']}: {spans or 'silent'}")
+    else:
+        print(f"  {result}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the analysis daemon (paula_daemon.py).')
+    parser.add_argument('--socket', default=SOCKET_FILE, help=f'daemon socket (default {SOCKET_FILE})')
+    parser.add_argument('--json', action='store_true', help='print the raw JSON reply')
+    sub = parser.add_subparsers(dest='query', required=True)
+
+    def ranged(p):
+        p.add_argument('--start', type=float, help='start time in seconds (default: beginning)')
+        p.add_argument('--end', type=float, help='end time in seconds (default: end of capture)')
+        p.add_argument('--channel', type=int, help='only this channel')
+
+    sub.add_parser('ping', help='check that the daemon is up')
+    sub.add_parser('list', help='registered captures')
+    p = sub.add_parser('info', help='format, content hash and activity of a capture')
+    p.add_argument('name')
+    p = sub.add_parser('stats', help='per-channel RMS / max amplitude over a time range')
+    p.add_argument('name')
+    ranged(p)
+    p = sub.add_parser('diff', help='per-channel differences and correlation of two captures over a time range')
+    p.add_argument('names', nargs=2, metavar='NAME')
+    p.add_argument('--threshold', type=int, default=100, help='significant difference (default 100)')
+    ranged(p)
+    p = sub.add_parser('envelope', help='amplitude envelope over a time range')
+    p.add_argument('name')
+    p.add_argument('--points', type=int, default=100, help='at most N points (default 100)')
+    ranged(p)
+    p = sub.add_parser('activity', help='non-silent spans over a time range')
+    p.add_argument('name')
+    ranged(p)
+    p = sub.add_parser('register', help='load another capture into the daemon')
+    p.add_argument('name')
+    p.add_argument('file')
+    sub.add_parser('shutdown', help='stop the daemon')
+
+    args = parser.parse_args()
+    query = {key: value for key, value in vars(args).items()
+             if key not in ('socket', 'json') and value is not None}
+    if query['query'] == 'register':
+        query['file'] = os.path.abspath(query['file'])
+
+    try:
+        reply = request(query, args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Error: no daemon listening on {args.socket} (start it with ./paula.py serve)")
+        return 1
+    if 'error' in reply:
+        print(f"Error: {reply['error']}")
+        return 1
+
+    if args.json:
+        print(json.dumps(reply['result'], indent=2))
+    else:
+        print_result(args, reply['result'])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
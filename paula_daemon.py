@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Long-running analysis daemon: keeps captures mapped and answers queries.
+
+Every tool invocation pays interpreter start, the NumPy import and opening
+and indexing the captures before it computes anything. The daemon does that
+once: the registry captures (plus any given on the command line or
+registered later) stay memory-mapped together with their activity index
+(see paula_pcm.py), a 1 ms amplitude envelope and their content hash, and
+small queries such as "Ch1 differences between 45 s and 46 s" only touch
+the frames they ask about.
+
+Queries arrive as one JSON object per line on a Unix domain socket and
+are answered the same way ({"result": ...} or {"error": ...}); each
+connection is served on its own thread. paula_client.py (./paula.py ask) is
+the thin client.
+
+  ping, list, info NAME, register NAME FILE, shutdown
+  stats NAME            per-channel RMS, max amplitude, active fraction
+  diff NAME1 NAME2      per-channel correlation and difference statistics
+  envelope NAME         amplitude envelope, reduced to at most N points
+  activity NAME         non-silent spans
+
+All but the first group take start/end (seconds) and channel. Pairs at
+different rates are resampled on the fly, as in analyze_recordings.py.
+
+Captures are re-checked (size, mtime) before every query and by a
+background thread every --poll seconds; a changed file is re-mapped and
+its indexes rebuilt, so a fresh recording is picked up without a restart.
+(Reading a mapping while the file is being truncated and rewritten in place
+is not safe, so leave the daemon idle while FS-UAE records over a capture.)
+
+Usage: ./paula_daemon.py                                  # registry captures
+       ./paula_daemon.py take2=pt23f_channels_raw_take2.pcm -j 4
+       ./paula.py serve ...                               # same thing
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import numpy as np
+from pathlib import Path
+
+from analyze_recordings import channel_levels, compare_captures, correlation_matrix, total_sums
+from paula_client import SOCKET_FILE, request
+from paula_pcm import open_capture, load_activity, union_spans, envelope, default_threads
+from replayers import capture_files
+
+ENVELOPE_POINTS_PER_SECOND = 1000
+POLL_SECONDS = 1.0
+
+hash_lock = threading.Lock()
+
+def file_key(filename):
+    """(size, mtime) of a file; a capture is reloaded when this changes."""
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+def number(value):
+    """Plain float for JSON, None for NaN."""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+class Capture:
+    """One version of a capture file: its memory map and indexes."""
+
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = str(filename)
+        self.key = file_key(self.filename)
+        self.samples, self.rate = open_capture(self.filename)
+        self.activity = load_activity(self.filename)
+        self.hop = max(1, self.rate // ENVELOPE_POINTS_PER_SECOND)
+        self.lock = threading.Lock()
+        self._envelope = None
+        self._hash = None
+
+    def envelope(self):
+        """Mean |value| per channel over runs of `hop` frames, built on first use."""
+        with self.lock:
+            if self._envelope is None:
+                self._envelope = envelope(self.samples, self.hop)
+            return self._envelope
+
+    def content_hash(self):
+        """Content hash, via the hash cache of pipeline.file_hashes()."""
+        with self.lock:
+            if self._hash is None:
+                from pipeline import file_hashes
+                with hash_lock:
+                    self._hash = file_hashes([self.filename])[self.filename]
+            return self._hash
+
+    def frame_range(self, query):
+        """Frames start..stop for the query's start/end seconds, clipped to the capture."""
+        num_frames = len(self.samples)
+        start = query.get('start')
+        end = query.get('end')
+        start = 0 if start is None else min(max(int(round(start * self.rate)), 0), num_frames)
+        stop = num_frames if end is None else min(max(int(round(end * self.rate)), 0), num_frames)
+        if stop <= start:
+            raise ValueError(f"{self.name}: empty time range (capture is {num_frames / self.rate:.3f}s)")
+        return start, stop
+
+    def channels(self, query):
+        """Channels the query asks for (all of them by default)."""
+        channel = query.get('channel')
+        if channel is None:
+            return list(range(self.samples.shape[1]))
+        if not 0 <= channel < self.samples.shape[1]:
+            raise ValueError(f"{self.name}: no channel {channel}")
+        return [channel]
+
+class Captures:
+    """Registered captures by name, re-mapped whenever their file changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.captures = {}
+
+    def register(self, name, filename):
+        capture = Capture(name, filename)
+        with self.lock:
+            self.captures[name] = capture
+        return capture
+
+    def get(self, name):
+        """Current version of a capture, reloading it first if the file changed."""
+        with self.lock:
+            capture = self.captures.get(name)
+        if capture is None:
+            raise ValueError(f"unknown capture '{name}' (see list)")
+        if file_key(capture.filename) != capture.key:
+            print(f"  {name}: {capture.filename} changed, reloading")
+            capture = self.register(name, capture.filename)
+        return capture
+
+    def all(self):
+        with self.lock:
+            return list(self.captures.values())
+
+    def refresh(self, warm=True):
+        """Reload changed captures; with warm, also build missing envelopes and hashes."""
+        for capture in self.all():
+            try:
+                capture = self.get(capture.name)
+                if warm:
+                    capture.envelope()
+                    capture.content_hash()
+            except OSError:
+                pass  # being rewritten or removed; the next query reports it
+
+def range_spans(spans, start, stop):
+    """(starts, ends) of spans clipped to start..stop, relative to start."""
+    starts, ends = spans
+    keep = (ends > start) & (starts < stop)
+    return np.maximum(starts[keep], start) - start, np.minimum(ends[keep], stop) - start
+
+def query_ping(daemon, query):
+    return {'captures': len(daemon.captures.all()), 'pid': os.getpid()}
+
+def query_list(daemon, query):
+    return {'captures': [{'name': c.name, 'file': c.filename, 'frames': len(c.samples),
+                          'channels': c.samples.shape[1], 'rate': c.rate,
+                          'duration': len(c.samples) / c.rate}
+                         for c in daemon.captures.all()]}
+
+def query_info(daemon, query):
+    capture = daemon.captures.get(query['name'])
+    num_frames = max(len(capture.samples), 1)
+    return {
+        'name': capture.name,
+        'file': capture.filename,
+        'hash': capture.content_hash(),
+        'frames': len(capture.samples),
+        'channels': capture.samples.shape[1],
+        'rate': capture.rate,
+        'duration': len(capture.samples) / capture.rate,
+        'active_pct': [number((ends - starts).sum() / num_frames * 100) for starts, ends in capture.activity],
+        'spans': [len(starts) for starts, _ in capture.activity],
+    }
+
+def query_register(daemon, query):
+    filename = query['file']
+    if not Path(filename).exists():
+        raise ValueError(f"{filename} not found!")
+    capture = daemon.captures.register(query['name'], filename)
+    return {'name': capture.name, 'frames': len(capture.samples), 'rate': capture.rate}
+
+def query_stats(daemon, query):
+    capture = daemon.captures.get(query['name'])
+    start, stop = capture.frame_range(query)
+    rms, max_amp = channel_levels(capture.samples[start:stop], daemon.threads)
+    per_channel = []
+    for ch in capture.channels(query):
+        starts, ends = range_spans(capture.activity[ch], start, stop)
+        per_channel.append({'channel': ch, 'rms': number(rms[ch]), 'max': int(max_amp[ch]),
+                            'active_pct': number((ends - starts).sum() / (stop - start) * 100)})
+    return {'name': capture.name, 'start': start / capture.rate, 'end': stop / capture.rate,
+            'frames': stop - start, 'per_channel': per_channel}
+
+def query_diff(daemon, query):
+    name1, name2 = query['names']
+    capture1 = daemon.captures.get(name1)
+    capture2 = daemon.captures.get(name2)
+    start1, stop1 = capture1.frame_range(query)
+    start2, stop2 = capture2.frame_range(query)
+    samples1 = capture1.samples[start1:stop1]
+    samples2 = capture2.samples[start2:stop2]
+
+    # Without resampling only the active spans of the range need reading
+    spans = None
+    if capture1.rate == capture2.rate:
+        stop = min(stop1, stop2)
+        spans = union_spans([range_spans(s, start1, stop) for s in capture1.activity],
+                            [range_spans(s, start1, stop) for s in capture2.activity])
+
+    sums, analysis = compare_captures(samples1, capture1.rate, samples2, capture2.rate,
+                                      threshold=query.get('threshold', 100), spans=spans,
+                                      threads=daemon.threads)
+    rate = analysis['rate']
+    start = start1 / capture1.rate
+    correlation = np.diagonal(correlation_matrix(total_sums(sums))[0])
+    channels = range(len(correlation)) if query.get('channel') is None else capture1.channels(query)
+    if max(channels) >= len(correlation):
+        raise ValueError(f"the pair is compared as stereo, no channel {max(channels)}")
+    divergence = analysis['first_divergence']
+    return {
+        'names': [name1, name2],
+        'start': start,
+        'end': start + analysis['frames'] / rate,
+        'frames': analysis['frames'],
+        'rate': rate,
+        'first_divergence': None if divergence is None else start + divergence / rate,
+        'per_channel': [{'channel': ch,
+                         'correlation': number(correlation[ch]),
+                         'mean_diff': number(analysis['per_channel'][ch]['mean']),
+                         'max_diff': number(analysis['per_channel'][ch]['max']),
+                         'significant_pct': number(analysis['per_channel'][ch]['pct_significant'])}
+                        for ch in channels],
+    }
+
+def query_envelope(daemon, query):
+    capture = daemon.captures.get(query['name'])
+    start, stop = capture.frame_range(query)
+    env = capture.envelope()[start // capture.hop:-(-stop // capture.hop), capture.channels(query)]
+
+    # Reduce to at most `points` points, keeping the peak of each group
+    points = max(1, query.get('points', 100))
+    group = max(1, -(-len(env) // points))
+    padded = np.pad(env, ((0, -len(env) % group), (0, 0)))
+    values = padded.reshape(-1, group, env.shape[1]).max(axis=1)
+    step = group * capture.hop / capture.rate
+    first = (start // capture.hop) * capture.hop / capture.rate
+    return {'name': capture.name, 'step': step,
+            'times': [first + i * step for i in range(len(values))],
+            'values': [[number(v) for v in row] for row in values]}
+
+def query_activity(daemon, query):
+    capture = daemon.captures.get(query['name'])
+    start, stop = capture.frame_range(query)
+    per_channel = []
+    for ch in capture.channels(query):
+        starts, ends = range_spans(capture.activity[ch], start, stop)
+        per_channel.append({'channel': ch,
+                            'spans': [[(start + a) / capture.rate, (start + b) / capture.rate]
+                                      for a, b in zip(starts.tolist(), ends.tolist())]})
+    return {'name': capture.name, 'per_channel': per_channel}
+
+def query_shutdown(daemon, query):
+    daemon.stop.set()
+    return {'stopping': True}
+
+QUERIES = {
+    'ping': query_ping,
+    'list': query_list,
+    'info': query_info,
+    'register': query_register,
+    'stats': query_stats,
+    'diff': query_diff,
+    'envelope': query_envelope,
+    'activity': query_activity,
+    'shutdown': query_shutdown,
+}
+
+class Handler(socketserver.StreamRequestHandler):
+    """Answers JSON queries, one per line, until the client disconnects."""
+
+    def handle(self):
+        daemon = self.server
+        for line in self.rfile:
+            try:
+                query = json.loads(line)
+                answer = QUERIES.get(query.get('query'))
+                if answer is None:
+                    raise ValueError(f"unknown query {query.get('query')!r}")
+                reply = {'result': answer(daemon, query)}
+            except (ValueError, KeyError, TypeError, OSError) as e:
+                reply = {'error': f"{type(e).__name__}: {e}" if isinstance(e, KeyError) else str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_file, captures, threads, poll):
+        super().__init__(socket_file, Handler)
+        self.captures = captures
+        self.threads = threads
+        self.poll = poll
+        self.stop = threading.Event()
+
+    def watch(self):
+        """Poll the captures for changes until shutdown, then stop serving."""
+        self.captures.refresh()
+        while not self.stop.wait(self.poll):
+            self.captures.refresh()
+        self.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Analysis daemon keeping captures mapped between queries.')
+    parser.add_argument('captures', nargs='*', metavar='[NAME=]FILE',
+                        help='captures to load in addition to the registry ones')
+    parser.add_argument('--socket', default=SOCKET_FILE, help=f'socket to listen on (default {SOCKET_FILE})')
+    parser.add_argument('-j', '--threads', type=int, default=default_threads(),
+                        help='worker threads per query (default: $PAULA_THREADS or all CPUs)')
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS,
+                        help=f'seconds between checks for changed captures (default {POLL_SECONDS})')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("PAULA Analysis Daemon")
+    print("=" * 80)
+    print()
+
+    files = {name: f for name, f in capture_files().items() if Path(f).exists()}
+    for entry in args.captures:
+        name, _, filename = entry.rpartition('=')
+        files[name or Path(filename).stem.replace('_channels_raw', '')] = filename
+
+    captures = Captures()
+    for name, filename in files.items():
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+        capture = captures.register(name, Path(filename).resolve())
+        print(f"  {name:14s}: {len(capture.samples):,} frames, {capture.samples.shape[1]}ch @ {capture.rate}Hz")
+    print()
+
+    # A socket file nobody answers on is left over from a daemon that died
+    if os.path.exists(args.socket):
+        try:
+            request({'query': 'ping'}, args.socket, timeout=1.0)
+        except OSError:
+            os.unlink(args.socket)
+        else:
+            print(f"Error: a daemon is already listening on {args.socket}")
+            return 1
+
+    server = Daemon(args.socket, captures, args.threads, args.poll)
+    watcher = threading.Thread(target=server.watch, daemon=True)
+    watcher.start()
+    print(f"Listening on {args.socket} (pid {os.getpid()}); stop with ./paula.py ask shutdown")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+    print("Stopped.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""
+Shared helpers for reading raw PAULA 4-channel captures.
+
+Captures are headerless PCM files (16-bit signed little-endian, 4 channels
+interleaved, 96000Hz) as written by FS-UAE's
+uae_sound_paula_capture_channels_file option.
+
+Files are memory-mapped rather than read into memory, so tools can walk a
+capture in blocks without holding all ~90 MB at once.
+
+Captures converted to the channel-planar layout (planar_pcm.py: a small
+header, then one contiguous int16 array per channel) open to the same
+(frames, channels) array, a transposed view of the planar map, so every
+tool takes either layout and per-channel scans become contiguous.
+
+Other captures (the 44.1kHz stereo sound_paula_capture_file output, WAVs
+recorded from real hardware) carry their format with them: WAV headers are
+read directly, and a raw file can have a <capture>.json sidecar with its
+sample_rate and channels. open_capture() returns the rate alongside the
+samples, and paired_blocks() streams two captures at a common rate and
+channel layout through a block-wise polyphase resampler, without writing or
+holding a resampled copy of either file.
+
+PAULA channels are silent (exactly zero) between notes, often for long
+stretches. activity_index() records the non-silent spans of every channel
+in one pass and load_activity() caches them in a <capture>.activity.npz
+sidecar; analyses walk only the union of the spans of a pair
+(active_blocks(), paired_blocks(spans=...)), since silent frames add
+nothing to sums or differences.
+
+The NumPy analyzers split their work into block (or channel, block) tasks
+and run them on a thread pool with ordered_map(); NumPy releases the GIL
+inside its kernels, so this scales across cores. Results are merged in task
+order, which keeps them bit-identical for any thread count. The default
+thread count is $PAULA_THREADS, else the number of CPUs.
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import planar_pcm
+# Format detection is stdlib-only, so it lives with the planar header helpers
+from planar_pcm import SAMPLE_RATE, CHANNELS, capture_format, write_capture_format
+
+BLOCK_FRAMES = 1 << 20
+# Silent runs shorter than this (zero crossings, short rests) stay inside an active span
+ACTIVITY_GAP = 4096
+
+def default_threads():
+    """Worker threads for the analyzers: $PAULA_THREADS, else the CPU count."""
+    return int(os.environ.get('PAULA_THREADS', 0)) or os.cpu_count() or 1
+
+def ordered_map(func, tasks, threads=None, ahead=2):
+    """
+    Yield func(*task) for every task, in task order, computed on a pool of
+    threads. At most threads * ahead tasks are in flight, so a generator of
+    large blocks is never run far ahead. threads=1 runs everything inline.
+    """
+    threads = threads or default_threads()
+    if threads <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(func, *task))
+            if len(pending) >= threads * ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def open_planar(filename):
+    """
+    Memory-map a channel-planar capture (see planar_pcm.py). Returns
+    (samples, sample_rate); samples is a (frames, channels) view of the
+    (channels, frames) map, so samples[:, ch] is contiguous.
+    """
+    sample_rate, channels, num_frames = planar_pcm.read_header(filename)
+    if num_frames == 0:
+        return np.zeros((0, channels), dtype=np.int16), sample_rate
+    planes = np.memmap(filename, dtype='<i2', mode='r', offset=planar_pcm.HEADER_SIZE,
+                       shape=(channels, num_frames))
+    return planes.T, sample_rate
+
+def open_pcm(filename, channels=CHANNELS):
+    """Memory-map raw PCM file (either layout) as a read-only (frames, channels) int16 array."""
+    if planar_pcm.read_header(filename) is not None:
+        return open_planar(filename)[0]
+    num_frames = os.path.getsize(filename) // (2 * channels)
+    if num_frames == 0:
+        return np.zeros((0, channels), dtype=np.int16)
+    return np.memmap(filename, dtype='<i2', mode='r', shape=(num_frames, channels))
+
+# Amiga hardware panning: which output side each PAULA channel is wired to
+LEFT_CHANNELS = (0, 3)
+RIGHT_CHANNELS = (1, 2)
+
+def open_capture(filename):
+    """Memory-map any capture (raw, planar or WAV). Returns (samples (frames, channels), sample_rate)."""
+    if planar_pcm.read_header(filename) is not None:
+        return open_planar(filename)
+    sample_rate, channels, offset = capture_format(filename)
+    num_frames = (os.path.getsize(filename) - offset) // (2 * channels)
+    if num_frames <= 0:
+        return np.zeros((0, channels), dtype=np.int16), sample_rate
+    samples = np.memmap(filename, dtype='<i2', mode='r', offset=offset, shape=(num_frames, channels))
+    return samples, sample_rate
+
+def iter_blocks(samples, block_frames=BLOCK_FRAMES, start=0, stop=None):
+    """Yield (offset, block) pairs covering samples[start:stop]."""
+    if stop is None or stop > len(samples):
+        stop = len(samples)
+    for offset in range(start, stop, block_frames):
+        yield offset, samples[offset:min(offset + block_frames, stop)]
+
+def activity_index(samples, min_gap=ACTIVITY_GAP, block_frames=BLOCK_FRAMES):
+    """
+    Non-silent spans of every channel in one pass: a list with one
+    (starts, ends) pair of int64 arrays per channel, ends exclusive. Frames
+    outside the spans are exactly zero; silent gaps shorter than min_gap
+    are merged into the surrounding span.
+    """
+    channels = samples.shape[1]
+    starts = [[] for _ in range(channels)]
+    ends = [[] for _ in range(channels)]
+    for offset, block in iter_blocks(samples, block_frames):
+        active = np.asarray(block) != 0
+        for ch in range(channels):
+            idx = np.flatnonzero(active[:, ch])
+            if not len(idx):
+                continue
+            idx += offset
+            breaks = np.flatnonzero(np.diff(idx) > min_gap)
+            first = np.concatenate(([idx[0]], idx[breaks + 1]))
+            last = np.concatenate((idx[breaks], [idx[-1]])) + 1
+            # Continue the previous block's last span if the gap is short
+            if ends[ch] and first[0] - ends[ch][-1][-1] < min_gap:
+                ends[ch][-1][-1] = last[0]
+                first, last = first[1:], last[1:]
+            if len(first):
+                starts[ch].append(first)
+                ends[ch].append(last)
+    return [(np.concatenate(s) if s else np.zeros(0, dtype=np.int64),
+             np.concatenate(e) if e else np.zeros(0, dtype=np.int64))
+            for s, e in zip(starts, ends)]
+
+def load_activity(filename, min_gap=ACTIVITY_GAP):
+    """
+    Activity index of a capture, from its <capture>.activity.npz sidecar when
+    that is newer than the capture and was built with the same min_gap;
+    otherwise computed and saved there.
+    """
+    samples, _ = open_capture(filename)
+    cache = f"{filename}.activity.npz"
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(filename):
+        with np.load(cache) as data:
+            if int(data['frames']) == len(samples) and int(data['min_gap']) == min_gap:
+                return [(data[f'starts{ch}'], data[f'ends{ch}']) for ch in range(samples.shape[1])]
+
+    spans = activity_index(samples, min_gap)
+    arrays = {}
+    for ch, (starts, ends) in enumerate(spans):
+        arrays[f'starts{ch}'] = starts
+        arrays[f'ends{ch}'] = ends
+    try:
+        with open(cache, 'wb') as f:
+            np.savez(f, frames=len(samples), min_gap=min_gap, **arrays)
+    except OSError:
+        pass  # read-only capture directory: just don't cache
+    return spans
+
+def union_spans(*indexes):
+    """Merge any number of activity indexes (all channels) into one sorted (starts, ends) pair."""
+    pairs = [pair for index in indexes for pair in index]
+    starts = np.concatenate([s for s, _ in pairs] + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+    ends = np.concatenate([e for _, e in pairs] + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    # A new span begins wherever it starts after everything before it ended
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = starts[1:] > ends[:-1]
+    first = np.flatnonzero(new)
+    return starts[first], ends[np.append(first[1:], len(starts)) - 1]
+
+def span_chunks(spans, block_frames=BLOCK_FRAMES, stop=None):
+    """
+    Yield (start, end) pieces of the spans, split at multiples of
+    block_frames so no piece straddles two aligned blocks, clipped to stop.
+    """
+    for start, end in zip(*(a.tolist() for a in spans)):
+        if stop is not None:
+            end = min(end, stop)
+        while start < end:
+            piece_end = min(end, (start // block_frames + 1) * block_frames)
+            yield start, piece_end
+            start = piece_end
+
+def active_blocks(samples, spans, block_frames=BLOCK_FRAMES, stop=None):
+    """Like iter_blocks(), but only yielding the parts of samples covered by spans."""
+    if stop is None or stop > len(samples):
+        stop = len(samples)
+    for start, end in span_chunks(spans, block_frames, stop):
+        yield start, samples[start:end]
+
+def envelope(samples, hop, block_frames=BLOCK_FRAMES):
+    """
+    Decimated amplitude envelope: mean absolute value per channel over
+    consecutive runs of `hop` frames. Returns float32 array (frames // hop, channels).
+    """
+    num_points = len(samples) // hop
+    env = np.empty((num_points, samples.shape[1]), dtype=np.float32)
+
+    # Keep blocks a multiple of hop so no run straddles two blocks
+    block_frames = max(hop, block_frames - block_frames % hop)
+    for offset, block in iter_blocks(samples, block_frames, stop=num_points * hop):
+        block = np.abs(block.astype(np.float32))
+        points = block.reshape(-1, hop, block.shape[1]).mean(axis=1)
+        env[offset // hop:offset // hop + len(points)] = points
+
+    return env
+
+def stereo_matrix(separation=1.0, channels=CHANNELS):
+    """(channels, 2) mixing matrix for Amiga panning at the given separation (0..1)."""
+    own = (1.0 + separation) / 2.0
+    other = (1.0 - separation) / 2.0
+    matrix = np.zeros((channels, 2), dtype=np.float32)
+    for ch in LEFT_CHANNELS:
+        matrix[ch] = (own, other)
+    for ch in RIGHT_CHANNELS:
+        matrix[ch] = (other, own)
+    return matrix
+
+class PolyphaseResampler:
+    """
+    Streaming rational-ratio resampler (Kaiser-windowed sinc, polyphase).
+
+    Output frame n sits at input time n * src_rate / dst_rate, so the
+    output isn't delayed. Feed blocks of any size to process(); it returns
+    every output frame whose filter taps are already available and keeps
+    only the last few input frames between calls. flush() returns the rest.
+    """
+
+    OUTPUT_CHUNK = 1 << 14
+
+    def __init__(self, src_rate, dst_rate, channels, half_taps=16, beta=8.0):
+        g = math.gcd(int(src_rate), int(dst_rate))
+        self.up = int(dst_rate) // g
+        self.down = int(src_rate) // g
+        cutoff = min(1.0, self.up / self.down)
+        # Widen the kernel when decimating so the transition band stays as steep
+        self.half = int(math.ceil(half_taps / cutoff))
+        taps = 2 * self.half
+
+        x = (self.half - 1 - np.arange(taps))[np.newaxis, :] + np.arange(self.up)[:, np.newaxis] / self.up
+        window = np.i0(beta * np.sqrt(np.clip(1.0 - (x / self.half) ** 2, 0.0, 1.0))) / np.i0(beta)
+        coeffs = cutoff * np.sinc(cutoff * x) * window
+        self.coeffs = coeffs / coeffs.sum(axis=1, keepdims=True)
+
+        self.channels = channels
+        # Input history starts with `half` frames of silence before frame 0
+        self.buffer = np.zeros((self.half, channels))
+        self.buffer_start = -self.half
+        self.next_out = 0
+        self.total_in = 0
+
+    def _emit(self, last_out):
+        """Compute output frames next_out..last_out from the buffered input."""
+        chunks = []
+        taps = np.arange(2 * self.half)
+        for first in range(self.next_out, last_out + 1, self.OUTPUT_CHUNK):
+            n = np.arange(first, min(first + self.OUTPUT_CHUNK, last_out + 1))
+            pos = n * self.down
+            base = pos // self.up - self.half + 1 - self.buffer_start
+            frames = self.buffer[base[:, np.newaxis] + taps]
+            chunks.append(np.einsum('nk,nkc->nc', self.coeffs[pos % self.up], frames))
+        self.next_out = max(self.next_out, last_out + 1)
+
+        keep = (self.next_out * self.down) // self.up - self.half + 1 - self.buffer_start
+        if keep > 0:
+            self.buffer = self.buffer[keep:]
+            self.buffer_start += keep
+        if not chunks:
+            return np.zeros((0, self.channels))
+        return np.concatenate(chunks)
+
+    def process(self, block):
+        """Feed input frames (frames, channels); returns float64 output frames."""
+        self.buffer = np.concatenate((self.buffer, np.asarray(block, dtype=np.float64)))
+        self.total_in += len(block)
+        available = self.buffer_start + len(self.buffer)
+        last_out = ((available - self.half) * self.up - 1) // self.down
+        return self._emit(last_out)
+
+    def flush(self):
+        """Output frames that depend on input beyond the end (zero-padded)."""
+        self.buffer = np.concatenate((self.buffer, np.zeros((self.half, self.channels))))
+        last_out = -(-self.total_in * self.up // self.down) - 1
+        return self._emit(last_out)
+
+def resampled_blocks(samples, sample_rate, rate, block_frames=BLOCK_FRAMES, matrix=None):
+    """
+    Yield float64 blocks of `samples` at `rate`, optionally mixed through a
+    (channels, out_channels) matrix first. Without a rate change the blocks
+    come straight from the memory map.
+    """
+    channels = samples.shape[1] if matrix is None else matrix.shape[1]
+    resampler = None if rate == sample_rate else PolyphaseResampler(sample_rate, rate, channels)
+    for _, block in iter_blocks(samples, block_frames):
+        block = np.asarray(block, dtype=np.float64)
+        if matrix is not None:
+            block = block @ matrix
+        yield block if resampler is None else resampler.process(block)
+    if resampler is not None:
+        yield resampler.flush()
+
+def rechunk(stream, block_frames):
+    """Regroup a stream of blocks into blocks of exactly block_frames (last may be short)."""
+    pending = []
+    size = 0
+    for block in stream:
+        pending.append(block)
+        size += len(block)
+        while size >= block_frames:
+            joined = np.concatenate(pending)
+            yield joined[:block_frames]
+            pending = [joined[block_frames:]]
+            size = len(pending[0])
+    if size:
+        yield np.concatenate(pending)
+
+def common_layout(channels1, channels2):
+    """Mixing matrices (or None) that bring two channel counts to a common layout."""
+    if channels1 == channels2:
+        return None, None
+    if (channels1, channels2) == (CHANNELS, 2):
+        return stereo_matrix(1.0, CHANNELS), None
+    if (channels1, channels2) == (2, CHANNELS):
+        return None, stereo_matrix(1.0, CHANNELS)
+    raise ValueError(f"can't compare {channels1}-channel and {channels2}-channel captures")
+
+def resampled_length(num_frames, sample_rate, rate):
+    """Frames a capture of num_frames at sample_rate has after resampling to rate."""
+    return -(-num_frames * rate // sample_rate)
+
+def paired_blocks(samples1, rate1, samples2, rate2, rate=None, block_frames=BLOCK_FRAMES, spans=None):
+    """
+    Stream two captures side by side at a common rate (default: the lower
+    of the two) and channel layout (4 channels are mixed to Amiga stereo when
+    the other capture is stereo). Yields (offset, block1, block2) with
+    equal-length float64 blocks of block_frames until the shorter one ends.
+
+    With spans (the union of both activity indexes) and no resampling, only
+    the active parts are yielded, split at multiples of block_frames;
+    everything skipped is silent in both captures.
+    """
+    if rate is None:
+        rate = min(rate1, rate2)
+    matrix1, matrix2 = common_layout(samples1.shape[1], samples2.shape[1])
+
+    if spans is not None and rate1 == rate2 == rate:
+        stop = min(len(samples1), len(samples2))
+        for start, end in span_chunks(spans, block_frames, stop):
+            block1 = np.asarray(samples1[start:end], dtype=np.float64)
+            block2 = np.asarray(samples2[start:end], dtype=np.float64)
+            yield (start, block1 if matrix1 is None else block1 @ matrix1,
+                   block2 if matrix2 is None else block2 @ matrix2)
+        return
+
+    stream1 = rechunk(resampled_blocks(samples1, rate1, rate, block_frames, matrix1), block_frames)
+    stream2 = rechunk(resampled_blocks(samples2, rate2, rate, block_frames, matrix2), block_frames)
+
+    offset = 0
+    for block1, block2 in zip(stream1, stream2):
+        n = min(len(block1), len(block2))
+        if n == 0:
+            break
+        yield offset, block1[:n], block2[:n]
+        offset += n
+
+def samples_to_time(sample_idx, sample_rate=SAMPLE_RATE):
+    """Convert sample index to time string."""
+    seconds = sample_idx / sample_rate
+    minutes = int(seconds // 60)
+    secs = seconds % 60
+    return f"{minutes}m {secs:.3f}s"
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Incremental analysis pipeline for the replayer captures.
+
+Models the analysis chain as a DAG of stages:
+
+  capture -> trim -> index -> align -> stats -> diffs -> report
+
+capture/trim/index run once per capture, align/stats/diffs once per pair of
+captures, and report once over everything. Each stage has a key built from
+the content hashes of its input files, the source of the tools it runs and
+its parameters. A stage only re-runs when that key changes or an output is
+missing, and since the key hashes *contents*, a re-run that produces
+identical output stops the change from propagating further. Independent
+stages run in parallel worker processes.
+
+Adding one new take therefore only runs its own trim/index plus the pairs it
+takes part in; changing one replayer only redoes that replayer's pairs.
+
+State (file hash cache and stage keys) is kept in pipeline_out/state.json;
+only the pipeline writes it. Other tools that hash captures (paula.py
+compare, results_db.py, paula_daemon.py, fingerprint.py) use file_hashes(),
+which keeps its own cache in pipeline_out/hashes.json.
+Per-stage output goes to pipeline_out/logs/<stage>.log.
+
+Usage: ./pipeline.py                        # all captures found on disk
+       ./pipeline.py -j 8 --dry-run
+       ./pipeline.py --capture PT2.3F=pt23f_channels_raw.pcm --capture X=x.pcm
+       ./pipeline.py --record               # also re-record when a harness changed
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+from replayers import load_replayers
+
+OUTPUT_DIR = Path('pipeline_out')
+STATE_FILE = OUTPUT_DIR / 'state.json'
+HASH_CACHE_FILE = OUTPUT_DIR / 'hashes.json'
+HASH_LOCK_FILE = OUTPUT_DIR / 'hashes.lock'
+
+# Registered replayers (replayers.json): capture file, harness and record script
+REPLAYERS = load_replayers()
+
+# Source files each stage's tool version is derived from. The run_* actions
+# below are part of it too, except run_capture, which only starts the record
+# script (hashed as a stage input).
+TOOLS = {
+    'capture': ['record_raw_channels.fs-uae'],
+    'trim': ['pipeline.py', 'strip_leading_silence.py', 'planar_pcm.py'],
+    'index': ['pipeline.py', 'analyze_pitch.py', 'modfile.py', 'paula_pcm.py', 'planar_pcm.py',
+              'analyze_recordings.py'],
+    'align': ['pipeline.py', 'analyze_drift.py', 'paula_pcm.py', 'planar_pcm.py'],
+    'stats': ['pipeline.py', 'analyze_recordings.py', 'paula_pcm.py', 'planar_pcm.py'],
+    'diffs': ['pipeline.py', 'generate_channel_diffs.py', 'paula_pcm.py', 'planar_pcm.py'],
+    'report': ['pipeline.py'],
+}
+
+# ----------------------------------------------------------------------------
+# Stage actions (run in worker processes)
+# ----------------------------------------------------------------------------
+
+def run_capture(inputs, outputs, params):
+    """Record a replayer with its record_*.sh script (writes a trimmed capture)."""
+    subprocess.run([params['script']], check=True)
+
+def run_trim(inputs, outputs, params):
+    """Strip leading silence into the pipeline's copy of the capture."""
+    from strip_leading_silence import strip_leading_silence
+    strip_leading_silence(inputs[0], outputs[0], params.get('threshold', 0))
+    if not Path(outputs[0]).exists():
+        # All-silent capture: keep an empty file so downstream stages see it
+        Path(outputs[0]).write_bytes(b'')
+
+def run_index(inputs, outputs, params):
+    """Per-capture indexes: envelope, period table and basic statistics."""
+    import numpy as np
+    from paula_pcm import open_capture, envelope
+    from analyze_pitch import estimate_periods
+    from analyze_recordings import calculate_rms, calculate_max_amplitude
+
+    samples, sample_rate = open_capture(inputs[0])
+    np.save(outputs[0], envelope(samples, params['hop']))
+    periods, _ = estimate_periods(inputs[0], mod_file=params['mod'], bpm=params['bpm'])
+    np.save(outputs[1], periods)
+
+    stats = {
+        'frames': len(samples),
+        'duration': len(samples) / sample_rate,
+        'rms': [float(v) for v in calculate_rms(samples)] if len(samples) else [0.0] * 4,
+        'max_amp': [int(v) for v in calculate_max_amplitude(samples)] if len(samples) else [0] * 4,
+    }
+    with open(outputs[2], 'w') as f:
+        json.dump(stats, f, indent=2)
+
+def run_align(inputs, outputs, params):
+    """Drift / lag-vs-time analysis of a pair."""
+    from analyze_drift import analyze_drift, save_csv, print_report
+    result = analyze_drift(inputs[0], inputs[1])
+    print_report(params['name1'], params['name2'], result)
+    save_csv(outputs[0], result)
+    summary = {track: {'ppm': info['ppm'], 'offset_frames': info['offset']}
+               for track, info in result['tracks'].items()}
+    with open(outputs[1], 'w') as f:
+        json.dump(summary, f, indent=2)
+
+def run_stats(inputs, outputs, params):
+    """Pairwise correlation and difference statistics (analyze_recordings)."""
+    import numpy as np
+    from paula_pcm import open_capture, load_activity, union_spans
+    from analyze_recordings import (compare_captures, correlation_matrix, total_sums,
+                                    flattened_correlation, best_permutations, remapped_correlation)
+
+    samples1, rate1 = open_capture(inputs[0])
+    samples2, rate2 = open_capture(inputs[1])
+    spans = union_spans(load_activity(inputs[0]), load_activity(inputs[1]))
+
+    sums, analysis = compare_captures(samples1, rate1, samples2, rate2, spans=spans)
+    matrix = correlation_matrix(total_sums(sums))[0]
+    window_perms, _ = best_permutations(correlation_matrix(sums), margin=0.1)
+
+    divergence = analysis['first_divergence']
+    result = {
+        'frames': analysis['frames'],
+        'active_frames': analysis['active_frames'],
+        'correlation': float(flattened_correlation(sums)),
+        'per_channel_correlation': [float(c) for c in np.diagonal(matrix)],
+        'cross_channel_correlation': matrix.tolist(),
+        'remapped_correlation': [float(c) for c in remapped_correlation(sums, window_perms)],
+        'first_divergence': None if divergence is None else int(divergence),
+        'mean': float(analysis['mean']),
+        'median': float(analysis['median']),
+        'std': float(analysis['std']),
+        'max': float(analysis['max']),
+        'pct_significant': float(analysis['pct_significant']),
+        'per_channel': [{k: float(v) for k, v in ch.items()} for ch in analysis['per_channel']],
+    }
+    with open(outputs[0], 'w') as f:
+        json.dump(result, f, indent=2)
+
+def run_diffs(inputs, outputs, params):
+    """4-channel difference file plus its per-channel statistics."""
+    from generate_channel_diffs import generate_diffs
+    stats = generate_diffs(params['name1'], inputs[0], params['name2'], inputs[1],
+                           diff_filename=outputs[0])
+    with open(outputs[1], 'w') as f:
+        json.dump([{k: float(v) for k, v in ch.items()} for ch in stats], f, indent=2)
+
+def run_report(inputs, outputs, params):
+    """Markdown summary table over all capture and pair results."""
+    lines = ['# Replayer Comparison Report', '']
+    lines.append('| Capture | Frames | Duration | Ch0 RMS | Ch1 RMS | Ch2 RMS | Ch3 RMS |')
+    lines.append('|---------|--------|----------|---------|---------|---------|---------|')
+    for name, path in params['captures']:
+        with open(path) as f:
+            s = json.load(f)
+        rms = ' | '.join(f'{v:.2f}' for v in s['rms'])
+        lines.append(f"| {name} | {s['frames']:,} | {s['duration']:.2f}s | {rms} |")
+
+    lines += ['', '| Pair | Correlation | Ch0 | Ch1 | Ch2 | Ch3 | Drift (mix) |',
+              '|------|-------------|-----|-----|-----|-----|-------------|']
+    for name, stats_path, align_path in params['pairs']:
+        with open(stats_path) as f:
+            s = json.load(f)
+        with open(align_path) as f:
+            a = json.load(f)
+        per_ch = ' | '.join(f'{c:.3f}' for c in s['per_channel_correlation'])
+        ppm = a['Mix']['ppm']
+        drift = 'n/a' if ppm is None else f'{ppm:+.1f} ppm'
+        lines.append(f"| {name} | {s['correlation']:.3f} | {per_ch} | {drift} |")
+
+    with open(outputs[0], 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+ACTIONS = {
+    'capture': run_capture,
+    'trim': run_trim,
+    'index': run_index,
+    'align': run_align,
+    'stats': run_stats,
+    'diffs': run_diffs,
+    'report': run_report,
+}
+
+def execute(kind, inputs, outputs, params, log_file):
+    """Worker entry point: run one stage with its output redirected to a log."""
+    for out in outputs:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+    with open(log_file, 'w') as log, contextlib.redirect_stdout(log):
+        ACTIONS[kind](inputs, outputs, params)
+
+# ----------------------------------------------------------------------------
+# Graph construction
+# ----------------------------------------------------------------------------
+
+class Stage:
+    """One node of the pipeline DAG."""
+
+    def __init__(self, kind, name, inputs, outputs, params=None):
+        self.kind = kind
+        self.name = name
+        self.id = f"{kind}:{name}"
+        self.inputs = [str(p) for p in inputs]
+        self.outputs = [str(p) for p in outputs]
+        self.params = params or {}
+        self.deps = set()
+
+def slug(name):
+    """File-system friendly name for a capture."""
+    return re.sub(r'[^a-z0-9.]+', '_', name.lower()).strip('_')
+
+def discover_captures():
+    """Registry captures present on disk plus any extra takes (<stem>_take*.pcm)."""
+    captures = []
+    for name, info in REPLAYERS.items():
+        capture = Path(info['capture'])
+        if capture.exists():
+            captures.append((name, str(capture), name))
+        for take in sorted(Path('.').glob(f"{capture.stem}_take*.pcm")):
+            label = take.stem[len(capture.stem) + 1:]
+            captures.append((f"{name} {label}", str(take), name))
+    return captures
+
+def build_graph(captures, record=False, mod='the_loop.mod', bpm=None, hop=96):
+    """Create the stages for the given (name, file, replayer) captures."""
+    stages = []
+    trimmed = {}
+    stats_files = []
+
+    for name, filename, replayer in captures:
+        base = OUTPUT_DIR / 'captures' / slug(name)
+
+        if record and replayer in REPLAYERS:
+            info = REPLAYERS[replayer]
+            stages.append(Stage('capture', slug(name),
+                                [info['harness'], 'record_raw_channels.fs-uae', info['script']],
+                                [filename], {'script': info['script']}))
+
+        trim = Stage('trim', slug(name), [filename], [base / 'trimmed.pcm'])
+        # Period tables are cut at the module's ticks unless a fixed tempo is given
+        tick_mod = None if bpm else mod
+        index = Stage('index', slug(name), trim.outputs + ([tick_mod] if tick_mod else []),
+                      [base / 'envelope.npy', base / 'periods.npy', base / 'stats.json'],
+                      {'mod': tick_mod, 'bpm': bpm, 'hop': hop})
+        stages += [trim, index]
+        trimmed[name] = trim.outputs[0]
+        stats_files.append((name, index.outputs[2]))
+
+    pair_results = []
+    names = [c[0] for c in captures]
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            name1, name2 = names[i], names[j]
+            pair = f"{slug(name1)}_vs_{slug(name2)}"
+            base = OUTPUT_DIR / 'pairs' / pair
+            inputs = [trimmed[name1], trimmed[name2]]
+            params = {'name1': name1, 'name2': name2}
+
+            align = Stage('align', pair, inputs, [base / 'drift.csv', base / 'drift.json'], params)
+            stats = Stage('stats', pair, inputs, [base / 'stats.json'], params)
+            diffs = Stage('diffs', pair, inputs, [base / 'diff.pcm', base / 'diff_stats.json'], params)
+            stages += [align, stats, diffs]
+            pair_results.append((f"{name1} vs {name2}", stats.outputs[0], align.outputs[1]))
+
+    report_inputs = [p for _, p in stats_files]
+    for _, stats_path, align_path in pair_results:
+        report_inputs += [stats_path, align_path]
+    stages.append(Stage('report', 'all', report_inputs, [OUTPUT_DIR / 'report.md'],
+                        {'captures': stats_files, 'pairs': pair_results}))
+
+    producers = {out: stage for stage in stages for out in stage.outputs}
+    for stage in stages:
+        stage.deps = {producers[p].id for p in stage.inputs if p in producers}
+    return stages
+
+# ----------------------------------------------------------------------------
+# Hashing and scheduling
+# ----------------------------------------------------------------------------
+
+class HashCache:
+    """Content hashes of files, cached on (size, mtime) between runs."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def file_hash(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self.entries.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 22), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.entries[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+def tool_version():
+    """Interpreter and NumPy version, part of every stage key."""
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return f"python-{sys.version.split()[0]} numpy-{numpy_version}"
+
+def stage_key(stage, hashes, version):
+    """Hash of everything that determines a stage's outputs."""
+    h = hashlib.sha256()
+    h.update(stage.id.encode())
+    h.update(version.encode())
+    h.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+    for path in stage.inputs + TOOLS[stage.kind]:
+        h.update(path.encode())
+        h.update(str(hashes.file_hash(path)).encode())
+    return h.hexdigest()
+
+def load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {'files': {}, 'stages': {}}
+
+def write_json(path, data):
+    """Replace a JSON file atomically, through a temporary file of this process and thread."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    tmp.replace(path)
+
+def save_state(state):
+    write_json(STATE_FILE, state)
+
+def read_hash_cache(path):
+    """Hash cache entries stored in a JSON file ({} if missing or unreadable)."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get('files', {}) if path == STATE_FILE else data
+
+def file_hashes(paths):
+    """
+    Content hashes {path: hash} for the tools outside the pipeline. Reads the
+    pipeline's cache but only ever writes HASH_CACHE_FILE, merging new
+    entries into its current contents under an exclusive lock on
+    HASH_LOCK_FILE, so tools running next to the pipeline (or each other,
+    e.g. the daemon's watcher during `make check`) neither clobber its stage
+    keys nor lose hashes.
+    """
+    entries = {**read_hash_cache(STATE_FILE), **read_hash_cache(HASH_CACHE_FILE)}
+    cache = HashCache(dict(entries))
+    hashes = {str(path): cache.file_hash(str(path)) for path in paths}
+    new = {path: entry for path, entry in cache.entries.items() if entries.get(path) != entry}
+    if new:
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(HASH_LOCK_FILE, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            write_json(HASH_CACHE_FILE, {**read_hash_cache(HASH_CACHE_FILE), **new})
+    return hashes
+
+def run_pipeline(stages, jobs=None, force=(), dry_run=False):
+    """Run out-of-date stages in dependency order, independent ones in parallel."""
+    # Imported here so file_hashes() can be used (paula.py compare) without it
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    state = load_state()
+    hashes = HashCache(state['files'])
+    version = tool_version()
+    (OUTPUT_DIR / 'logs').mkdir(parents=True, exist_ok=True)
+
+    by_id = {s.id: s for s in stages}
+    pending = dict(by_id)
+    done = set()
+    failed = set()
+    ran = skipped = 0
+    running = {}
+    would_run = set()
+
+    def is_forced(stage):
+        return any(stage.id == f or stage.kind == f for f in force)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # Schedule every stage whose dependencies have finished
+            for sid in list(pending):
+                stage = pending[sid]
+                if stage.deps & failed:
+                    failed.add(sid)
+                    del pending[sid]
+                    print(f"  skip   {sid} (upstream failed)")
+                    continue
+                if not stage.deps <= done:
+                    continue
+                del pending[sid]
+
+                if dry_run and stage.deps & would_run:
+                    # Outputs aren't produced, so everything downstream would run too
+                    print(f"  would run {sid}")
+                    would_run.add(sid)
+                    done.add(sid)
+                    ran += 1
+                    continue
+
+                missing = [p for p in stage.inputs if not Path(p).exists()]
+                if missing:
+                    failed.add(sid)
+                    print(f"  error  {sid}: missing input {missing[0]}")
+                    continue
+
+                key = stage_key(stage, hashes, version)
+                fresh = (state['stages'].get(sid) == key and
+                         all(Path(p).exists() for p in stage.outputs))
+                if fresh and not is_forced(stage):
+                    done.add(sid)
+                    skipped += 1
+                    continue
+
+                if dry_run:
+                    print(f"  would run {sid}")
+                    would_run.add(sid)
+                    done.add(sid)
+                    ran += 1
+                    continue
+
+                print(f"  run    {sid}")
+                log_file = OUTPUT_DIR / 'logs' / f"{sid.replace(':', '_')}.log"
+                future = pool.submit(execute, stage.kind, stage.inputs, stage.outputs,
+                                     stage.params, str(log_file))
+                running[future] = (stage, key)
+
+            if not running:
+                # Stages just found fresh (or failed) may unblock others
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    failed.add(stage.id)
+                    state['stages'].pop(stage.id, None)
+                    print(f"  FAILED {stage.id}: {e}")
+                    continue
+                # Outputs are now stale in the hash cache; rehash on next use
+                for out in stage.outputs:
+                    state['files'].pop(out, None)
+                state['stages'][stage.id] = key
+                done.add(stage.id)
+                ran += 1
+                save_state(state)
+
+    if not dry_run:
+        save_state(state)
+    return ran, skipped, failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental replayer analysis pipeline.')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='parallel worker processes (default: CPU count)')
+    parser.add_argument('--capture', action='append', default=[], metavar='NAME=FILE',
+                        help='analyze these captures instead of the ones found on disk')
+    parser.add_argument('--record', action='store_true',
+                        help='include capture stages (re-record when a harness changes)')
+    parser.add_argument('--force', action='append', default=[], metavar='STAGE',
+                        help='re-run a stage kind (e.g. stats) or stage id (e.g. trim:pt2.3f)')
+    parser.add_argument('--dry-run', action='store_true', help='only list stages that would run')
+    parser.add_argument('--mod', default='the_loop.mod',
+                        help='module whose ticks cut the per-tick indexes (default the_loop.mod)')
+    parser.add_argument('--bpm', type=float, help='fixed tempo for per-tick indexes instead of the module')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Replayer Analysis Pipeline")
+    print("=" * 80)
+    print()
+
+    if args.capture:
+        captures = []
+        for spec in args.capture:
+            name, _, filename = spec.partition('=')
+            if not filename:
+                parser.error(f'--capture expects NAME=FILE, got {spec!r}')
+            captures.append((name, filename, name))
+    else:
+        captures = discover_captures()
+
+    if not captures:
+        print("Error: no captures found!")
+        return 1
+
+    for name, filename, _ in captures:
+        print(f"  {name:20s} {filename}")
+    print()
+
+    stages = build_graph(captures, record=args.record, mod=args.mod, bpm=args.bpm)
+    ran, skipped, failed = run_pipeline(stages, jobs=args.jobs, force=args.force,
+                                        dry_run=args.dry_run)
+
+    print()
+    print(f"{len(stages)} stages: {ran} run, {skipped} up to date, {len(failed)} failed")
+    if not failed and not args.dry_run:
+        print(f"Report: {OUTPUT_DIR / 'report.md'}")
+    print()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Channel-planar capture layout and the converter to and from it.
+
+FS-UAE writes captures interleaved, (frames, 4) int16, so every
+per-channel operation strides through memory 8 bytes at a time and uses a
+quarter of each cache line it loads. A planar capture holds each channel
+as one contiguous int16 array instead, after a small header:
+
+  offset  size  field
+       0     8  magic b'PAULAPLN'
+       8     2  version (1)
+      10     2  channels
+      12     4  sample rate
+      16     8  frames
+      24    40  reserved (zero), data starts at 64 (a cache line)
+      64        channel 0 (frames * int16 LE), channel 1, ...
+
+open_pcm() / open_capture() in paula_pcm.py recognise the header and
+return the same (frames, channels) array either way (a transposed view of
+the (channels, frames) map), so every tool accepts both layouts and
+samples[:, ch] becomes a contiguous scan.
+
+Only raw captures are converted (interleaved ones may carry a
+<capture>.json sidecar); WAVs are rejected. Conversion streams the capture
+in blocks, so it never holds more than a block of either file. --in-place
+replaces the capture itself (written to a temporary file first), so
+registry paths keep working.
+
+The header helpers, and capture_format() for every capture format (planar
+or WAV header, <capture>.json sidecar of a raw capture, else 96kHz quad),
+only need the standard library, for the stdlib tools
+(analyze_recordings_stdlib.py, strip_leading_silence.py, paula.py compare).
+paula_pcm.py re-exports them.
+
+Usage: ./planar_pcm.py pt23f_channels_raw.pcm               # -> pt23f_channels_raw_planar.pcm
+       ./planar_pcm.py *_channels_raw.pcm --in-place
+       ./planar_pcm.py capture_planar.pcm --interleaved -o capture.pcm
+
+Requirements:
+  - NumPy (install in venv) for conversion
+"""
+
+import argparse
+import array
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+
+MAGIC = b'PAULAPLN'
+VERSION = 1
+HEADER = struct.Struct('<8sHHLQ')
+HEADER_SIZE = 64
+
+# Raw captures without a header or sidecar: FS-UAE's 96kHz 4-channel output
+SAMPLE_RATE = 96000
+CHANNELS = 4
+
+def read_header(filename):
+    """(sample_rate, channels, frames) of a planar capture, None for any other file."""
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        return None
+    _, version, channels, sample_rate, frames = HEADER.unpack(header)
+    if version != VERSION:
+        raise ValueError(f"{filename}: planar capture version {version} not supported")
+    return sample_rate, channels, frames
+
+def pack_header(sample_rate, channels, frames):
+    """The HEADER_SIZE bytes in front of a planar capture."""
+    return HEADER.pack(MAGIC, VERSION, channels, sample_rate, frames).ljust(HEADER_SIZE, b'\0')
+
+def capture_format(filename):
+    """
+    (sample_rate, channels, data_offset) of a capture: from the planar or
+    WAV header, else from a <capture>.json sidecar, else the 96kHz 4-channel
+    default.
+    """
+    planar = read_header(filename)
+    if planar is not None:
+        return planar[0], planar[1], HEADER_SIZE
+    with open(filename, 'rb') as f:
+        header = f.read(12)
+        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    raise ValueError(f"{filename}: WAV file has no data chunk")
+                chunk_id, size = struct.unpack('<4sL', chunk)
+                if chunk_id == b'fmt ':
+                    fmt = struct.unpack('<HHLLHH', f.read(16))
+                    f.seek(size - 16 + (size & 1), 1)
+                elif chunk_id == b'data':
+                    if fmt is None or fmt[5] != 16:
+                        raise ValueError(f"{filename}: only 16-bit PCM WAV is supported")
+                    return fmt[2], fmt[1], f.tell()
+                else:
+                    f.seek(size + (size & 1), 1)
+
+    sidecar = f"{filename}.json"
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            info = json.load(f)
+        return int(info.get('sample_rate', SAMPLE_RATE)), int(info.get('channels', CHANNELS)), 0
+    return SAMPLE_RATE, CHANNELS, 0
+
+def write_capture_format(filename, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    """Record the format of a raw capture in its <capture>.json sidecar."""
+    with open(f"{filename}.json", 'w') as f:
+        json.dump({'sample_rate': sample_rate, 'channels': channels}, f, indent=2)
+        f.write('\n')
+
+def read_planes(filename):
+    """(sample_rate, [array('h') per channel]) of a planar capture, stdlib only."""
+    sample_rate, channels, frames = read_header(filename)
+    planes = []
+    with open(filename, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        for _ in range(channels):
+            plane = array.array('h')
+            plane.frombytes(f.read(frames * 2))
+            planes.append(plane)
+    return sample_rate, planes
+
+def convert(filename, output, planar=True):
+    """Write capture `filename` to `output` in the planar (or interleaved) layout, block by block."""
+    # NumPy only for conversion, so the header helpers stay stdlib-only
+    import numpy as np
+    from paula_pcm import BLOCK_FRAMES, open_capture, iter_blocks
+
+    samples, sample_rate = open_capture(filename)
+    frames, channels = samples.shape
+    if planar:
+        with open(output, 'wb') as f:
+            f.write(pack_header(sample_rate, channels, frames))
+            f.truncate(HEADER_SIZE + frames * channels * 2)
+        if frames:
+            planes = np.memmap(output, dtype='<i2', mode='r+', offset=HEADER_SIZE, shape=(channels, frames))
+            for offset, block in iter_blocks(samples, BLOCK_FRAMES):
+                planes[:, offset:offset + len(block)] = block.T
+            planes.flush()
+            del planes
+    else:
+        with open(output, 'wb') as f:
+            for _, block in iter_blocks(samples, BLOCK_FRAMES):
+                f.write(np.ascontiguousarray(block, dtype='<i2').tobytes())
+    return frames, channels, sample_rate
+
+def output_name(filename, planar):
+    """Default output: <stem>_planar.pcm, or <stem>_interleaved.pcm going back."""
+    path = Path(filename)
+    stem = path.stem.replace('_planar', '')
+    return str(path.with_name(f"{stem}_{'planar' if planar else 'interleaved'}.pcm"))
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert captures to the channel-planar layout (or back).')
+    parser.add_argument('files', nargs='+', help='raw captures, interleaved (with an optional sidecar) or planar')
+    parser.add_argument('--interleaved', action='store_true', help='convert to interleaved raw PCM instead')
+    parser.add_argument('-o', '--output', help='output file (one input only)')
+    parser.add_argument('--in-place', action='store_true', help='replace each capture with the converted file')
+    args = parser.parse_args()
+
+    if args.output and (len(args.files) > 1 or args.in_place):
+        parser.error('-o takes a single input and excludes --in-place')
+    planar = not args.interleaved
+
+    print("=" * 80)
+    print(f"PAULA Capture Layout Conversion ({'planar' if planar else 'interleaved'})")
+    print("=" * 80)
+    print()
+
+    for filename in args.files:
+        if not Path(filename).exists():
+            print(f"Error: {filename} not found!")
+            return 1
+        # Only raw captures have a layout to convert; a WAV would pass as "interleaved"
+        if read_header(filename) is None and capture_format(filename)[2]:
+            print(f"Error: {filename} is not a raw capture (WAV?); convert raw PCM captures only!")
+            return 1
+        if (read_header(filename) is not None) == planar:
+            print(f"  {filename}: already {'planar' if planar else 'interleaved'}, skipped")
+            continue
+
+        if args.in_place:
+            output = f"{filename}.tmp"
+        else:
+            output = args.output or output_name(filename, planar)
+        frames, channels, sample_rate = convert(filename, output, planar)
+        if args.in_place:
+            os.replace(output, filename)
+            output = filename
+        # Interleaved raw files carry a non-default format in a sidecar
+        if not planar and (sample_rate, channels) != (SAMPLE_RATE, CHANNELS):
+            write_capture_format(output, sample_rate, channels)
+        print(f"  {filename} -> {output}: {frames:,} frames, {channels}ch @ {sample_rate}Hz")
+
+    print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
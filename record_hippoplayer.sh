@@ -17,11 +17,10 @@ mv hippoplayer_channels_trimmed.pcm hippoplayer_channels_raw.pcm
 echo ""
 echo "Test complete!"
 echo ""
-echo "To analyze the raw 4-channel PCM file, you can use ffmpeg to convert it:"
+echo "To listen to the raw 4-channel PCM file, export it to WAV:"
 echo ""
-echo "Example (96000Hz, 4 channels interleaved):"
-echo "  ffmpeg -f s16le -ar 96000 -ac 4 -i hippoplayer_channels_raw.pcm hippoplayer_channels_raw.wav"
+echo "  ./export_wav.py hippoplayer_channels_raw.pcm"
 echo ""
-echo "To extract individual channels:"
-echo "  ffmpeg -f s16le -ar 96000 -ac 4 -i hippoplayer_channels_raw.pcm -filter_complex \"channelsplit=channel_layout=quad[c0][c1][c2][c3]\" -map \"[c0]\" hippoplayer_ch0.wav -map \"[c1]\" hippoplayer_ch1.wav -map \"[c2]\" hippoplayer_ch2.wav -map \"[c3]\" hippoplayer_ch3.wav"
+echo "This writes hippoplayer_ch0.wav .. hippoplayer_ch3.wav, hippoplayer_channels_raw.wav (4 channels)"
+echo "and hippoplayer_stereo.wav (Amiga panning) in one pass."
 echo ""
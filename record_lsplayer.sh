@@ -17,11 +17,10 @@ mv lsplayer_channels_trimmed.pcm lsplayer_channels_raw.pcm
 echo ""
 echo "Test complete!"
 echo ""
-echo "To analyze the raw 4-channel PCM file, you can use ffmpeg to convert it:"
+echo "To listen to the raw 4-channel PCM file, export it to WAV:"
 echo ""
-echo "Example (96000Hz, 4 channels interleaved):"
-echo "  ffmpeg -f s16le -ar 96000 -ac 4 -i lsplayer_channels_raw.pcm lsplayer_channels_raw.wav"
+echo "  ./export_wav.py lsplayer_channels_raw.pcm"
 echo ""
-echo "To extract individual channels:"
-echo "  ffmpeg -f s16le -ar 96000 -ac 4 -i lsplayer_channels_raw.pcm -filter_complex \"channelsplit=channel_layout=quad[c0][c1][c2][c3]\" -map \"[c0]\" lsplayer_ch0.wav -map \"[c1]\" lsplayer_ch1.wav -map \"[c2]\" lsplayer_ch2.wav -map \"[c3]\" lsplayer_ch3.wav"
+echo "This writes lsplayer_ch0.wav .. lsplayer_ch3.wav, lsplayer_channels_raw.wav (4 channels)"
+echo "and lsplayer_stereo.wav (Amiga panning) in one pass."
 echo ""
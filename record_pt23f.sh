@@ -17,11 +17,10 @@ mv pt23f_channels_trimmed.pcm pt23f_channels_raw.pcm
 echo ""
 echo "Test complete!"
 echo ""
-echo "To analyze the raw 4-channel PCM file, you can use ffmpeg to convert it:"
+echo "To listen to the raw 4-channel PCM file, export it to WAV:"
 echo ""
-echo "Example (96000Hz, 4 channels interleaved):"
-echo "  ffmpeg -f s16le -ar 96000 -ac 4 -i pt23f_channels_raw.pcm pt23f_channels_raw.wav"
+echo "  ./export_wav.py pt23f_channels_raw.pcm"
 echo ""
-echo "To extract individual channels:"
-echo "  ffmpeg -f s16le -ar 96000 -ac 4 -i pt23f_channels_raw.pcm -filter_complex \"channelsplit=channel_layout=quad[c0][c1][c2][c3]\" -map \"[c0]\" pt23f_ch0.wav -map \"[c1]\" pt23f_ch1.wav -map \"[c2]\" pt23f_ch2.wav -map \"[c3]\" pt23f_ch3.wav"
+echo "This writes pt23f_ch0.wav .. pt23f_ch3.wav, pt23f_channels_raw.wav (4 channels)"
+echo "and pt23f_stereo.wav (Amiga panning) in one pass."
 echo ""
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Render a ProTracker module to an ideal 4-channel PAULA capture.
+
+The PT2.3F replayer port in modfile.py produces the PAULA register state of
+every channel at every tick. This tool plays those registers back the way
+PAULA does with uae_sound_interpol = none: each channel holds the current
+sample byte for period * 96000 / 3546895 frames, scaled by the volume, and
+reloads AUDxLC/AUDxLEN when a DMA block runs out.
+
+Consecutive ticks where a channel's period, volume and loop registers don't
+change and no DMA restart happens are merged into one segment and rendered
+with a single vectorized NumPy expression, so a whole song takes seconds.
+
+The output is the same headerless s16le, 4 channel, 96000Hz layout as the
+FS-UAE captures (channel value = sample byte * volume), so every analysis
+tool can compare a real capture against this reference.
+
+Not modelled: the ~7 scanline wait before DMA starts in mt_SetDMA (notes
+start exactly on the tick), the LED filter, and EFx.
+
+Usage: ./render_mod.py                         # the_loop.mod -> reference_channels_raw.pcm
+       ./render_mod.py song.mod [-o out.pcm] [--seconds 120]
+
+Requirements:
+  - NumPy (install in venv)
+"""
+
+import argparse
+import sys
+import numpy as np
+from pathlib import Path
+
+from modfile import PAULA_CLOCK_PAL, ModFile, play_mod
+from paula_pcm import SAMPLE_RATE, CHANNELS, samples_to_time
+
+def tick_boundaries(ticks, sample_rate=SAMPLE_RATE):
+    """Frame index of every tick start plus the end of the last tick (n + 1 values)."""
+    seconds = np.concatenate(([0.0], np.cumsum(ticks['seconds'])))
+    return np.rint(seconds * sample_rate).astype(np.int64)
+
+class PaulaChannel:
+    """DMA state of one audio channel between register updates."""
+
+    def __init__(self, data, sample_rate=SAMPLE_RATE, paula_clock=PAULA_CLOCK_PAL):
+        self.data = data
+        self.rate = paula_clock / sample_rate
+        self.active = False
+        self.block_start = 0     # address of the block being played
+        self.block_len = 0       # its length in bytes
+        self.pos = 0.0           # bytes played into that block
+
+    def trigger(self, start, length):
+        """DMA restart: latch a new block from the start."""
+        self.active = length > 0
+        self.block_start = start
+        self.block_len = length
+        self.pos = 0.0
+
+    def render(self, num_frames, period, volume, loop_start, loop_length):
+        """
+        Render num_frames of output with constant registers.
+        Returns int16 array; advances the DMA position.
+        """
+        if not self.active or num_frames == 0:
+            return np.zeros(num_frames, dtype=np.int16)
+
+        step = self.rate / period if period else 0.0
+        offsets = np.floor(self.pos + step * np.arange(num_frames)).astype(np.int64)
+
+        # Past the current block, PAULA keeps reloading the loop registers
+        over = offsets - self.block_len
+        loop_length = max(loop_length, 2)
+        addresses = np.where(over < 0, self.block_start + offsets,
+                             loop_start + np.maximum(over, 0) % loop_length)
+        addresses = np.clip(addresses, 0, len(self.data) - 1)
+        values = self.data[addresses].astype(np.int16) * np.int16(volume)
+
+        self.pos += step * num_frames
+        if self.pos >= self.block_len:
+            self.pos = (self.pos - self.block_len) % loop_length
+            self.block_start = loop_start
+            self.block_len = loop_length
+        return values
+
+def segments(channel, first, last):
+    """
+    Split ticks first..last-1 of one channel's register table into runs with
+    identical registers and no DMA restart after the run's first tick.
+    Yields (start_tick, end_tick).
+    """
+    regs = channel[first:last]
+    changed = np.ones(len(regs), dtype=bool)
+    changed[1:] = ((regs['period'][1:] != regs['period'][:-1]) |
+                   (regs['volume'][1:] != regs['volume'][:-1]) |
+                   (regs['loop_start'][1:] != regs['loop_start'][:-1]) |
+                   (regs['loop_length'][1:] != regs['loop_length'][:-1]) |
+                   regs['trigger'][1:])
+    starts = np.flatnonzero(changed) + first
+    ends = np.append(starts[1:], last)
+    return zip(starts.tolist(), ends.tolist())
+
+def render(mod, ticks, channels, output, sample_rate=SAMPLE_RATE):
+    """Render the register table into a raw PCM capture file. Returns frame count."""
+    bounds = tick_boundaries(ticks, sample_rate)
+    num_frames = int(bounds[-1])
+    out = np.memmap(output, dtype='<i2', mode='w+', shape=(max(num_frames, 1), CHANNELS))
+
+    for ch in range(CHANNELS):
+        paula = PaulaChannel(mod.data, sample_rate)
+        table = channels[:, ch]
+        for start, end in segments(table, 0, len(table)):
+            regs = table[start]
+            if regs['trigger']:
+                paula.trigger(int(regs['start']), int(regs['length']))
+            a, b = bounds[start], bounds[end]
+            out[a:b, ch] = paula.render(b - a, int(regs['period']), int(regs['volume']),
+                                        int(regs['loop_start']), int(regs['loop_length']))
+
+    out.flush()
+    del out
+    if num_frames == 0:
+        open(output, 'wb').close()
+    return num_frames
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a MOD to an ideal 4-channel PAULA capture.')
+    parser.add_argument('module', nargs='?', default='the_loop.mod', help='ProTracker module (default the_loop.mod)')
+    parser.add_argument('-o', '--output', default='reference_channels_raw.pcm',
+                        help='raw PCM output (default reference_channels_raw.pcm)')
+    parser.add_argument('--seconds', type=float,
+                        help='render this long, looping the song (default: one pass)')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("ProTracker Reference Render (PT2.3F replay, ideal PAULA)")
+    print("=" * 80)
+    print()
+
+    if not Path(args.module).exists():
+        print(f"Error: {args.module} not found!")
+        return 1
+
+    mod = ModFile(args.module)
+    ticks, channels = play_mod(mod, max_seconds=args.seconds, loop=args.seconds is not None)
+    print(f"  Module:   {args.module} ({mod.title or 'untitled'}, {mod.song_length} positions)")
+    print(f"  Ticks:    {len(ticks):,}")
+
+    num_frames = render(mod, ticks, channels, args.output)
+    size_mb = num_frames * CHANNELS * 2 / 1024 / 1024
+    print(f"  Rendered: {num_frames:,} frames ({samples_to_time(num_frames)}, {size_mb:.1f} MB) -> {args.output}")
+    print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""
+Replayer registry: which replayers are tested and where their captures live.
+
+The registry is replayers.json next to this file, one entry per replayer
+with its name, capture file, test harness, record script and golden
+fingerprint (fingerprint.py). Every tool that defaults to "the three
+captures" takes them from here, in registry order, and compares every pair
+in that order. Adding a replayer is one new entry in the JSON file.
+
+Stdlib only, so importing it costs nothing for the quick CLI commands.
+"""
+
+import itertools
+import json
+from pathlib import Path
+
+REGISTRY_FILE = Path(__file__).with_name('replayers.json')
+
+def load_replayers(filename=REGISTRY_FILE):
+    """Registry as an ordered {name: {'capture', 'harness', 'script', 'golden'}} dict."""
+    with open(filename) as f:
+        entries = json.load(f)['replayers']
+    return {entry['name']: {k: v for k, v in entry.items() if k != 'name'} for entry in entries}
+
+def capture_files(filename=REGISTRY_FILE):
+    """{name: capture file} for every registered replayer."""
+    return {name: info['capture'] for name, info in load_replayers(filename).items()}
+
+def replayer_pairs(names):
+    """Every pair of names, in registry order."""
+    return list(itertools.combinations(names, 2))
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Results history: every metric the analysis tools compute, in SQLite.
+
+analyze_recordings.py and analyze_determinism.py record each run into
+results.db (unless --no-db): the captures with their content hash and
+replayer build, per-channel capture statistics, pairwise and per-channel
+comparison metrics, the per-window correlation / max-difference maps with
+the song position and row of each window, and determinism verdicts.
+Queries only touch the database, never the captures.
+
+Tables (all keyed back to runs(id, created, tool, revision)):
+
+  captures          replayer, take, path, hash, build, frames, duration, ...
+  capture_channels  per-channel RMS and max amplitude
+  pairs             overall correlation and difference statistics
+  pair_channels     per-channel correlation, remapped correlation, diffs
+  pair_windows      per-window, per-channel correlation and max |diff|
+  determinism       per-run verdict over N takes
+  determinism_takes per-take deviation from the consensus
+
+'build' is the content hash of the replayer's test harness binary (from
+replayers.json), so metrics can be followed across replayer builds.
+
+Usage: ./results_db.py pairs PT2.3F LSPlayer --channel 1 --last 20
+       ./results_db.py windows --min-max-diff 1000 [--pair PT2.3F LSPlayer]
+       ./results_db.py captures [--replayer HippoPlayer]
+       ./results_db.py determinism [--replayer HippoPlayer]
+       ./results_db.py sql "SELECT ..."
+       ./paula.py query ...                  # same thing
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from replayers import load_replayers
+
+DB_FILE = 'results.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    tool TEXT NOT NULL,
+    revision TEXT
+);
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    replayer TEXT NOT NULL,
+    take TEXT NOT NULL,
+    path TEXT NOT NULL,
+    hash TEXT,
+    build TEXT,
+    frames INTEGER,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER
+);
+CREATE INDEX IF NOT EXISTS captures_replayer ON captures(replayer, take, hash);
+CREATE INDEX IF NOT EXISTS captures_hash ON captures(hash);
+CREATE TABLE IF NOT EXISTS capture_channels (
+    capture_id INTEGER NOT NULL REFERENCES captures(id),
+    channel INTEGER NOT NULL,
+    rms REAL,
+    max_amp INTEGER,
+    PRIMARY KEY (capture_id, channel)
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    capture1_id INTEGER NOT NULL REFERENCES captures(id),
+    capture2_id INTEGER NOT NULL REFERENCES captures(id),
+    replayer1 TEXT NOT NULL,
+    replayer2 TEXT NOT NULL,
+    rate INTEGER,
+    frames INTEGER,
+    correlation REAL,
+    mean REAL,
+    median REAL,
+    std REAL,
+    max REAL,
+    pct_significant REAL,
+    first_divergence INTEGER
+);
+CREATE INDEX IF NOT EXISTS pairs_replayers ON pairs(replayer1, replayer2, run_id);
+CREATE TABLE IF NOT EXISTS pair_channels (
+    pair_id INTEGER NOT NULL REFERENCES pairs(id),
+    channel INTEGER NOT NULL,
+    correlation REAL,
+    remapped_correlation REAL,
+    mean REAL,
+    max REAL,
+    pct_significant REAL,
+    PRIMARY KEY (pair_id, channel)
+);
+CREATE TABLE IF NOT EXISTS pair_windows (
+    pair_id INTEGER NOT NULL REFERENCES pairs(id),
+    window INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    start REAL,
+    position INTEGER,
+    row INTEGER,
+    correlation REAL,
+    max_diff REAL,
+    PRIMARY KEY (pair_id, window, channel)
+);
+CREATE INDEX IF NOT EXISTS pair_windows_max_diff ON pair_windows(max_diff);
+CREATE INDEX IF NOT EXISTS pair_windows_row ON pair_windows(position, row);
+CREATE TABLE IF NOT EXISTS determinism (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    replayer TEXT NOT NULL,
+    takes INTEGER,
+    frames INTEGER,
+    identical INTEGER,
+    disagree_frames INTEGER,
+    outliers TEXT
+);
+CREATE INDEX IF NOT EXISTS determinism_replayer ON determinism(replayer, run_id);
+CREATE TABLE IF NOT EXISTS determinism_takes (
+    determinism_id INTEGER NOT NULL REFERENCES determinism(id),
+    capture_id INTEGER NOT NULL REFERENCES captures(id),
+    deviating_frames INTEGER,
+    first_deviation INTEGER,
+    PRIMARY KEY (determinism_id, capture_id)
+);
+"""
+
+def connect(filename=DB_FILE):
+    """Open (and create if needed) the results database."""
+    conn = sqlite3.connect(filename, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+def git_revision():
+    """Short git revision of the analysis tools, or None outside a checkout."""
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, cwd=Path(__file__).parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def start_run(conn, tool):
+    """New run row; returns its id."""
+    cur = conn.execute("INSERT INTO runs (created, tool, revision) VALUES (?, ?, ?)",
+                       (time.time(), tool, git_revision()))
+    return cur.lastrowid
+
+def identify(filename, name=None):
+    """
+    (replayer, take, harness) for a capture: registry captures and their
+    <stem>_take* variants map to their replayer; anything else keeps `name`
+    (or the file stem) with no harness.
+    """
+    path = Path(filename)
+    for replayer, info in load_replayers().items():
+        stem = Path(info['capture']).stem
+        if path.stem == stem:
+            return replayer, '', info.get('harness')
+        match = re.fullmatch(re.escape(stem) + r'_(take.*)', path.stem)
+        if match:
+            return replayer, match.group(1), info.get('harness')
+    return name or path.stem, '', None
+
+def record_capture(conn, run_id, filename, frames, sample_rate, channels, rms=None, max_amp=None, name=None):
+    """Store one capture (content hash via pipeline.file_hashes()). Returns its id."""
+    from pipeline import file_hashes
+    replayer, take, harness = identify(filename, name)
+    if not (harness and os.path.exists(harness)):
+        harness = None
+    hashes = file_hashes([filename] + ([harness] if harness else []))
+    digest = hashes[str(filename)]
+    build = hashes[harness] if harness else None
+
+    cur = conn.execute(
+        "INSERT INTO captures (run_id, replayer, take, path, hash, build, frames, duration, "
+        "sample_rate, channels) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (run_id, replayer, take, str(filename), digest, build, int(frames),
+         frames / sample_rate if sample_rate else None, int(sample_rate), int(channels)))
+    capture_id = cur.lastrowid
+    if rms is not None:
+        conn.executemany("INSERT INTO capture_channels VALUES (?, ?, ?, ?)",
+                         [(capture_id, ch, float(r), int(m)) for ch, (r, m) in enumerate(zip(rms, max_amp))])
+    return capture_id
+
+def record_pair(conn, run_id, capture1, capture2, analysis, correlation, per_channel, remapped,
+                window_correlation, rows=None):
+    """
+    Store a pairwise comparison: analysis from compare_captures(), overall
+    and per-channel correlations, the (windows, channels) correlation map
+    and optionally (positions, rows) of each window start.
+    """
+    replayer = dict(conn.execute("SELECT id, replayer FROM captures WHERE id IN (?, ?)", (capture1, capture2)))
+    divergence = analysis['first_divergence']
+    cur = conn.execute(
+        "INSERT INTO pairs (run_id, capture1_id, capture2_id, replayer1, replayer2, rate, frames, "
+        "correlation, mean, median, std, max, pct_significant, first_divergence) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (run_id, capture1, capture2, replayer[capture1], replayer[capture2], int(analysis['rate']),
+         int(analysis['frames']), float(correlation), float(analysis['mean']), float(analysis['median']),
+         float(analysis['std']), float(analysis['max']), float(analysis['pct_significant']),
+         None if divergence is None else int(divergence)))
+    pair_id = cur.lastrowid
+
+    conn.executemany("INSERT INTO pair_channels VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(pair_id, ch, float(per_channel[ch]), float(remapped[ch]), float(stats['mean']),
+                       float(stats['max']), float(stats['pct_significant']))
+                      for ch, stats in enumerate(analysis['per_channel'])])
+
+    window_seconds = analysis['window_frames'] / analysis['rate']
+    window_max = analysis['window_max']
+    conn.executemany(
+        "INSERT INTO pair_windows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(pair_id, w, ch, w * window_seconds,
+          None if rows is None else int(rows[0][w]), None if rows is None else int(rows[1][w]),
+          None if window_correlation[w, ch] != window_correlation[w, ch] else float(window_correlation[w, ch]),
+          float(window_max[w, ch]))
+         for w in range(len(window_max)) for ch in range(window_max.shape[1])])
+    return pair_id
+
+def record_determinism(conn, run_id, replayer, capture_ids, result, identical, outliers):
+    """Store a consensus check (analyze_consensus() result) over the given takes."""
+    cur = conn.execute(
+        "INSERT INTO determinism (run_id, replayer, takes, frames, identical, disagree_frames, outliers) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (run_id, replayer, len(capture_ids), int(result['frames']), int(bool(identical)),
+         int(result['disagree'].sum()), ','.join(str(t) for t in outliers)))
+    det_id = cur.lastrowid
+    conn.executemany("INSERT INTO determinism_takes VALUES (?, ?, ?, ?)",
+                     [(det_id, capture_id, int(result['take_dev'][t].sum()),
+                       None if result['first_dev'][t] is None else int(result['first_dev'][t]))
+                      for t, capture_id in enumerate(capture_ids)])
+    return det_id
+
+# ----------------------------------------------------------------------------
+# Queries
+# ----------------------------------------------------------------------------
+
+def print_rows(cursor):
+    """Print a query result as an aligned table."""
+    headers = [d[0] for d in cursor.description]
+    rows = [['' if v is None else f"{v:.6g}" if isinstance(v, float) else str(v) for v in row]
+            for row in cursor.fetchall()]
+    widths = [max([len(h)] + [len(r[i]) for r in rows]) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+    print(f"({len(rows)} rows)")
+
+def pair_filter(args, alias='p'):
+    """WHERE fragment and parameters matching a replayer pair in either order."""
+    if not args.pair:
+        return "1", []
+    a, b = args.pair
+    return (f"(({alias}.replayer1 = ? AND {alias}.replayer2 = ?) OR "
+            f"({alias}.replayer1 = ? AND {alias}.replayer2 = ?))", [a, b, b, a])
+
+def query_pairs(conn, args):
+    where, params = pair_filter(args)
+    if args.channel is None:
+        sql = (f"SELECT r.id AS run, datetime(r.created, 'unixepoch', 'localtime') AS time, "
+               f"p.replayer1, p.replayer2, c1.build AS build1, c2.build AS build2, p.correlation, "
+               f"p.mean, p.median, p.max, p.pct_significant, p.first_divergence "
+               f"FROM pairs p JOIN runs r ON r.id = p.run_id "
+               f"JOIN captures c1 ON c1.id = p.capture1_id JOIN captures c2 ON c2.id = p.capture2_id "
+               f"WHERE {where} ORDER BY r.id DESC LIMIT ?")
+    else:
+        sql = (f"SELECT r.id AS run, datetime(r.created, 'unixepoch', 'localtime') AS time, "
+               f"p.replayer1, p.replayer2, c1.build AS build1, c2.build AS build2, pc.channel, "
+               f"pc.correlation, pc.remapped_correlation, pc.mean, pc.max, pc.pct_significant "
+               f"FROM pairs p JOIN runs r ON r.id = p.run_id JOIN pair_channels pc ON pc.pair_id = p.id "
+               f"JOIN captures c1 ON c1.id = p.capture1_id JOIN captures c2 ON c2.id = p.capture2_id "
+               f"WHERE {where} AND pc.channel = ? ORDER BY r.id DESC LIMIT ?")
+        params.append(args.channel)
+    params.append(args.last)
+    return conn.execute(sql, params)
+
+def query_windows(conn, args):
+    where, params = pair_filter(args)
+    sql = (f"SELECT p.run_id AS run, p.replayer1, p.replayer2, w.window, w.start, w.position, w.row, "
+           f"w.channel, w.correlation, w.max_diff "
+           f"FROM pair_windows w JOIN pairs p ON p.id = w.pair_id "
+           f"WHERE w.max_diff >= ? AND {where}")
+    params = [args.min_max_diff] + params
+    if args.channel is not None:
+        sql += " AND w.channel = ?"
+        params.append(args.channel)
+    if args.latest:
+        sql += " AND p.run_id = (SELECT MAX(run_id) FROM pairs)"
+    sql += " ORDER BY p.run_id DESC, w.max_diff DESC LIMIT ?"
+    params.append(args.limit)
+    return conn.execute(sql, params)
+
+def query_captures(conn, args):
+    sql = ("SELECT c.run_id AS run, datetime(r.created, 'unixepoch', 'localtime') AS time, c.replayer, "
+           "c.take, c.path, substr(c.hash, 1, 16) AS hash, substr(c.build, 1, 16) AS build, c.frames, "
+           "c.duration FROM captures c JOIN runs r ON r.id = c.run_id")
+    params = []
+    if args.replayer:
+        sql += " WHERE c.replayer = ?"
+        params.append(args.replayer)
+    sql += " ORDER BY c.run_id DESC, c.id LIMIT ?"
+    params.append(args.last)
+    return conn.execute(sql, params)
+
+def query_determinism(conn, args):
+    sql = ("SELECT d.run_id AS run, datetime(r.created, 'unixepoch', 'localtime') AS time, d.replayer, "
+           "d.takes, d.frames, d.identical, d.disagree_frames, d.outliers "
+           "FROM determinism d JOIN runs r ON r.id = d.run_id")
+    params = []
+    if args.replayer:
+        sql += " WHERE d.replayer = ?"
+        params.append(args.replayer)
+    sql += " ORDER BY d.run_id DESC LIMIT ?"
+    params.append(args.last)
+    return conn.execute(sql, params)
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the analysis results history.')
+    parser.add_argument('--db', default=DB_FILE, help=f'results database (default {DB_FILE})')
+    sub = parser.add_subparsers(dest='query', required=True)
+
+    p = sub.add_parser('pairs', help='pairwise metrics over past runs')
+    p.add_argument('pair', nargs='*', metavar='REPLAYER', help='two replayer names (default: all pairs)')
+    p.add_argument('--channel', type=int, help='per-channel metrics for this channel')
+    p.add_argument('--last', type=int, default=20, help='most recent N results (default 20)')
+    p.set_defaults(run=query_pairs)
+
+    p = sub.add_parser('windows', help='windows whose max |difference| reaches a threshold')
+    p.add_argument('--min-max-diff', type=float, default=1000.0, help='threshold (default 1000)')
+    p.add_argument('--pair', nargs=2, metavar='REPLAYER', help='only this pair')
+    p.add_argument('--channel', type=int, help='only this channel')
+    p.add_argument('--latest', action='store_true', help='only the most recent run')
+    p.add_argument('--limit', type=int, default=100, help='at most N rows (default 100)')
+    p.set_defaults(run=query_windows)
+
+    p = sub.add_parser('captures', help='recorded captures, their hashes and builds')
+    p.add_argument('--replayer', help='only this replayer')
+    p.add_argument('--last', type=int, default=20, help='most recent N captures (default 20)')
+    p.set_defaults(run=query_captures)
+
+    p = sub.add_parser('determinism', help='determinism verdicts')
+    p.add_argument('--replayer', help='only this replayer')
+    p.add_argument('--last', type=int, default=20, help='most recent N verdicts (default 20)')
+    p.set_defaults(run=query_determinism)
+
+    p = sub.add_parser('sql', help='run an arbitrary SQL query')
+    p.add_argument('statement')
+    p.set_defaults(run=lambda conn, args: conn.execute(args.statement))
+
+    args = parser.parse_args()
+    if args.query == 'pairs':
+        if len(args.pair) not in (0, 2):
+            parser.error('give two replayer names or none')
+        args.pair = args.pair or None
+
+    if not Path(args.db).exists():
+        print(f"Error: {args.db} not found!")
+        return 1
+
+    conn = connect(args.db)
+    try:
+        print_rows(args.run(conn, args))
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,30 +7,80 @@ Usage: ./strip_leading_silence.py input.pcm output.pcm
 
 Reads raw PCM data (16-bit signed little-endian, 4 channels interleaved)
 and removes all leading frames where all 4 channels are below the threshold.
+Channel-planar captures (planar_pcm.py) are trimmed channel by channel and
+stay planar. Other formats (a WAV, or a raw capture with a <capture>.json
+sidecar, see capture_format()) are read at their own rate and channel count
+and written as raw PCM with a sidecar.
 """
 
 import sys
 import struct
 import os
 
+from planar_pcm import (SAMPLE_RATE, CHANNELS, read_header, read_planes, pack_header, capture_format,
+                        write_capture_format)
+
+def strip_planar(input_file, output_file, threshold=0):
+    """strip_leading_silence() for a channel-planar capture."""
+    sample_rate, planes = read_planes(input_file)
+    num_frames = len(planes[0]) if planes else 0
+
+    print(f"Input file: {input_file} (planar)")
+    print(f"Total frames: {num_frames}")
+    print(f"Threshold: {threshold}")
+    print()
+
+    # The first non-silent frame is the earliest one over all channels
+    first_sound = None
+    for plane in planes:
+        for i in range(first_sound if first_sound is not None else num_frames):
+            if abs(plane[i]) > threshold:
+                first_sound = i
+                break
+
+    if first_sound is None:
+        print("WARNING: No sound detected in entire file!")
+        print("File contains only silence.")
+        return
+
+    silent_seconds = first_sound / sample_rate
+    print(f"Leading silence: {first_sound} frames ({silent_seconds:.3f} seconds)")
+    print(f"Keeping {num_frames - first_sound} frames from position {first_sound}")
+
+    with open(output_file, 'wb') as f:
+        f.write(pack_header(sample_rate, len(planes), num_frames - first_sound))
+        for plane in planes:
+            f.write(plane[first_sound:].tobytes())
+
+    print(f"\nOutput file: {output_file}")
+    print(f"Removed {first_sound} frames of leading silence from each channel")
+
 def strip_leading_silence(input_file, output_file, threshold=0):
     """
-    Strip leading silence from 4-channel raw PCM file.
+    Strip leading silence from a raw PCM file (4 channels unless its format
+    says otherwise).
 
     Args:
         input_file: Path to input .pcm file
         output_file: Path to output .pcm file
         threshold: Absolute value threshold (default 0 = perfect silence)
     """
-    # Read the entire file
+    if read_header(input_file) is not None:
+        return strip_planar(input_file, output_file, threshold)
+
+    # Read the entire file (the sample data only, after a WAV header)
+    sample_rate, channels, data_offset = capture_format(input_file)
     with open(input_file, 'rb') as f:
+        f.seek(data_offset)
         data = f.read()
 
     # Each sample is 2 bytes (int16), 4 channels = 8 bytes per frame
-    bytes_per_frame = 8
+    bytes_per_frame = 2 * channels
+    frame_format = f'<{channels}h'
     num_frames = len(data) // bytes_per_frame
 
     print(f"Input file: {input_file}")
+    print(f"Format: {channels} channels @ {sample_rate}Hz")
     print(f"File size: {len(data)} bytes")
     print(f"Total frames: {num_frames}")
     print(f"Threshold: {threshold}")
@@ -40,15 +90,15 @@ def strip_leading_silence(input_file, output_file, threshold=0):
     first_sound = None
     for i in range(num_frames):
         offset = i * bytes_per_frame
-        # Unpack 4 int16 samples (little-endian)
-        ch0, ch1, ch2, ch3 = struct.unpack_from('<hhhh', data, offset)
+        # Unpack one int16 sample per channel (little-endian)
+        frame = struct.unpack_from(frame_format, data, offset)
 
         # Check if any channel exceeds threshold
-        if (abs(ch0) > threshold or abs(ch1) > threshold or
-            abs(ch2) > threshold or abs(ch3) > threshold):
+        if any(abs(value) > threshold for value in frame):
             first_sound = i
             if i < 10:
-                print(f"First sound at frame {i}: ch0={ch0} ch1={ch1} ch2={ch2} ch3={ch3}")
+                values = " ".join(f"ch{ch}={value}" for ch, value in enumerate(frame))
+                print(f"First sound at frame {i}: {values}")
             break
 
         # Show progress for large files
@@ -63,7 +113,7 @@ def strip_leading_silence(input_file, output_file, threshold=0):
     # Calculate statistics
     silent_frames = first_sound
     silent_bytes = silent_frames * bytes_per_frame
-    silent_seconds = silent_frames / 96000.0  # Assuming 96kHz sample rate
+    silent_seconds = silent_frames / sample_rate
 
     print(f"Leading silence: {silent_frames} frames ({silent_bytes} bytes, {silent_seconds:.3f} seconds)")
     print(f"Keeping {num_frames - silent_frames} frames from position {first_sound}")
@@ -72,35 +122,45 @@ def strip_leading_silence(input_file, output_file, threshold=0):
     output_data = data[silent_frames * bytes_per_frame:]
     with open(output_file, 'wb') as f:
         f.write(output_data)
+    # The output is raw: keep a non-default format in its sidecar (and drop a stale one)
+    if (sample_rate, channels) != (SAMPLE_RATE, CHANNELS):
+        write_capture_format(output_file, sample_rate, channels)
+    elif os.path.exists(f"{output_file}.json"):
+        os.remove(f"{output_file}.json")
 
     print(f"\nOutput file: {output_file}")
     print(f"Output size: {len(output_data)} bytes")
     print(f"Removed {silent_bytes} bytes of leading silence")
 
-if __name__ == '__main__':
-    if len(sys.argv) < 3:
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 3:
         print(__doc__)
-        sys.exit(1)
+        return 1
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    input_file = argv[1]
+    output_file = argv[2]
 
     # Optional threshold argument
     threshold = 0
-    if len(sys.argv) >= 4 and sys.argv[3] == '--threshold':
-        if len(sys.argv) >= 5:
-            threshold = int(sys.argv[4])
+    if len(argv) >= 4 and argv[3] == '--threshold':
+        if len(argv) >= 5:
+            threshold = int(argv[4])
         else:
             print("Error: --threshold requires a value")
-            sys.exit(1)
-    elif len(sys.argv) >= 4:
+            return 1
+    elif len(argv) >= 4:
         try:
-            threshold = int(sys.argv[3])
+            threshold = int(argv[3])
         except ValueError:
             pass
 
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' not found")
-        sys.exit(1)
+        return 1
 
     strip_leading_silence(input_file, output_file, threshold)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())